@@ -0,0 +1,57 @@
+import argparse
+import re
+import sys
+import time
+
+from moi.binaryFormat import dumps
+from moi.bulkTransform import transform_documents
+from moi.textEditor import TextEditor
+from moi.textFormatter import Format, PropertyFormatter
+
+
+"""
+Throughput of the bulk transformations (SEE moi/bulkTransform.py)
+as the number of processes grows.
+    python -m benchmarks.benchBulk --documents 2000 --processes 1 2 4 8
+"""
+
+def make_links(editor):
+    for match in re.finditer(r'https?://\S+', str(editor.text)):
+        editor.incremental_format = Format(link = match.group())
+        editor.change_selection_format(match.start(), match.end())
+
+
+def make_document(k, size):
+    editor = TextEditor(PropertyFormatter)
+    line = f'Line of document {k}, see https://example.com/{k} for more.\n'
+    for n in range(size // len(line)):
+        editor.current_format = Format(bold = n % 2 == 0)
+        editor.edit(line)
+    return dumps(editor)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--documents', type = int, default = 1000)
+    parser.add_argument('--size', type = int, default = 10000)
+    parser.add_argument('--processes', type = int, nargs = '*',
+                        default = [1, 2, 4, 8])
+    parser.add_argument('--chunk-size', type = int, default = 4)
+    args = parser.parse_args()
+    documents = [(k, make_document(k, args.size)) for k in range(100)]
+    for processes in args.processes:
+        start = time.perf_counter()
+        count = 0
+        for _ in transform_documents((documents[k % 100]
+                                      for k in range(args.documents)),
+                                     make_links, PropertyFormatter,
+                                     processes = processes,
+                                     chunk_size = args.chunk_size):
+            count += 1
+        elapsed = time.perf_counter() - start
+        print(f'{processes:>3} processes  {count / elapsed:10.1f} documents/s',
+              file = sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+import argparse
+import random
+import sys
+import threading
+import time
+
+from moi.metrics import Histogram
+from moi.sharedDocument import SharedDocument
+from benchmarks.benchEditor import make_editor
+
+
+"""
+Stress benchmark of a shared document (SEE moi/sharedDocument.py).
+
+One writer thread edits and formats the document continuously while
+1, 2, 4, ... reader threads render viewports, convert positions and
+extract ranges from the published snapshots. The read throughput and
+the write throughput and latency (lock wait included) are printed for
+each thread count.
+    python -m benchmarks.benchConcurrency --size 1e6 --threads 1 2 4 8
+"""
+
+def reader(document, stop, counts, index, seed):
+    rng = random.Random(seed)
+    reads = 0
+    while not stop.is_set():
+        snapshot = document.snapshot()
+        n = len(snapshot)
+        i = rng.randrange(max(1, n - 2000))
+        snapshot.compile(True, i, min(n, i + 2000))
+        snapshot.pos_to_line_column(rng.randrange(n))
+        snapshot[i:i + 80]
+        reads += 1
+    counts[index] = reads
+
+
+def writer(document, stop, counts, latencies, seed, pause):
+    rng = random.Random(seed)
+    writes = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        with document.writing() as editor:
+            n = len(editor.text)
+            editor.change_position(rng.randrange(1, n))
+            editor.current_format = rng.choice('abc')
+            editor.edit('xy')
+            i = rng.randrange(n - 100)
+            editor.incremental_format = rng.choice('abc')
+            editor.change_selection_format(i, i + rng.randint(1, 100))
+        latencies.observe(time.perf_counter() - start)
+        writes += 1
+        if pause:
+            time.sleep(pause)
+    counts.append(writes)
+
+
+def run(size, run_length, thread_counts, duration, pause, seed):
+    results = []
+    for thread_count in thread_counts:
+        document = SharedDocument(make_editor(size, run_length))
+        stop = threading.Event()
+        counts = [0] * thread_count
+        writes = []
+        latencies = Histogram()
+        threads = [threading.Thread(target = reader,
+                                    args = (document, stop, counts, k,
+                                            seed + k))
+                   for k in range(thread_count)]
+        threads.append(threading.Thread(target = writer,
+                                        args = (document, stop, writes,
+                                                latencies, seed, pause)))
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        reads = sum(counts) / duration
+        latency = latencies.snapshot()
+        results.append((thread_count, reads, writes[0] / duration, latency))
+        print(f'{thread_count:>3} readers  {reads:12.1f} reads/s'
+              f'  {reads / max(thread_count, 1):12.1f} reads/s/thread'
+              f'  {writes[0] / duration:10.1f} writes/s'
+              f'  write latency (us) mean {latency["mean"] * 1e6:8.1f}'
+              f'  p50 <= {latency["p50"] * 1e6:8.1f}'
+              f'  p99 <= {latency["p99"] * 1e6:8.1f}'
+              f'  max {latency["max"] * 1e6:8.1f}', file = sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type = float, default = 1e5)
+    parser.add_argument('--run-length', type = int, default = 10)
+    parser.add_argument('--threads', type = int, nargs = '*',
+                        default = [1, 2, 4, 8])
+    parser.add_argument('--duration', type = float, default = 2.0)
+    parser.add_argument('--pause', type = float, default = 0.001,
+                        help = 'seconds between two writes')
+    parser.add_argument('--seed', type = int, default = 0)
+    args = parser.parse_args()
+    run(int(args.size), args.run_length, args.threads, args.duration,
+        args.pause, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+import argparse
+import datetime
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from moi.textEditor import TextEditor
+
+
+"""
+Scaling benchmarks of the editor operations.
+
+Each benchmark runs at document sizes from 1e3 to 1e7 characters and
+with short and long runs (tags). The results (seconds per operation)
+are written in JSON and can be compared across commits with
+*benchmarks/compare.py*.
+    python -m benchmarks.benchEditor --max-size 1e6 -o before.json
+    python -m benchmarks.benchEditor --max-size 1e6 -o after.json
+    python -m benchmarks.compare before.json after.json
+"""
+
+SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+
+# Average run lengths (the run count is size / run length).
+RUN_LENGTHS = [10, 1000]
+
+
+class Formatter:
+    DEFAULT_FORMAT = 'default'
+
+    @staticmethod
+    def merge(old, new):
+        return new
+
+    @staticmethod
+    def compare(format_one, format_two):
+        return format_one == format_two
+
+
+
+def make_editor(size, run_length):
+    text = ('lorem ipsum dolor sit amet\n' * (size // 27 + 1))[:size]
+    formats = ['a', 'b', 'c']
+    runs = [(min(run_length, size - k), formats[(k // run_length) % 3])
+            for k in range(0, size, run_length)]
+    editor = TextEditor.from_runs(Formatter, text, runs)
+    # The journal would grow with the number of operations.
+    editor.journal = None
+    editor.change_position(size // 2)
+    return editor
+
+
+# Each workload runs *number* operations and is timed as a whole.
+
+def typing(editor, rng, number):
+    """ Typing then erasing a word at a random position. """
+    editor.change_position(rng.randrange(len(editor.text)))
+    for k in range(number // 2):
+        editor.edit('x')
+    for k in range(number // 2):
+        editor.delete()
+
+
+def edit(editor, rng, number):
+    n = len(editor.text)
+    for _ in range(number):
+        editor.change_position(rng.randrange(n))
+        editor.current_format = rng.choice('abc')
+        editor.edit('xy')
+        n += 2
+
+
+def delete(editor, rng, number):
+    for _ in range(number):
+        editor.change_position(rng.randrange(1, len(editor.text)))
+        editor.delete()
+
+
+def delete_selection(editor, rng, number):
+    for _ in range(number):
+        i = rng.randrange(len(editor.text) - 4)
+        editor.delete_selection(i, i + rng.randint(1, 4))
+
+
+def change_position(editor, rng, number):
+    """ Random access. """
+    n = len(editor.text)
+    for _ in range(number):
+        editor.change_position(rng.randrange(n))
+
+
+def change_selection_format(editor, rng, number):
+    """ Bulk formatting of selections of up to 1% of the text. """
+    n = len(editor.text)
+    for _ in range(number):
+        i = rng.randrange(n - 1)
+        editor.incremental_format = rng.choice('abc')
+        j = min(n, i + rng.randint(1, n // 100 + 1))
+        editor.change_selection_format(i, j)
+
+
+def compile_window(editor, rng, number):
+    """ Rendering of a 2000 character viewport. """
+    n = len(editor.text)
+    for _ in range(number):
+        i = rng.randrange(max(1, n - 2000))
+        editor.compile(True, i, min(n, i + 2000))
+
+
+def compile(editor, rng, number):
+    for _ in range(number):
+        editor.compile()
+
+
+def tags_create(editor, rng, number):
+    tags = editor.tags
+    ids = list(tags.ids())
+    for _ in range(number):
+        ids.append(tags.create([1, 'a'], rng.choice(ids)))
+
+
+# Name -> (workload, operations per round, maximal size).
+BENCHMARKS = {
+    'typing': (typing, 200, None),
+    'edit': (edit, 100, None),
+    'delete': (delete, 100, None),
+    'delete_selection': (delete_selection, 100, None),
+    'change_position': (change_position, 1000, None),
+    'change_selection_format': (change_selection_format, 20, None),
+    'compile_window': (compile_window, 20, None),
+    'compile': (compile, 1, 10 ** 6),
+    'tags_create': (tags_create, 1000, None),
+}
+
+
+def run(names, sizes, run_lengths, rounds, seed):
+    results = []
+    for size in sizes:
+        for run_length in run_lengths:
+            if run_length >= size:
+                continue
+            for name in names:
+                workload, number, max_size = BENCHMARKS[name]
+                if max_size is not None and size > max_size:
+                    continue
+                best = None
+                for k in range(rounds):
+                    editor = make_editor(size, run_length)
+                    rng = random.Random(seed + k)
+                    start = time.perf_counter()
+                    workload(editor, rng, number)
+                    elapsed = (time.perf_counter() - start) / number
+                    best = elapsed if best is None else min(best, elapsed)
+                results.append({'benchmark': name,
+                                'size': size,
+                                'runs': size // run_length,
+                                'seconds_per_op': best})
+                print(f'{name:<24} size {size:>9} runs {size // run_length:>8}'
+                      f'  {best * 1e6:12.2f} us/op', file = sys.stderr)
+    return results
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'],
+                              capture_output = True, text = True,
+                              check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--output', default = 'benchmark.json')
+    parser.add_argument('--max-size', type = float, default = 1e7)
+    parser.add_argument('--rounds', type = int, default = 3)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--only', nargs = '*', choices = sorted(BENCHMARKS),
+                        default = sorted(BENCHMARKS))
+    args = parser.parse_args()
+    sizes = [size for size in SIZES if size <= args.max_size]
+    results = run(args.only, sizes, RUN_LENGTHS, args.rounds, args.seed)
+    document = {'meta': {'date': datetime.datetime.now().isoformat(),
+                         'python': platform.python_version(),
+                         'platform': platform.platform(),
+                         'commit': _commit()},
+                'results': results}
+    with open(args.output, 'w') as stream:
+        json.dump(document, stream, indent = 1)
+
+
+if __name__ == '__main__':
+    main()
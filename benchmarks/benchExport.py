@@ -0,0 +1,64 @@
+import argparse
+import os
+import sys
+import time
+
+from moi.export import (JSONLinesRenderer, HTMLRenderer, ANSIRenderer,
+                        MarkdownRenderer, export, export_parallel)
+from benchmarks.benchEditor import make_editor
+
+
+"""
+Export of a large document: the serial *compile* path (one list of
+runs, then rendering) against *export* and *export_parallel*.
+    python -m benchmarks.benchExport --size 1e7 --processes 1 2 4 8
+"""
+
+RENDERERS = {'json': JSONLinesRenderer,
+             'html': HTMLRenderer,
+             'ansi': ANSIRenderer,
+             'markdown': MarkdownRenderer}
+
+
+def compile_path(editor, renderer, stream):
+    stream.write(renderer.header())
+    for s, format in editor.compile():
+        stream.write(renderer.render_run(s, format))
+    stream.write(renderer.footer())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type = float, default = 1e6)
+    parser.add_argument('--run-length', type = int, default = 10)
+    parser.add_argument('--chunk-size', type = float, default = 1 << 20)
+    parser.add_argument('--renderer', choices = sorted(RENDERERS),
+                        default = 'json')
+    parser.add_argument('--processes', type = int, nargs = '*',
+                        default = [1, 2, 4, 8])
+    args = parser.parse_args()
+    editor = make_editor(int(args.size), args.run_length)
+    renderer = RENDERERS[args.renderer]()
+    chunk_size = int(args.chunk_size)
+    variants = [('compile', lambda stream:
+                 compile_path(editor, renderer, stream)),
+                ('export', lambda stream:
+                 export(editor, renderer, stream, chunk_size))]
+    for processes in args.processes:
+        variants.append((f'export_parallel {processes}',
+                         lambda stream, processes = processes:
+                         export_parallel(editor, renderer, stream,
+                                         processes, chunk_size)))
+    reference = None
+    for name, function in variants:
+        with open(os.devnull, 'w', encoding = 'utf-8') as stream:
+            start = time.perf_counter()
+            function(stream)
+            elapsed = time.perf_counter() - start
+        reference = reference or elapsed
+        print(f'{name:<20} {elapsed:8.3f} s  x{reference / elapsed:.2f}',
+              file = sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import random
+import time
+
+from moi.textEditor import TextEditor
+from moi.textFormatter import Format, PropertyFormatter
+
+
+"""
+*PropertyFormatter* against the naive dict formatter on large
+*change_selection_format* workloads.
+    python -m benchmarks.benchFormatter --runs 20000 --changes 2000
+"""
+
+class DictFormatter:
+    """ Formats are dicts compared and merged structurally. """
+
+    DEFAULT_FORMAT = {}
+
+    @staticmethod
+    def merge(old_format, new_format):
+        result = dict(old_format)
+        result.update(new_format)
+        return {name: value for name, value in result.items()
+                if value is not None}
+
+    @staticmethod
+    def compare(format_one, format_two):
+        return format_one == format_two
+
+
+
+PROPERTIES = [{'font': 'serif', 'size': 12, 'color': 'black'},
+              {'font': 'sans', 'size': 10, 'color': 'blue',
+               'link': 'http://example.com'},
+              {'font': 'mono', 'size': 11, 'color': 'red', 'bold': True},
+              {'font': 'serif', 'size': 14, 'color': 'green',
+               'italic': True}]
+
+CHANGES = [{'bold': True}, {'bold': None}, {'size': 16},
+           {'color': 'black'}, {'italic': True, 'size': 12}]
+
+
+def run(Formatter, make_format, runs, changes, seed):
+    rng = random.Random(seed)
+    length = 8
+    text = 'x' * (runs * length)
+    tag_list = [[length, make_format(PROPERTIES[k % len(PROPERTIES)])]
+                for k in range(runs)]
+    editor = TextEditor(Formatter, tag_list = tag_list, text = text)
+    start = time.perf_counter()
+    for _ in range(changes):
+        i = rng.randrange(len(text) - 1)
+        j = min(len(text), i + rng.randint(1, 40 * length))
+        editor.incremental_format = make_format(rng.choice(CHANGES))
+        editor.change_selection_format(i, j)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type = int, default = 20000)
+    parser.add_argument('--changes', type = int, default = 2000)
+    parser.add_argument('--seed', type = int, default = 0)
+    args = parser.parse_args()
+    naive = run(DictFormatter, dict, args.runs, args.changes, args.seed)
+    interned = run(PropertyFormatter, Format,
+                   args.runs, args.changes, args.seed)
+    print(f'dict formatter      {naive:.3f} s')
+    print(f'property formatter  {interned:.3f} s')
+    print(f'speed-up            {naive / interned:.2f}')
+
+
+if __name__ == '__main__':
+    main()
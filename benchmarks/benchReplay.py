@@ -0,0 +1,70 @@
+import argparse
+import random
+import sys
+import tempfile
+import time
+
+from moi.commandLog import CommandRecorder, replay
+from moi.textEditor import TextEditor, TreeTags
+from benchmarks.benchEditor import Formatter
+
+
+"""
+Replay throughput of command logs (SEE moi/commandLog.py).
+A recorded log (for instance a production trace) is replayed on an
+empty editor; without a log, a random typing session is recorded
+first.
+    python -m benchmarks.benchReplay --commands 1e5
+    python -m benchmarks.benchReplay --log session.log
+"""
+
+def record_session(stream, number, seed):
+    rng = random.Random(seed)
+    editor = TextEditor(Formatter, TagList = TreeTags)
+    editor.journal = None
+    editor.recorder = CommandRecorder(stream, Formatter)
+    editor.edit('lorem ipsum\n')
+    for _ in range(number):
+        n = len(editor.text)
+        action = rng.random()
+        if action < 0.05:
+            editor.change_position(rng.randint(0, n))
+        elif action < 0.1:
+            editor.current_format = rng.choice('abc')
+        elif action < 0.12:
+            i = rng.randrange(n - 1)
+            editor.incremental_format = rng.choice('abc')
+            editor.change_selection_format(i, min(n, i + rng.randint(1, 50)))
+        elif action < 0.2:
+            editor.change_position(rng.randint(1, n))
+            editor.delete()
+        else:
+            editor.edit(rng.choice('abcdefghij \n'))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--log', help = 'a recorded log')
+    parser.add_argument('--commands', type = float, default = 1e5)
+    parser.add_argument('--chunk-size', type = int, default = 4096)
+    parser.add_argument('--seed', type = int, default = 0)
+    args = parser.parse_args()
+    with tempfile.TemporaryFile('w+', encoding = 'utf-8') as stream:
+        if args.log:
+            stream.close()
+            stream = open(args.log, encoding = 'utf-8')
+        else:
+            record_session(stream, int(args.commands), args.seed)
+            stream.seek(0)
+        editor = TextEditor(Formatter, TagList = TreeTags)
+        editor.journal = None
+        start = time.perf_counter()
+        count = replay(editor, stream, args.chunk_size)
+        elapsed = time.perf_counter() - start
+        stream.close()
+    print(f'{count} lines in {elapsed:.3f} s  {count / elapsed:12.1f} lines/s'
+          f'  ({len(editor.text)} characters)', file = sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import json
+import sys
+
+
+"""
+Comparison of two result files of *benchmarks/benchEditor.py*.
+The exit status is 1 if a benchmark is slower than *threshold* times
+its previous time.
+    python -m benchmarks.compare before.json after.json --threshold 1.25
+"""
+
+def _load(path):
+    with open(path) as stream:
+        document = json.load(stream)
+    return {(result['benchmark'], result['size'], result['runs']):
+            result['seconds_per_op']
+            for result in document['results']}
+
+
+def compare(before, after, threshold):
+    """ The (key, ratio) pairs of the regressions. """
+    regressions = []
+    for key in sorted(set(before) & set(after)):
+        ratio = after[key] / before[key] if before[key] > 0 else 1.0
+        flag = ''
+        if ratio > threshold:
+            regressions.append((key, ratio))
+            flag = '  REGRESSION'
+        name, size, runs = key
+        print(f'{name:<24} size {size:>9} runs {runs:>8}'
+              f'  {before[key] * 1e6:12.2f} -> {after[key] * 1e6:12.2f} us/op'
+              f'  x{ratio:.2f}{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type = float, default = 1.25)
+    args = parser.parse_args()
+    regressions = compare(_load(args.before), _load(args.after),
+                          args.threshold)
+    if regressions:
+        print(f'{len(regressions)} regression(s)')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
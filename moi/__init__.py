@@ -12,6 +12,8 @@ _log_conf = os.path.join(_top_level_dir,
 
 _log_dir = os.path.join(_top_level_dir,
                         'log')
+# The log directory isn't part of the tree (SEE .gitignore).
+os.makedirs(_log_dir, exist_ok = True)
 
 
 with open(_log_conf,
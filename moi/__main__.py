@@ -0,0 +1,28 @@
+import argparse
+import asyncio
+
+from .server import CommandServer, serve_stdio, serve_unix
+
+
+"""
+    python -m moi                       (stdio)
+    python -m moi --socket /tmp/moi.sock
+SEE server.
+"""
+
+def main():
+    parser = argparse.ArgumentParser(prog = 'moi')
+    parser.add_argument('--socket', help = 'path of a Unix socket')
+    args = parser.parse_args()
+    server = CommandServer()
+    try:
+        if args.socket:
+            asyncio.run(serve_unix(server, args.socket))
+        else:
+            asyncio.run(serve_stdio(server))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import json
+
+from .textBuffer import MappedBuffer, Rope
+from .textEditor import TextEditor
+
+
+"""
+Compact binary document format.
+
+    magic         b'MOI\x01'
+    formats       varint count, then for each format a varint size
+                  and its encoding
+    runs          varint count, then for each run a varint length
+                  (in characters) and a varint format id
+    text          varint size, then the UTF-8 text
+
+Varints are unsigned LEB128 integers. The formats are encoded by
+*encode_format* and decoded by *decode_format* if the formatter
+provides them and in JSON otherwise.
+
+*loads* reads any object supporting the buffer protocol (bytes,
+memoryview, mmap) in place: only the text is decoded, or even not
+decoded at all if the text buffer is a *MappedBuffer*.
+"""
+
+MAGIC = b'MOI\x01'
+
+
+def _write_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(view, pos):
+    n = 0
+    shift = 0
+    while True:
+        try:
+            byte = view[pos]
+        except IndexError:
+            raise ValueError('Truncated document.') from None
+        pos += 1
+        n |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return (n, pos)
+        shift += 7
+
+
+def _encode_json(format):
+    return json.dumps(format, separators = (',', ':')).encode('utf-8')
+
+
+def _decode_json(data):
+    return json.loads(str(data, 'utf-8'))
+
+
+def dumps(editor):
+    encode = getattr(editor.Formatter, 'encode_format', _encode_json)
+    formats = bytearray()
+    runs = bytearray()
+    # Format object -> id, then encoding -> id (equal formats which
+    # aren't the same object share an id).
+    object_ids = {}
+    ids = {}
+    tags = editor.tags.all
+    for length, format in tags:
+        format_id = object_ids.get(id(format))
+        if format_id is None:
+            data = encode(format)
+            format_id = ids.get(data)
+            if format_id is None:
+                format_id = ids[data] = len(ids)
+                _write_varint(formats, len(data))
+                formats += data
+            object_ids[id(format)] = format_id
+        _write_varint(runs, length)
+        _write_varint(runs, format_id)
+    text = str(editor.text).encode('utf-8')
+    out = bytearray(MAGIC)
+    _write_varint(out, len(ids))
+    out += formats
+    _write_varint(out, len(tags))
+    out += runs
+    _write_varint(out, len(text))
+    out += text
+    return bytes(out)
+
+
+def dump(editor, stream):
+    stream.write(dumps(editor))
+
+
+def loads(TextFormatter,
+          data,
+          TextBuffer = Rope,
+          TagList = None):
+    """
+    A new *TextEditor* is built from *data* (SEE TextEditor.from_runs).
+    """
+    view = memoryview(data)
+    if view[:len(MAGIC)] != MAGIC:
+        raise ValueError('Not a moi document.')
+    decode = getattr(TextFormatter, 'decode_format', _decode_json)
+    pos = len(MAGIC)
+    count, pos = _read_varint(view, pos)
+    formats = []
+    for _ in range(count):
+        size, pos = _read_varint(view, pos)
+        formats.append(decode(view[pos:(pos + size)]))
+        pos += size
+    count, pos = _read_varint(view, pos)
+    runs = []
+    for _ in range(count):
+        length, pos = _read_varint(view, pos)
+        format_id, pos = _read_varint(view, pos)
+        if format_id >= len(formats):
+            raise ValueError('bad format id')
+        runs.append((length, formats[format_id]))
+    size, pos = _read_varint(view, pos)
+    if pos + size > len(view):
+        raise ValueError('Truncated document.')
+    if issubclass(TextBuffer, MappedBuffer):
+        # The text isn't copied. It is decoded page by page on demand.
+        text = TextBuffer(view[pos:(pos + size)])
+    else:
+        text = str(view[pos:(pos + size)], 'utf-8')
+    return TextEditor.from_runs(TextFormatter, text, runs,
+                                TextBuffer = TextBuffer,
+                                TagList = TagList)
+
+
+def load(TextFormatter, stream, **kwargs):
+    return loads(TextFormatter, stream.read(), **kwargs)
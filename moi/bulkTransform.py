@@ -0,0 +1,90 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+import os
+
+from .binaryFormat import dumps, loads
+from .textEditor import TreeTags
+
+
+"""
+Bulk transformation of saved documents in a process pool.
+
+The documents cross the process boundaries in the binary format
+(SEE binaryFormat): as bytes, or only as their path when they are
+files. A *transform* is a picklable callable (for instance a
+function of a module) which modifies the editor it receives with
+*change_selection_format*, *delete_selection*, *edit*...
+    def make_links(editor):
+        ...
+    for key, data, result in transform_documents(
+            ((path, path) for path in paths), make_links,
+            PropertyFormatter):
+        ...
+
+The results are streamed back while the next documents are being
+transformed. At most *max_pending* tasks are submitted at once, so
+the documents are read from the input iterable as fast as they are
+consumed (backpressure).
+"""
+
+def _transform(Formatter, TagList, transform, items):
+    results = []
+    for key, document in items:
+        if isinstance(document, (str, os.PathLike)):
+            with open(document, 'rb') as stream:
+                document = stream.read()
+        editor = loads(Formatter, document, TagList = TagList)
+        editor.journal = None
+        result = transform(editor)
+        results.append((key, dumps(editor), result))
+    return results
+
+
+def transform_documents(documents,
+                        transform,
+                        Formatter,
+                        processes = None,
+                        chunk_size = 1,
+                        max_pending = None,
+                        ordered = True,
+                        TagList = TreeTags):
+    """
+    A generator of the *(key, data, result)* items of the *(key,
+    document)* items of *documents*. A document is a binary document
+    (bytes) or the path of one. *data* is the transformed document
+    and *result* the value returned by *transform*. The documents
+    are sent to the processes in chunks of *chunk_size* (for small
+    documents). If *ordered* is False, the results are yielded as
+    soon as they are available.
+    """
+    documents = iter(documents)
+    processes = processes or os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = 2 * processes
+    with ProcessPoolExecutor(processes) as executor:
+        def submit():
+            items = list(islice(documents, chunk_size))
+            if not items:
+                return None
+            return executor.submit(_transform, Formatter, TagList,
+                                   transform, items)
+
+        pending = deque()
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < max_pending:
+                future = submit()
+                if future is None:
+                    exhausted = True
+                else:
+                    pending.append(future)
+            if not pending:
+                return
+            if ordered:
+                future = pending.popleft()
+            else:
+                done, _ = wait(pending, return_when = FIRST_COMPLETED)
+                future = done.pop()
+                pending.remove(future)
+            yield from future.result()
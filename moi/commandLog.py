@@ -0,0 +1,184 @@
+from functools import wraps
+import inspect
+from itertools import islice
+import json
+
+
+"""
+Append-only logs of the editor commands (crash recovery, replay of
+real sessions as benchmark workloads).
+
+A *CommandRecorder* set as *TextEditor.recorder* writes one JSON
+line per successful public command: *edit*, *delete*,
+*delete_selection*, *change_position*, *change_selection_format*,
+*apply_batch*, *undo*, *redo* and the assignments of
+*current_format* and *incremental_format*. The commands called by
+another command are not recorded. The arguments are recorded by
+position (even if they are passed by keyword). A format is written
+once and then referred to by an id:
+    ["format", 0, "[[\"bold\",true]]"]
+    ["current_format", 0]
+    ["edit", "abc"]
+The formats are encoded by *Formatter.encode_format* if it exists
+(SEE binaryFormat) and written as JSON values otherwise: a format
+which JSON can't give back (a tuple, a set...) makes its command
+fail before it is executed.
+The stream is flushed after every command by default (SEE
+CommandRecorder).
+
+*replay* applies a log to an editor in the state it had when the
+recorder was set. The log is read and parsed in chunks of lines and
+is never loaded as a whole.
+"""
+
+def recorded(name):
+    """ Decorator of the recorded commands of TextEditor. """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            recorder = self.recorder
+            if recorder is None or recorder.busy:
+                return method(self, *args, **kwargs)
+            recorded_args = args
+            if kwargs:
+                recorded_args = signature.bind(self, *args,
+                                               **kwargs).args[1:]
+            # A command which can't be recorded isn't executed.
+            command = recorder.encode(name, recorded_args)
+            recorder.busy = True
+            try:
+                result = method(self, *args, **kwargs)
+            finally:
+                recorder.busy = False
+            recorder.record(command)
+            return result
+        return wrapper
+    return decorator
+
+
+
+class CommandRecorder:
+    """
+    The stream is flushed every *flush_every* commands (1: after each
+    command, so that a crash loses at most the command in progress;
+    None: never, the owner calls *flush*).
+    """
+
+
+    def __init__(self, stream, Formatter, flush_every = 1):
+        self.stream = stream
+        self.Formatter = Formatter
+        self.flush_every = flush_every
+        self.busy = False
+        # The number of commands written since the last flush.
+        self._unflushed = 0
+        self._encode = getattr(Formatter, 'encode_format', None)
+        # Canonical encoding of a format -> id.
+        self._ids = {}
+
+
+    def _format_id(self, format):
+        key = self._encode_format(format)
+        format_id = self._ids.get(key)
+        if format_id is None:
+            format_id = self._ids[key] = len(self._ids)
+            self._write(['format', format_id,
+                         key if self._encode else json.loads(key)])
+        return format_id
+
+
+    def _encode_format(self, format):
+        """
+        The encoding of *format* by *Formatter.encode_format* or its
+        canonical JSON encoding. A ValueError is raised if the JSON
+        encoding doesn't give back an equal format (tuples, keys which
+        aren't strings...).
+        """
+        if self._encode is not None:
+            # Lossless for any bytes (and readable for JSON encodings).
+            return str(self._encode(format), 'latin-1')
+        try:
+            key = json.dumps(format, sort_keys = True, ensure_ascii = False,
+                             separators = (',', ':'))
+        except (TypeError, ValueError) as error:
+            raise ValueError(f"The format {format!r} can't be recorded:"
+                             f' {error}') from None
+        if json.loads(key) != format:
+            raise ValueError(f"The format {format!r} can't be recorded"
+                             ' losslessly as JSON.')
+        return key
+
+
+    def encode(self, name, args):
+        """ The log line of a command (its formats are written first). """
+        if name in ('current_format', 'incremental_format'):
+            args = [self._format_id(args[0])]
+        elif name == 'apply_batch':
+            args = [[list(operation[:3])
+                     + [self._format_id(format)
+                        for format in operation[3:]]
+                     for operation in args[0]]]
+        return [name, *args]
+
+
+    def record(self, command):
+        """ To write a command encoded by *encode* once it has succeeded. """
+        self._write(command)
+        self._unflushed += 1
+        if (self.flush_every is not None
+            and self._unflushed >= self.flush_every):
+            self.flush()
+
+
+    def _write(self, command):
+        self.stream.write(json.dumps(command, ensure_ascii = False,
+                                     separators = (',', ':')) + '\n')
+
+
+    def flush(self):
+        self.stream.flush()
+        self._unflushed = 0
+
+
+
+def replay(editor, stream, chunk_size = 4096):
+    """
+    To apply the commands of the log *stream* (text lines) to
+    *editor*. The number of read lines is returned.
+    """
+    decode = getattr(editor.Formatter, 'decode_format', None)
+    formats = {}
+
+    def set_current_format(format_id):
+        editor.current_format = formats[format_id]
+
+    def set_incremental_format(format_id):
+        editor.incremental_format = formats[format_id]
+
+    def apply_batch(operations):
+        return editor.apply_batch([operation[:3]
+                                   + [formats[format_id]
+                                      for format_id in operation[3:]]
+                                   for operation in operations])
+
+    def define_format(format_id, encoded):
+        formats[format_id] = (encoded if decode is None
+                              else decode(encoded.encode('latin-1')))
+
+    commands = {'format': define_format,
+                'current_format': set_current_format,
+                'incremental_format': set_incremental_format,
+                'apply_batch': apply_batch}
+    for name in ('edit', 'delete', 'delete_selection', 'change_position',
+                 'change_selection_format', 'undo', 'redo'):
+        commands[name] = getattr(editor, name)
+    count = 0
+    while True:
+        chunk = [json.loads(line) for line in islice(stream, chunk_size)]
+        if not chunk:
+            return count
+        for name, *args in chunk:
+            commands[name](*args)
+        count += len(chunk)
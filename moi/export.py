@@ -0,0 +1,406 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import html
+import json
+import os
+import re
+
+from .textFormatter import Format
+
+
+"""
+Export of documents to text streams.
+
+A renderer turns the *(substring, format)* runs into text. The runs
+are cut into chunks of about *chunk_size* characters at run
+boundaries; a chunk is the text of its runs (one slice) and their
+*(length, format)* items, so that it can be rendered independently.
+*export* renders the chunks one after the other and
+*export_parallel* renders them in a process pool and writes them in
+order. Both accept an editor or a snapshot (SEE
+TextEditor.snapshot), which can be exported while the editor is
+being modified. Each chunk is written at once (buffered writes): the
+memory used is bounded by the chunk size or by the largest run.
+
+The markup renderers (HTML, ANSI escape codes, Markdown) read the
+properties of the formats (SEE PropertyFormatter): *bold*, *italic*,
+*underline*, *strike*, *code*, *colour*, *background* and *link*.
+The formats which aren't mappings are rendered as plain text. The
+markup of each distinct format is computed once. The link targets
+are rendered without their control characters and only if their URL
+scheme is safe (SEE MarkupRenderer.SCHEMES); the colours are names
+(SEE COLOURS) or '#rrggbb'.
+"""
+
+CHUNK_SIZE = 1 << 20
+
+# Default chunk size of *export* (serial).
+BUFFER_SIZE = 1 << 16
+
+
+class Renderer(ABC):
+    """
+    Subclasses define *render_run*. They have to be picklable.
+    *line_start* tells whether a chunk starts a line.
+    """
+
+
+    def header(self):
+        return ''
+
+
+    def footer(self):
+        return ''
+
+
+    @abstractmethod
+    def render_run(self, s, format):
+        pass
+
+
+    def render_chunk(self, text, runs, line_start = True):
+        parts = []
+        pos = 0
+        for length, format in runs:
+            parts.append(self.render_run(text[pos:(pos + length)], format))
+            pos += length
+        return ''.join(parts)
+
+
+
+class JSONLinesRenderer(Renderer):
+    """ One *[substring, format]* JSON array per line. """
+
+
+    def render_run(self, s, format):
+        if isinstance(format, Format):
+            format = dict(format.items())
+        return json.dumps([s, format], ensure_ascii = False) + '\n'
+
+
+
+def _property(format, name):
+    get = getattr(format, 'get', None)
+    return None if get is None else get(name)
+
+
+# C0 and C1 control characters (SEE MarkupRenderer.link).
+_CONTROL_CHARACTERS = dict.fromkeys([*range(0x20), *range(0x7f, 0xa0)])
+
+# The control characters of a text shown as '\xhh' (SEE
+# ANSIRenderer.escape).
+_VISIBLE_CONTROL_CHARACTERS = {c: f'\\x{c:02x}'
+                               for c in _CONTROL_CHARACTERS
+                               if c not in (ord('\n'), ord('\t'))}
+
+# The colour names of the markup renderers (with their ANSI codes).
+COLOURS = {'black': 0, 'red': 1, 'green': 2, 'yellow': 3,
+           'blue': 4, 'magenta': 5, 'cyan': 6, 'white': 7}
+
+_RGB = re.compile(r'#[0-9A-Fa-f]{6}')
+
+_SCHEME = re.compile(r'([A-Za-z][A-Za-z0-9+.-]*):')
+
+
+
+class MarkupRenderer(Renderer):
+    """
+    A run is rendered as *opening + escape(s) + closing* where
+    *(opening, closing)* is the markup of its format. Subclasses
+    define *markup* and *escape*.
+    """
+
+    # The URL schemes of the rendered links. The relative URLs are
+    # rendered too.
+    SCHEMES = frozenset(['http', 'https', 'mailto'])
+
+
+    def __init__(self):
+        self._cache = {}
+
+
+    @abstractmethod
+    def markup(self, format):
+        pass
+
+
+    def link(self, format):
+        """
+        The target of the link of a format without its control
+        characters (which could end an escape sequence). None if
+        there is no link or if its scheme isn't in SCHEMES.
+        """
+        value = _property(format, 'link')
+        if not value:
+            return None
+        target = str(value).translate(_CONTROL_CHARACTERS).strip()
+        match = _SCHEME.match(target)
+        if match is not None and match.group(1).lower() not in self.SCHEMES:
+            return None
+        return target or None
+
+
+    def escape(self, s):
+        return s
+
+
+    def cached_markup(self, format):
+        try:
+            markup = self._cache.get(format)
+        except TypeError:
+            # Unhashable format.
+            return self.markup(format)
+        if markup is None:
+            markup = self._cache[format] = self.markup(format)
+        return markup
+
+
+    def render_run(self, s, format):
+        opening, closing = self.cached_markup(format)
+        return opening + self.escape(s) + closing
+
+
+    def __getstate__(self):
+        # The cache isn't sent to the processes (SEE export_parallel).
+        return dict(self.__dict__, _cache = {})
+
+
+
+class HTMLRenderer(MarkupRenderer):
+
+    TAGS = [('link', 'a'), ('bold', 'b'), ('italic', 'i'),
+            ('underline', 'u'), ('strike', 's'), ('code', 'code')]
+
+
+    def header(self):
+        return '<div style="white-space: pre-wrap">'
+
+
+    def footer(self):
+        return '</div>'
+
+
+    def escape(self, s):
+        return html.escape(s, quote = False)
+
+
+    def markup(self, format):
+        opening = []
+        closing = []
+        styles = []
+        for name, css in (('colour', 'color'),
+                          ('background', 'background-color')):
+            colour = _property(format, name)
+            # Any other value could inject CSS.
+            if colour in COLOURS or (isinstance(colour, str)
+                                     and _RGB.fullmatch(colour)):
+                styles.append(f'{css}: {colour}')
+        if styles:
+            style = '; '.join(styles)
+            opening.append(f'<span style="{style}">')
+            closing.append('</span>')
+        for name, tag in self.TAGS:
+            if name == 'link':
+                link = self.link(format)
+                if link is None:
+                    continue
+                opening.append(f'<a href="{html.escape(link)}">')
+            elif _property(format, name):
+                opening.append(f'<{tag}>')
+            else:
+                continue
+            closing.append(f'</{tag}>')
+        return ''.join(opening), ''.join(reversed(closing))
+
+
+
+class ANSIRenderer(MarkupRenderer):
+    """
+    SGR escape codes (and OSC 8 hyperlinks). The control characters
+    of the text (but the line feeds and the tabs) are shown as '\\xhh'
+    so that the text can't send escape sequences to the terminal.
+    """
+
+    COLOURS = COLOURS
+
+    CODES = [('bold', '1'), ('italic', '3'), ('underline', '4'),
+             ('strike', '9')]
+
+
+    def _colour(self, value, base):
+        """ *base* is 30 (foreground) or 40 (background). """
+        if value in self.COLOURS:
+            return str(base + self.COLOURS[value])
+        if isinstance(value, str) and _RGB.fullmatch(value):
+            r, g, b = (int(value[k:(k + 2)], 16) for k in (1, 3, 5))
+            return f'{base + 8};2;{r};{g};{b}'
+        return None
+
+
+    def escape(self, s):
+        return s.translate(_VISIBLE_CONTROL_CHARACTERS)
+
+
+    def markup(self, format):
+        codes = [code for name, code in self.CODES
+                 if _property(format, name)]
+        for name, base in (('colour', 30), ('background', 40)):
+            code = self._colour(_property(format, name), base)
+            if code is not None:
+                codes.append(code)
+        opening = closing = ''
+        if codes:
+            opening = '\x1b[' + ';'.join(codes) + 'm'
+            closing = '\x1b[0m'
+        link = self.link(format)
+        if link is not None:
+            opening += f'\x1b]8;;{link}\x1b\\'
+            closing = '\x1b]8;;\x1b\\' + closing
+        return opening, closing
+
+
+
+class MarkdownRenderer(MarkupRenderer):
+    """
+    The emphasis is rendered with inline HTML tags: unlike the '*'
+    markers, they don't depend on the characters around them (the
+    flanking rules of CommonMark). The markup is applied line by line
+    and the spaces at the edges of a run are left outside of it. The
+    link targets are angle-bracket destinations.
+    At the start of a line, the markers of lists, thematic breaks and
+    setext headings are escaped and the first character of an
+    indentation is an entity (no indented code block).
+    """
+
+    TAGS = [('bold', 'b'), ('italic', 'i'), ('strike', 's'),
+            ('code', 'code')]
+
+    SPECIAL_CHARACTERS = str.maketrans({c: '\\' + c
+                                        for c in '\\`*_[]<>#~|&'})
+
+    # In an angle-bracket destination.
+    LINK_CHARACTERS = str.maketrans({c: '\\' + c for c in '\\<>'})
+
+    # The block markers at the start of a line ('*', '#', '>', '_',
+    # '`' and '~' are always escaped). The blank lines are unchanged.
+    LINE_START = re.compile(r'^(?:[ \t](?=[ \t]*\S)|[-+=]|\d{1,9}[.)])',
+                            re.MULTILINE)
+
+    ENTITIES = {' ': '&#32;', '\t': '&#9;'}
+
+
+    def escape(self, s):
+        return s.translate(self.SPECIAL_CHARACTERS)
+
+
+    def markup(self, format):
+        tags = [tag for name, tag in self.TAGS if _property(format, name)]
+        opening = ''.join(f'<{tag}>' for tag in tags)
+        closing = ''.join(f'</{tag}>' for tag in reversed(tags))
+        link = self.link(format)
+        if link is not None:
+            opening = '[' + opening
+            closing += f'](<{link.translate(self.LINK_CHARACTERS)}>)'
+        return opening, closing
+
+
+    def _neutralise(self, match):
+        marker = match.group()
+        if marker in self.ENTITIES:
+            return self.ENTITIES[marker]
+        return marker[:-1] + '\\' + marker[-1]
+
+
+    def render_chunk(self, text, runs, line_start = True):
+        parts = []
+        pos = 0
+        for length, format in runs:
+            s = text[pos:(pos + length)]
+            parts.append(self.render_run(s, format, line_start))
+            if s:
+                line_start = s.endswith('\n')
+            pos += length
+        return ''.join(parts)
+
+
+    def render_run(self, s, format, line_start = True):
+        """ *line_start* tells whether *s* starts a line. """
+        opening, closing = self.cached_markup(format)
+        if not opening:
+            s = self.escape(s)
+        else:
+            lines = []
+            for line in s.split('\n'):
+                text = line.strip()
+                if text:
+                    a = len(line) - len(line.lstrip())
+                    line = (line[:a] + opening + self.escape(text) + closing
+                            + line[(a + len(text)):])
+                lines.append(line)
+            s = '\n'.join(lines)
+        if line_start:
+            return self.LINE_START.sub(self._neutralise, s)
+        k = s.find('\n') + 1
+        if not k:
+            return s
+        return s[:k] + self.LINE_START.sub(self._neutralise, s[k:])
+
+
+def iter_chunks(editor, chunk_size = CHUNK_SIZE):
+    """ The *(text, runs)* chunks of the document. """
+    if len(editor.text) == 0:
+        return
+    tags = editor.tags
+    tag_id, _, _ = editor._get_pos_tag(0)
+    start = size = 0
+    runs = []
+    while tag_id is not None:
+        length, format = tags[tag_id]
+        runs.append((length, format))
+        size += length
+        if size >= chunk_size:
+            yield editor.text[start:(start + size)], runs
+            start += size
+            size = 0
+            runs = []
+        tag_id = tags.next(tag_id)
+    if runs:
+        yield editor.text[start:(start + size)], runs
+
+
+def export(editor, renderer, stream, chunk_size = BUFFER_SIZE):
+    stream.write(renderer.header())
+    line_start = True
+    for text, runs in iter_chunks(editor, chunk_size):
+        stream.write(renderer.render_chunk(text, runs, line_start))
+        line_start = text.endswith('\n')
+    stream.write(renderer.footer())
+
+
+def export_parallel(editor,
+                    renderer,
+                    stream,
+                    processes = None,
+                    chunk_size = CHUNK_SIZE,
+                    max_pending = None):
+    """
+    At most *max_pending* chunks (by default twice the number of
+    processes) are being rendered or waiting to be written.
+    """
+    processes = processes or os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = 2 * processes
+    stream.write(renderer.header())
+    with ProcessPoolExecutor(processes) as executor:
+        pending = deque()
+        line_start = True
+        for text, runs in iter_chunks(editor, chunk_size):
+            if len(pending) >= max_pending:
+                stream.write(pending.popleft().result())
+            pending.append(executor.submit(renderer.render_chunk,
+                                           text, runs, line_start))
+            line_start = text.endswith('\n')
+        while pending:
+            stream.write(pending.popleft().result())
+    stream.write(renderer.footer())
@@ -0,0 +1,199 @@
+from collections import namedtuple, deque
+
+
+"""
+Deltas returned by the edition functions of *TextEditor* and the
+undo/redo journal.
+
+A delta only contains the modified range: its position, the
+inserted or deleted text and the runs ([length, format] lists)
+covering this text. Therefore, undoing a modification costs
+O(size of the modification).
+"""
+
+class Insertion(namedtuple('Insertion', ['pos', 'text', 'runs'])):
+    __slots__ = ()
+
+
+    @property
+    def size(self):
+        return len(self.text) + len(self.runs)
+
+
+    @property
+    def cursor_pos(self):
+        """ The cursor position once the delta is applied. """
+        return self.pos + len(self.text)
+
+
+    def inverse(self):
+        return Deletion(*self)
+
+
+
+class Deletion(namedtuple('Deletion', ['pos', 'text', 'runs'])):
+    __slots__ = ()
+
+
+    @property
+    def size(self):
+        return len(self.text) + len(self.runs)
+
+
+    @property
+    def cursor_pos(self):
+        return self.pos
+
+
+    def inverse(self):
+        return Insertion(*self)
+
+
+
+class FormatChange(namedtuple('FormatChange',
+                              ['pos', 'old_runs', 'new_runs'])):
+    __slots__ = ()
+
+
+    @property
+    def size(self):
+        return len(self.old_runs) + len(self.new_runs)
+
+
+    @property
+    def cursor_pos(self):
+        return self.pos
+
+
+    def inverse(self):
+        return FormatChange(self.pos, self.new_runs, self.old_runs)
+
+
+
+class Batch(namedtuple('Batch', ['deltas'])):
+    """
+    Deltas applied in a row (SEE TextEditor.apply_batch).
+    """
+    __slots__ = ()
+
+
+    @property
+    def size(self):
+        return sum(delta.size for delta in self.deltas)
+
+
+    @property
+    def cursor_pos(self):
+        return self.deltas[-1].cursor_pos
+
+
+    def inverse(self):
+        return Batch(tuple(delta.inverse()
+                           for delta in reversed(self.deltas)))
+
+
+
+
+def _append_run(runs, run):
+    if runs and runs[-1][1] == run[1]:
+        runs[-1] = [runs[-1][0] + run[0], run[1]]
+    else:
+        runs.append(run)
+
+
+
+class Journal:
+    """
+    Undo and redo stacks of deltas.
+    Consecutive single character insertions (typing) and deletions
+    (backspace or delete keys) are merged into a single delta.
+    The total size of the recorded deltas (characters plus runs)
+    is bounded by *max_size*: the oldest deltas are forgotten.
+    """
+
+    # Maximal length of a merged typing sequence.
+    MAX_MERGED = 256
+
+
+    def __init__(self, max_size = 1 << 20):
+        self.max_size = max_size
+        self._undo = deque()
+        self._redo = []
+        self._size = 0
+
+
+    @property
+    def size(self):
+        return self._size
+
+
+    def can_undo(self):
+        return len(self._undo) > 0
+
+
+    def can_redo(self):
+        return len(self._redo) > 0
+
+
+    def clear(self):
+        self._undo.clear()
+        self._redo = []
+        self._size = 0
+
+
+    def record(self, delta):
+        """ A new modification cancels the redo stack. """
+        for old in self._redo:
+            self._size -= old.size
+        self._redo = []
+        merged = self._undo and self._merge(self._undo[-1], delta)
+        if merged:
+            self._size -= self._undo.pop().size
+            delta = merged
+        self._undo.append(delta)
+        self._size += delta.size
+        while self._size > self.max_size and self._undo:
+            self._size -= self._undo.popleft().size
+
+
+    def _merge(self, last, delta):
+        if (type(last) != type(delta) or
+            isinstance(delta, (FormatChange, Batch)) or
+            len(delta.text) != 1 or
+            len(last.text) >= self.MAX_MERGED):
+            return None
+        if isinstance(delta, Insertion):
+            if delta.pos == last.pos + len(last.text):
+                runs = list(last.runs)
+                _append_run(runs, delta.runs[0])
+                return Insertion(last.pos, last.text + delta.text, runs)
+        elif isinstance(delta, Deletion):
+            if delta.pos == last.pos - 1:
+                # Backspace key.
+                runs = [delta.runs[0]]
+                for run in last.runs:
+                    _append_run(runs, run)
+                return Deletion(delta.pos, delta.text + last.text, runs)
+            if delta.pos == last.pos:
+                # Delete key.
+                runs = list(last.runs)
+                _append_run(runs, delta.runs[0])
+                return Deletion(last.pos, last.text + delta.text, runs)
+        return None
+
+
+    def undo(self):
+        """ The delta to apply in order to undo the last modification. """
+        if not self._undo:
+            return None
+        delta = self._undo.pop()
+        self._redo.append(delta)
+        return delta.inverse()
+
+
+    def redo(self):
+        if not self._redo:
+            return None
+        delta = self._redo.pop()
+        self._undo.append(delta)
+        return delta
@@ -0,0 +1,229 @@
+from . import versions
+from .versions import VersionedArray
+from .weightedTree import WeightedTree
+
+
+"""
+The lines of a text are defined like the lines of
+*(text + 'x').splitlines(keepends = True)* without the final 'x'.
+Therefore, a text with n line ending groups has n + 1 lines and
+the last line can be empty.
+"""
+
+def _split_region(region, is_last):
+    """
+    A region made of complete lines always ends with a line ending
+    group except if it contains the last line.
+    """
+    if is_last:
+        lines = (region + 'x').splitlines(keepends = True)
+        lines[-1] = lines[-1][:-1]
+        return lines
+    return region.splitlines(keepends = True)
+
+
+def _ending_length(line):
+    if not line:
+        return 0
+    return len(line) - len(line.splitlines()[0])
+
+
+
+class LineIndex:
+    """
+    Each line is a node of a *WeightedTree* whose weight is the line
+    length (line ending group included). Position to (line, column)
+    conversions and their inverses cost O(log n).
+    The index is updated incrementally after each modification of
+    the text (*insert*, *delete*). Only the lines touched by the
+    modification are read again.
+
+    The index of a mapped text (SEE textBuffer.MappedBuffer) starts
+    with one node per block of lines (a node of several units whose
+    ending length is BLOCK) so that opening a document doesn't decode
+    it. A block is split into lines by the first modification which
+    touches it; the reads only split it temporarily (the lines of
+    the last read block are cached).
+    """
+
+    BLOCK = -1
+
+
+    def __init__(self, text = None):
+        """ *text* is a str or a text buffer. """
+        self._tree = WeightedTree()
+        self._ending = VersionedArray('b')
+        self._free = []
+        text = '' if text is None else text
+        # The text is read by the lookups inside the blocks.
+        self._text = text
+        self._block = None
+        blocks = getattr(text, 'line_blocks', None)
+        blocks = None if blocks is None else blocks()
+        if blocks is not None:
+            nodes = [self._allocate_block() for _ in blocks]
+            self._tree.build(nodes, [length for length, _ in blocks],
+                             [count for _, count in blocks])
+            return
+        if isinstance(text, str):
+            lines = _split_region(text, True)
+        else:
+            lines = list(text.lines(keepends = True))
+        nodes = [self._allocate(line) for line in lines]
+        self._tree.build(nodes, [len(line) for line in lines])
+
+
+    def __len__(self):
+        """ The number of lines. """
+        return len(self._tree)
+
+
+    @property
+    def total(self):
+        """ The number of characters. """
+        return self._tree.total
+
+
+    def version(self, text):
+        """
+        A read-only index whose content is the current one, whatever
+        the later modifications (SEE versions). *text* is the version
+        of the text.
+        """
+        index = LineIndex.__new__(LineIndex)
+        index._tree = self._tree.version()
+        index._ending = versions.version(self._ending)
+        index._free = []
+        index._text = text
+        index._block = None
+        return index
+
+
+    def release(self):
+        versions.release(self._ending)
+        self._tree.release()
+
+
+    def _allocate(self, line):
+        if self._free:
+            node = self._free.pop()
+            self._ending[node] = _ending_length(line)
+        else:
+            node = len(self._ending)
+            self._ending.append(_ending_length(line))
+        return node
+
+
+    def _allocate_block(self):
+        node = len(self._ending)
+        self._ending.append(self.BLOCK)
+        return node
+
+
+    def _lines(self, node, start):
+        """ The lines of a block starting at *start*. """
+        block = self._block
+        if block is not None and block[0] == node:
+            return block[1]
+        region = self._text[start:(start + self._tree.weight(node))]
+        lines = _split_region(region, self._tree.next(node) is None)
+        self._block = (node, lines)
+        return lines
+
+
+    def _line(self, line_nb):
+        """ The node, the position and the line (or None) of a line. """
+        node, start = self._tree.select(line_nb)
+        if self._ending[node] != self.BLOCK:
+            return (node, start, None)
+        lines = self._lines(node, start)
+        k = line_nb - self._tree.rank(node)
+        for line in lines[:k]:
+            start += len(line)
+        return (node, start, lines[k])
+
+
+    def line_start(self, line_nb):
+        """ The position of the first character of a line (zero-based). """
+        return self._line(line_nb)[1]
+
+
+    def line_length(self, line_nb, keepends = False):
+        node, _, line = self._line(line_nb)
+        if line is None:
+            length = self._tree.weight(node)
+            ending = self._ending[node]
+        else:
+            length = len(line)
+            ending = _ending_length(line)
+        return length if keepends else length - ending
+
+
+    def locate(self, pos):
+        """
+        The zero-based line and column of the position *pos*.
+        *pos* is allowed to be the length of the text.
+        """
+        node, start = self._tree.find(pos)
+        line_nb = self._tree.rank(node)
+        if self._ending[node] == self.BLOCK:
+            lines = self._lines(node, start)
+            # The last line of the block if *pos* is after it.
+            for line in lines[:-1]:
+                if pos < start + len(line):
+                    break
+                start += len(line)
+                line_nb += 1
+        return (line_nb,
+                pos - start)
+
+
+    def insert(self, text, pos, length):
+        """
+        *length* characters have been inserted in *text* at *pos*.
+        """
+        self._update(text, pos, pos, length)
+
+
+    def delete(self, text, i, j):
+        """
+        The characters from i (included) to j (excluded) have been
+        deleted from *text*.
+        """
+        self._update(text, i, j, 0)
+
+
+    def _update(self, text, i, j, length):
+        """
+        The old range [i, j) has been replaced by *length* characters.
+        *text* is the new text. The positions before i are unchanged.
+        The blocks containing the range are split.
+        """
+        self._text = text
+        self._block = None
+        first, start = self._tree.find(i)
+        if i == start and start > 0 and text[start - 1] == '\r':
+            # The previous line ends with '\r' which may be joined
+            # with a '\n' to form a single line ending group.
+            first = self._tree.previous(first)
+            start -= self._tree.weight(first)
+        last, last_start = self._tree.find(j)
+        old_end = last_start + self._tree.weight(last)
+        is_last = self._tree.next(last) is None
+        new_end = old_end - (j - i) + length
+        lines = _split_region(text[start:new_end], is_last)
+        # The old lines are replaced by the new ones.
+        node = self._tree.next(first) if first != last else None
+        while node is not None:
+            following = self._tree.next(node) if node != last else None
+            self._tree.remove(node)
+            self._free.append(node)
+            node = following
+        self._ending[first] = _ending_length(lines[0])
+        self._tree.set_weight(first, len(lines[0]))
+        self._tree.set_units(first, 1)
+        predecessor = first
+        for line in lines[1:]:
+            node = self._allocate(line)
+            self._tree.insert(node, len(line), predecessor)
+            predecessor = node
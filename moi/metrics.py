@@ -0,0 +1,168 @@
+from functools import wraps
+import threading
+import time
+
+
+"""
+Opt-in performance counters and latency histograms.
+
+Like the tracing (SEE tracing), the metrics are disabled by default
+and the call sites check *metrics.enabled* before counting anything.
+*snapshot* returns plain dicts which can be exported to a monitoring
+system and *reset* starts a new measurement period.
+
+Only the top-level operations are timed: the operations called by
+another one (in the same thread) are part of its latency. The
+counters are also attributed to the top-level operation in progress.
+"""
+
+class Histogram:
+    """
+    Latencies in buckets whose upper bounds are powers of two
+    microseconds (1 us, 2 us, ... about 1 min). The last bucket
+    holds larger values.
+    """
+
+    BUCKETS = 27
+
+
+    def __init__(self):
+        self.reset()
+
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (self.BUCKETS + 1)
+
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        # The bucket k holds the values from 2 ** (k - 1) to 2 ** k us.
+        k = int(seconds * 1e6).bit_length()
+        self.buckets[min(k, self.BUCKETS)] += 1
+
+
+    def quantile(self, q):
+        """ Upper bound (in seconds) of the bucket of the quantile *q*. """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for k, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return min(2 ** k * 1e-6, self.max)
+        return self.max
+
+
+    def snapshot(self):
+        return {'count': self.count,
+                'total': self.total,
+                'mean': self.total / self.count if self.count else 0.0,
+                'max': self.max,
+                'p50': self.quantile(0.5),
+                'p99': self.quantile(0.99),
+                'buckets': list(self.buckets)}
+
+
+
+class Metrics:
+
+
+    def __init__(self):
+        self.enabled = False
+        self.counters = {}
+        # Operation -> counters counted during the operation.
+        self.operations = {}
+        self.histograms = {}
+        # The top-level operation in progress in each thread.
+        self._local = threading.local()
+
+
+    @property
+    def operation(self):
+        """ The top-level operation in progress (None if there is none). """
+        return getattr(self._local, 'operation', None)
+
+
+    def enable(self):
+        self.enabled = True
+
+
+    def disable(self):
+        self.enabled = False
+
+
+    def count(self, name, n = 1):
+        """ The caller is responsible for checking *enabled* first. """
+        self.counters[name] = self.counters.get(name, 0) + n
+        operation = getattr(self._local, 'operation', None)
+        if operation is not None:
+            counters = self.operations.get(operation)
+            if counters is None:
+                counters = self.operations[operation] = {}
+            counters[name] = counters.get(name, 0) + n
+
+
+    def observe(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+
+    def snapshot(self):
+        return {'counters': dict(self.counters),
+                'operations': {operation: dict(counters)
+                               for operation, counters
+                               in self.operations.items()},
+                'histograms': {name: histogram.snapshot()
+                               for name, histogram
+                               in self.histograms.items()}}
+
+
+    def reset(self):
+        self.counters.clear()
+        self.operations.clear()
+        self.histograms.clear()
+
+
+    def __repr__(self):
+        return (f'Metrics(enabled {self.enabled}, '
+                f'{len(self.counters)} counters, '
+                f'{len(self.histograms)} histograms)')
+
+
+
+def timed(name):
+    """
+    Decorator of the public methods of the instrumented classes.
+    The top-level calls and their latency are recorded in
+    *self.metrics* under *name*.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            metrics = self.metrics
+            local = metrics._local
+            if (not metrics.enabled
+                or getattr(local, 'operation', None) is not None):
+                return method(self, *args, **kwargs)
+            local.operation = name
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                metrics.observe(name, time.perf_counter() - start)
+                local.operation = None
+        return wrapper
+    return decorator
+
+
+# The metrics shared by default by all editors and tag lists.
+metrics = Metrics()
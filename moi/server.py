@@ -0,0 +1,345 @@
+import asyncio
+import json
+import sys
+
+from .textEditor import TextEditor, TreeTags
+from .textFormatter import Format, PropertyFormatter
+
+
+"""
+Asyncio command server (JSON lines on a Unix socket or stdio).
+
+Each request is a JSON object on one line:
+    {"id": 1, "document": "notes", "command": "edit", "args": ["abc"],
+     "format": {"bold": true}}
+and is answered by
+    {"id": 1, "result": ...} or {"id": 1, "error": "..."}
+
+The commands are *open* (args: [text]), *close*, *edit* (args: [s],
+optional format), *delete*, *change_position* (args: [pos]),
+*delete_selection* (args: [i, j]), *change_selection_format* (args:
+[i, j], format), *undo*, *redo* and *compile* (args: [i, j], both
+optional). The args are checked before the editor is changed (SEE
+ARGS). The formats are JSON objects of properties (SEE
+PropertyFormatter).
+
+The requests of a document are queued and executed in order by a
+task of the document, which takes all the queued requests at once
+(pipelining). After each batch, the change of the rendering (SEE
+TextEditor.compile_changes) is sent once to the sessions which have
+opened the document, before the answers of the batch:
+    {"document": "notes", "delta": {"start": 0, "end": 0,
+                                    "runs": [[0, "abc", {}], ...]}}
+A request which is rejected (SEE REQUEST_ERRORS) is answered by an
+error and the next ones are executed. Any other error may have left
+the editor half-modified: the failing request is answered by its
+error, the document is closed and its pending requests are answered
+by an error. So is a document whose task dies.
+"""
+
+# Upper bound of the number of requests of a batch.
+MAX_BATCH = 256
+
+# Upper bound of the number of queued requests of a document. The
+# sessions stop reading their requests when the queue is full.
+MAX_QUEUED = 4 * MAX_BATCH
+
+# Upper bound of the size of a request.
+LINE_LIMIT = 1 << 26
+
+# The errors of the requests which are rejected before the editor is
+# modified: by *_check_args*, *decode_format* and the checks of the
+# positions and ranges of the editor.
+REQUEST_ERRORS = (IndexError, ValueError, TypeError)
+
+# The types of the args of the commands (an int is a position).
+ARGS = {'open': [(), (str,)],
+        'close': [()],
+        'edit': [(str,)],
+        'delete': [()],
+        'change_position': [(int,)],
+        'delete_selection': [(int, int)],
+        'change_selection_format': [(int, int)],
+        'undo': [()],
+        'redo': [()],
+        'compile': [(), (int,), (int, int)]}
+
+
+def _encode_format(format):
+    return dict(format.items()) if isinstance(format, Format) else format
+
+
+def _encode_runs(runs):
+    return [[s, _encode_format(format)] for s, format in runs]
+
+
+def _check_args(command, args):
+    """ To check *args* before they reach the editor. """
+    if command not in ARGS:
+        raise ValueError(f'Unknown command {command!r}.')
+    if not isinstance(args, list):
+        raise TypeError(f'the args of {command} have to be a list.')
+    for types in ARGS[command]:
+        if (len(args) == len(types)
+            and all(isinstance(arg, t) and not isinstance(arg, bool)
+                    for arg, t in zip(args, types))):
+            return
+    raise TypeError(f'bad args for {command}: {args!r}.')
+
+
+
+class Session:
+    """ A client connection. """
+
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.documents = set()
+
+
+    def send(self, message):
+        self.writer.write(json.dumps(message, separators = (',', ':'))
+                          .encode('utf-8') + b'\n')
+
+
+    async def drain(self):
+        try:
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+
+
+
+class Document:
+
+
+    def __init__(self, name, editor):
+        self.name = name
+        self.editor = editor
+        self.sessions = set()
+        self.queue = asyncio.Queue(maxsize = MAX_QUEUED)
+        # The requests taken from the queue and not answered yet.
+        self.batch = []
+        self.task = None
+
+
+
+class CommandServer:
+    """
+    *Formatter* and *TagList* are used for the new documents. The
+    formats received in the requests are converted by *decode_format*
+    (by default, a *Format* interned by *Formatter*).
+    """
+
+
+    def __init__(self, Formatter = PropertyFormatter, TagList = TreeTags):
+        self.Formatter = Formatter
+        self.TagList = TagList
+        self.documents = {}
+
+
+    def decode_format(self, data):
+        if not isinstance(data, dict):
+            raise TypeError('a format has to be a JSON object.')
+        return self.Formatter.intern(Format(data))
+
+
+    def create_editor(self, text):
+        editor = TextEditor(self.Formatter, TagList = self.TagList)
+        if text:
+            editor.edit(text)
+            # The first delta renders the whole text.
+            editor.journal.clear()
+        return editor
+
+
+    async def handle(self, reader, writer):
+        """ The connection callback (SEE asyncio.start_unix_server). """
+        session = Session(reader, writer)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    name = request['document']
+                    command = request['command']
+                except (ValueError, KeyError, TypeError) as error:
+                    session.send({'error': f'Bad request: {error}'})
+                    continue
+                if not isinstance(name, str):
+                    session.send({'id': request.get('id'),
+                                  'error': 'Bad request: the document name'
+                                           ' has to be a string.'})
+                    continue
+                document = self.documents.get(name)
+                if document is None:
+                    if command != 'open':
+                        session.send({'id': request.get('id'),
+                                      'error': f'Unknown document {name!r}.'})
+                        continue
+                    try:
+                        document = self._open(name, request)
+                    except ValueError as error:
+                        session.send({'id': request.get('id'),
+                                      'error': f'Bad request: {error}'})
+                        continue
+                await document.queue.put((session, request))
+                if document.task.done():
+                    # The document was closed while the queue was full.
+                    self._reject(document)
+        finally:
+            for name in list(session.documents):
+                self._leave(self.documents.get(name), session)
+            writer.close()
+
+
+    def _open(self, name, request):
+        args = request.get('args') or ['']
+        try:
+            _check_args('open', args)
+        except TypeError:
+            raise ValueError('the args of open are [text].') from None
+        document = Document(name, self.create_editor(args[0]))
+        document.task = asyncio.get_running_loop().create_task(
+            self._run(document))
+        self.documents[name] = document
+        return document
+
+
+    def _leave(self, document, session):
+        if document is None:
+            return
+        document.sessions.discard(session)
+        session.documents.discard(document.name)
+        if not document.sessions and document.queue.empty():
+            del self.documents[document.name]
+            document.task.cancel()
+
+
+    async def _run(self, document):
+        try:
+            await self._serve(document)
+        finally:
+            # A task which dies closes its document, so that the waiting
+            # requests are answered and the next *open* starts anew.
+            if self.documents.get(document.name) is document:
+                del self.documents[document.name]
+            self._reject(document)
+
+
+    def _reject(self, document):
+        """ To answer the pending requests of a document which is closed. """
+        queue = document.queue
+        while not queue.empty():
+            document.batch.append(queue.get_nowait())
+        batch, document.batch = document.batch, []
+        for session, request in batch:
+            session.send({'id': request.get('id'),
+                          'error': f'The document {document.name!r}'
+                                   ' is closed.'})
+        for session in document.sessions:
+            session.documents.discard(document.name)
+
+
+    async def _serve(self, document):
+        queue = document.queue
+        while True:
+            batch = document.batch = [await queue.get()]
+            while not queue.empty() and len(batch) < MAX_BATCH:
+                batch.append(queue.get_nowait())
+            answers = []
+            sessions = set(document.sessions)
+            for k, (session, request) in enumerate(batch):
+                sessions.add(session)
+                try:
+                    result = self.execute(document, session, request)
+                except REQUEST_ERRORS as error:
+                    answers.append((session, {
+                        'id': request.get('id'),
+                        'error': f'{type(error).__name__}: {error}'}))
+                except Exception as error:
+                    # The editor can't be trusted any more: the
+                    # document is closed (SEE _run).
+                    answers.append((session, {
+                        'id': request.get('id'),
+                        'error': f'{type(error).__name__}: {error}'}))
+                    for session, answer in answers:
+                        session.send(answer)
+                    document.batch = batch[(k + 1):]
+                    raise
+                else:
+                    answers.append((session, {'id': request.get('id'),
+                                              'result': result}))
+            # The answers follow the delta of their batch.
+            delta = document.editor.compile_changes()
+            if delta is not None:
+                start, end, runs = delta
+                message = {'document': document.name,
+                           'delta': {'start': start,
+                                     'end': end,
+                                     'runs': [[pos, s, _encode_format(format)]
+                                              for pos, s, format in runs]}}
+                for session in sessions:
+                    if document.name in session.documents:
+                        session.send(message)
+            document.batch = []
+            for session, answer in answers:
+                session.send(answer)
+            for session in sessions:
+                await session.drain()
+            if not document.sessions and queue.empty():
+                return
+            # The other documents are served between two batches.
+            await asyncio.sleep(0)
+
+
+    def execute(self, document, session, request):
+        """ To execute a request. The result has to be a JSON value. """
+        editor = document.editor
+        command = request['command']
+        args = request.get('args', [])
+        _check_args(command, args)
+        if command == 'open':
+            document.sessions.add(session)
+            session.documents.add(document.name)
+            return len(editor.text)
+        if command == 'close':
+            document.sessions.discard(session)
+            session.documents.discard(document.name)
+            return None
+        if command == 'compile':
+            return _encode_runs(editor.compile(False, *args))
+        if 'format' in request:
+            format = self.decode_format(request['format'])
+            if command == 'change_selection_format':
+                editor.incremental_format = format
+            else:
+                editor.current_format = format
+        getattr(editor, command)(*args)
+        return editor.cursor_pos
+
+
+
+async def serve_unix(server, path):
+    unix_server = await asyncio.start_unix_server(server.handle, path,
+                                                  limit = LINE_LIMIT)
+    async with unix_server:
+        await unix_server.serve_forever()
+
+
+async def serve_stdio(server):
+    """ A single session on the standard input and output. """
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit = LINE_LIMIT)
+    await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    transport, protocol = await loop.connect_write_pipe(
+        asyncio.streams.FlowControlMixin, sys.stdout)
+    writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+    await server.handle(reader, writer)
@@ -0,0 +1,72 @@
+from contextlib import contextmanager
+import threading
+
+
+"""
+A document shared by a single writer thread and many reader threads.
+
+The writes are serialized by a lock. The readers never read the
+editor itself: they read published snapshots (SEE
+TextEditor.snapshot) which are never modified. A snapshot is
+published on demand, when a reader asks for the document after a
+write, and the document keeps the last one. A reader never waits for
+a write in progress: it gets the previous version. The writes only
+save the old values (SEE versions) of what they modify after the
+last published snapshot, so the memory used stays bounded.
+"""
+
+class SharedDocument:
+
+
+    def __init__(self, editor):
+        self.editor = editor
+        self._lock = threading.Lock()
+        self._version = 0
+        # (snapshot, version)
+        self._published = (editor.snapshot(), 0)
+
+
+    @property
+    def version(self):
+        """ The number of writes. """
+        return self._version
+
+
+    @contextmanager
+    def writing(self):
+        """
+        >>> with document.writing() as editor:
+        ...     editor.edit('abc')
+        """
+        with self._lock:
+            try:
+                yield self.editor
+            finally:
+                self._version += 1
+
+
+    def write(self, name, *args, **kwargs):
+        """ To call the method *name* of the editor. """
+        with self.writing() as editor:
+            return getattr(editor, name)(*args, **kwargs)
+
+
+    def snapshot(self, wait = False):
+        """
+        The last published snapshot. A new one is published if the
+        document has been modified since, unless a write is in
+        progress and *wait* is False.
+        """
+        snapshot, version = self._published
+        if version == self._version:
+            return snapshot
+        if not self._lock.acquire(blocking = wait):
+            return snapshot
+        try:
+            snapshot, version = self._published
+            if version != self._version:
+                snapshot = self.editor.snapshot()
+                self._published = (snapshot, self._version)
+        finally:
+            self._lock.release()
+        return snapshot
@@ -0,0 +1,69 @@
+from .textEditor import TextEditor
+
+
+"""
+Read-only views of a document (SEE TextEditor.snapshot).
+
+A snapshot reads versions of the text buffer, the line index and
+the tag list of the editor at the time it was taken (SEE versions).
+The editor keeps modifying the structures in place and saves the
+old values of the items it modifies while a snapshot is alive.
+Therefore, taking a snapshot costs O(1) and a modification costs
+O(1) more per modified item (instead of a copy of the structures).
+The snapshots are slower to read than the editor.
+"""
+
+class Snapshot:
+
+
+    def __init__(self, editor):
+        self.text = editor.text.version()
+        self.lines = editor.lines.version(self.text)
+        self.tags = editor.tags.version()
+        self.Formatter = editor.Formatter
+        self.cursor_pos = editor.cursor_pos
+        self.current_format = editor.current_format
+        self.tracer = editor.tracer
+        self.metrics = editor.metrics
+
+
+    def __len__(self):
+        return len(self.text)
+
+
+    def __getitem__(self, key):
+        """ Range extraction (int or slice). """
+        return self.text[key]
+
+
+    def __str__(self):
+        return str(self.text)
+
+
+    def runs(self, i = 0, j = None):
+        """ The [length, format] runs covering the text from i to j. """
+        return self._runs(i, len(self.text) if j is None else j)
+
+
+    def pos_to_line_column(self, i, line_base = 1, column_base = 0):
+        return TextEditor.pos_to_line_column(self.lines, i,
+                                             line_base, column_base)
+
+
+    def line_column_to_pos(self, line_nb, column, **kwargs):
+        return TextEditor.line_column_to_pos(self.lines, line_nb, column,
+                                             **kwargs)
+
+
+    # The read functions of the editor.
+    iter_runs = TextEditor.iter_runs
+    compile = TextEditor.compile
+    find_format = TextEditor.find_format
+    find_property = TextEditor.find_property
+    _runs = TextEditor._runs
+    _get_pos_tag = TextEditor._get_pos_tag
+    _check_pos = TextEditor._check_pos
+
+
+    def __repr__(self):
+        return f'Snapshot({len(self.text)} characters)'
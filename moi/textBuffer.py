@@ -0,0 +1,526 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict, namedtuple
+import copy
+import mmap
+
+from . import versions
+from .versions import VersionedList
+from .weightedTree import WeightedTree
+
+
+"""
+Text storages behind *TextEditor.text*.
+
+A text buffer behaves like a read-only string (len, indexing,
+slicing, comparison with a str) and can be modified in place with
+*insert* and *delete*. *chunks* gives the content piece by piece
+so that callers never need to build one big string.
+"""
+
+class AbstractTextBuffer(ABC):
+
+
+    @abstractmethod
+    def __init__(self, text = None):
+        pass
+
+
+    @abstractmethod
+    def __len__(self):
+        pass
+
+
+    @abstractmethod
+    def insert(self, pos, s):
+        pass
+
+
+    @abstractmethod
+    def delete(self, i, j):
+        """ From i (included) to j (excluded). """
+        pass
+
+
+    @abstractmethod
+    def chunks(self, i = 0, j = None):
+        """ The substring from i to j as a sequence of strings. """
+        pass
+
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            i, j, step = key.indices(len(self))
+            if step != 1:
+                return str(self)[key]
+            if j <= i:
+                return ''
+            return ''.join(self.chunks(i, j))
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('Wrong position.')
+        for chunk in self.chunks(key, key + 1):
+            return chunk
+
+
+    def lines(self, keepends = False):
+        """
+        Equivalent to *(text + 'x').splitlines(keepends)* without the
+        final 'x': the last line always exists and can be empty.
+        A line ending group ('\r\n') can be split between two chunks.
+        """
+        pending = ''
+        for chunk in self.chunks():
+            pieces = (pending + chunk).splitlines(keepends = True)
+            last = pieces[-1]
+            # The last piece is incomplete unless it ends with a line
+            # boundary other than '\r' (which could be followed by '\n').
+            if last[-1] == '\r' or last.splitlines()[0] == last:
+                pending = pieces.pop()
+            else:
+                pending = ''
+            for line in pieces:
+                yield line if keepends else line.splitlines()[0]
+        for line in (pending + 'x').splitlines(keepends = True):
+            if line.endswith('x'):
+                yield line[:-1]
+            else:
+                yield line if keepends else line.splitlines()[0]
+
+
+    def copy(self):
+        """ An independent copy of the buffer. """
+        return copy.deepcopy(self)
+
+
+    def version(self):
+        """
+        A read-only buffer whose content is the current one, whatever
+        the later modifications (SEE TextEditor.snapshot). By default,
+        a copy.
+        """
+        return self.copy()
+
+
+    def release(self):
+        """ The versions may become invalid (SEE versions.release). """
+        pass
+
+
+    def __str__(self):
+        return ''.join(self.chunks())
+
+
+    def __eq__(self, other):
+        if isinstance(other, AbstractTextBuffer):
+            other = str(other)
+        if not isinstance(other, str):
+            return NotImplemented
+        if len(other) != len(self):
+            return False
+        i = 0
+        for chunk in self.chunks():
+            if other[i:(i + len(chunk))] != chunk:
+                return False
+            i += len(chunk)
+        return True
+
+
+    def __repr__(self):
+        return f'{type(self).__name__}({str(self)!r})'
+
+
+
+
+class StringBuffer(AbstractTextBuffer):
+    """
+    The whole text is a single str. Any modification copies the text.
+    It is the simplest choice for small documents.
+    """
+
+
+    def __init__(self, text = None):
+        self._text = '' if text is None else str(text)
+
+
+    def __len__(self):
+        return len(self._text)
+
+
+    def copy(self):
+        # The str is immutable.
+        return copy.copy(self)
+
+
+    def insert(self, pos, s):
+        self._text = (self._text[:pos] +
+                      s +
+                      self._text[pos:])
+
+
+    def delete(self, i, j):
+        self._text = (self._text[:i] +
+                      self._text[j:])
+
+
+    def chunks(self, i = 0, j = None):
+        j = len(self._text) if j is None else j
+        if i < j:
+            yield self._text[i:j]
+
+
+
+
+class Rope(AbstractTextBuffer):
+    """
+    The text is cut into chunks of at most CHUNK_SIZE characters.
+    The chunks are the nodes of a *WeightedTree* whose weights are
+    the chunk lengths. Therefore, an insertion or a deletion costs
+    O(log n + CHUNK_SIZE) instead of O(len(text)).
+    The versions share the chunks and the tree (SEE versions).
+    """
+
+    CHUNK_SIZE = 1024
+
+
+    def __init__(self, text = None):
+        self._chunks = VersionedList()
+        self._free = []
+        self._tree = WeightedTree()
+        if text:
+            nodes = []
+            for k in range(0, len(text), self.CHUNK_SIZE // 2):
+                nodes.append(self._allocate(text[k:(k + self.CHUNK_SIZE // 2)]))
+            self._tree.build(nodes,
+                             [len(self._chunks[n]) for n in nodes])
+
+
+    def __len__(self):
+        return self._tree.total
+
+
+    def version(self):
+        rope = copy.copy(self)
+        rope._chunks = versions.version(self._chunks)
+        rope._free = []
+        rope._tree = self._tree.version()
+        return rope
+
+
+    def release(self):
+        versions.release(self._chunks)
+        self._tree.release()
+
+
+    def _allocate(self, chunk):
+        if self._free:
+            node = self._free.pop()
+            self._chunks[node] = chunk
+        else:
+            node = len(self._chunks)
+            self._chunks.append(chunk)
+        return node
+
+
+    def _release(self, node):
+        self._tree.remove(node)
+        self._chunks[node] = None
+        self._free.append(node)
+
+
+    def _set_chunk(self, node, chunk):
+        self._chunks[node] = chunk
+        self._tree.set_weight(node, len(chunk))
+
+
+    def _chunk(self, node):
+        """ The content of a chunk (SEE MappedBuffer). """
+        return self._chunks[node]
+
+
+    def _check_pos(self, pos):
+        if not 0 <= pos <= len(self):
+            raise IndexError('Wrong position.')
+
+
+    def insert(self, pos, s):
+        self._check_pos(pos)
+        if not s:
+            return
+        node, start = self._tree.find(pos)
+        if node is None:
+            chunk = s
+            predecessor = None
+        else:
+            offset = pos - start
+            if offset == 0:
+                # Appending to the previous chunk rather than prepending
+                # to the current one favours typing at the end of a chunk.
+                previous = self._tree.previous(node)
+                if previous is not None:
+                    node = previous
+                    offset = self._tree.weight(node)
+            old_chunk = self._chunk(node)
+            chunk = old_chunk[:offset] + s + old_chunk[offset:]
+            if len(chunk) <= self.CHUNK_SIZE:
+                self._set_chunk(node, chunk)
+                return
+            # The chunk is too large. It is split into several chunks.
+            size = self.CHUNK_SIZE // 2
+            self._set_chunk(node, chunk[:size])
+            chunk = chunk[size:]
+            predecessor = node
+        for k in range(0, len(chunk), self.CHUNK_SIZE // 2):
+            new_node = self._allocate(chunk[k:(k + self.CHUNK_SIZE // 2)])
+            self._tree.insert(new_node,
+                              len(self._chunks[new_node]),
+                              predecessor)
+            predecessor = new_node
+
+
+    def delete(self, i, j):
+        self._check_pos(i)
+        self._check_pos(j)
+        remaining = j - i
+        if remaining <= 0:
+            return
+        node, start = self._tree.find(i)
+        offset = i - start
+        previous = self._tree.previous(node)
+        while remaining > 0:
+            length = self._tree.weight(node)
+            end = min(length, offset + remaining)
+            following = self._tree.next(node)
+            remaining -= end - offset
+            if end - offset < length:
+                chunk = self._chunk(node)
+                self._set_chunk(node, chunk[:offset] + chunk[end:])
+                previous = node
+            else:
+                self._release(node)
+            node = following
+            offset = 0
+        # Small chunks around the deleted range are merged.
+        if previous is not None:
+            self._coalesce(previous)
+
+
+    def _coalesce(self, node):
+        following = self._tree.next(node)
+        if (following is not None and
+            (self._tree.weight(node) + self._tree.weight(following)
+             <= self.CHUNK_SIZE // 2)):
+            chunk = self._chunk(node) + self._chunk(following)
+            self._release(following)
+            self._set_chunk(node, chunk)
+
+
+    def chunks(self, i = 0, j = None):
+        j = len(self) if j is None else min(j, len(self))
+        if i >= j:
+            return
+        node, start = self._tree.find(i)
+        offset = i - start
+        while node is not None and start < j:
+            chunk = self._chunk(node)
+            end = min(len(chunk), j - start)
+            if offset > 0 or end < len(chunk):
+                yield chunk[offset:end]
+            else:
+                yield chunk
+            start += len(chunk)
+            offset = 0
+            node = self._tree.next(node)
+
+
+
+# A range of bytes of the mapped UTF-8 text which hasn't been modified.
+_Page = namedtuple('_Page', ['start', 'end'])
+
+# UTF-8 continuation bytes (0b10xxxxxx).
+_CONTINUATION_BYTES = bytes(range(0x80, 0xc0))
+
+# The line boundaries of *str.splitlines* (a '\r\n' group is one
+# boundary): the bytes of the ASCII ones and the UTF-8 encodings of
+# the others.
+_LINE_ENDING_BYTES = b'\n\r\x0b\x0c\x1c\x1d\x1e'
+_MULTIBYTE_LINE_ENDINGS = [c.encode('utf-8') for c in '\x85\u2028\u2029']
+_LAST_BYTES = bytes(ending[-1] for ending in _MULTIBYTE_LINE_ENDINGS)
+
+# The bytes which aren't an ASCII line boundary or the last byte of
+# a multibyte one.
+_OTHER_BYTES = bytes(set(range(256)) - set(_LINE_ENDING_BYTES + _LAST_BYTES))
+
+
+class MappedBuffer(Rope):
+    """
+    A rope whose initial chunks are pages of a UTF-8 text held in a
+    buffer (usually a memory-mapped file). The pages are decoded on
+    demand and the last decoded pages are cached. A modified page is
+    replaced by ordinary chunks (the overlay) and the rest of the
+    document is never loaded in memory.
+    Opening a document scans it once to count the characters of each
+    page. The lines are counted the same way (SEE line_blocks).
+    """
+
+    PAGE_SIZE = 1 << 16
+    CACHED_PAGES = 16
+
+
+    def __init__(self, data = None):
+        """ *data* is a str or a UTF-8 encoded bytes-like object. """
+        self._mapping = None
+        self._file = None
+        self._cache = OrderedDict()
+        if data is None or isinstance(data, str):
+            self._data = None
+            super().__init__(data)
+            return
+        super().__init__()
+        self._data = memoryview(data)
+        nodes = []
+        lengths = []
+        start = 0
+        size = len(self._data)
+        while start < size:
+            end = min(start + self.PAGE_SIZE, size)
+            # A page can't end inside a multibyte character.
+            while (end > start and end < size
+                   and self._data[end] in _CONTINUATION_BYTES):
+                end -= 1
+            if end == start:
+                # The page holds at least one whole character (pages
+                # smaller than a character).
+                end += 1
+                while end < size and self._data[end] in _CONTINUATION_BYTES:
+                    end += 1
+            # The number of characters is the number of bytes which
+            # aren't continuation bytes.
+            page = bytes(self._data[start:end])
+            lengths.append(len(page.translate(None, _CONTINUATION_BYTES)))
+            nodes.append(self._allocate(_Page(start, end)))
+            start = end
+        self._tree.build(nodes, lengths)
+
+
+    @classmethod
+    def open(cls, path):
+        """ To map the UTF-8 file *path* (read only). """
+        stream = open(path, 'rb')
+        try:
+            mapping = mmap.mmap(stream.fileno(), 0, access = mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be mapped.
+            stream.close()
+            return cls('')
+        buffer = cls(mapping)
+        buffer._mapping = mapping
+        buffer._file = stream
+        return buffer
+
+
+    def version(self):
+        """ The versions share the cache and don't own the mapped data. """
+        buffer = super().version()
+        buffer._mapping = buffer._file = None
+        return buffer
+
+
+    def close(self):
+        """
+        The buffer can't be used after being closed. Nor can its
+        versions.
+        """
+        self._cache.clear()
+        if self._data is not None:
+            self._data.release()
+            self._data = None
+        if self._mapping is not None:
+            self._mapping.close()
+            self._file.close()
+            self._mapping = self._file = None
+
+
+    def _chunk(self, node):
+        chunk = self._chunks[node]
+        if isinstance(chunk, str):
+            return chunk
+        # The cache may be shared by several reader threads (SEE
+        # snapshot): each step tolerates concurrent modifications.
+        text = self._cache.get(chunk)
+        if text is None:
+            text = str(self._data[chunk.start:chunk.end], 'utf-8')
+            self._cache[chunk] = text
+            while len(self._cache) > self.CACHED_PAGES:
+                try:
+                    self._cache.popitem(last = False)
+                except KeyError:
+                    break
+        else:
+            try:
+                self._cache.move_to_end(chunk)
+            except KeyError:
+                pass
+        return text
+
+
+    @property
+    def loaded(self):
+        """ The number of characters held in memory (overlay). """
+        return sum(len(chunk) for chunk in self._chunks
+                   if isinstance(chunk, str))
+
+
+    def line_blocks(self):
+        """
+        The lines of the text grouped by page without decoding it:
+        a list of *(length, count)* blocks of *count* complete lines
+        of *length* characters in total. A block ends after the last
+        line ending group of a page and the last block is the last
+        line (SEE lineIndex). None if the text has been modified.
+        """
+        nodes = []
+        node = self._tree.first()
+        while node is not None:
+            if isinstance(self._chunks[node], str):
+                return None
+            nodes.append(node)
+            node = self._tree.next(node)
+        blocks = []
+        length = 0
+        skip = 0
+        for k, node in enumerate(nodes):
+            page = self._chunks[node]
+            data = bytes(self._data[(page.start + skip):page.end])
+            # The characters of the page (SEE __init__).
+            page_length = self._tree.weight(node) - skip
+            skip = 0
+            # Most pages contain only '\n' boundaries.
+            marks = data.translate(None, _OTHER_BYTES)
+            count = len(marks.translate(None, _LAST_BYTES))
+            if b'\r' in marks:
+                count -= data.count(b'\r\n')
+            end = 0
+            for byte in _LINE_ENDING_BYTES:
+                if byte in marks:
+                    end = max(end, data.rfind(byte) + 1)
+            for ending in _MULTIBYTE_LINE_ENDINGS:
+                if ending[-1] in marks:
+                    count += data.count(ending)
+                    i = data.rfind(ending)
+                    if i >= 0:
+                        end = max(end, i + len(ending))
+            if count == 0:
+                length += page_length
+                continue
+            if (end == len(data) and data[-1] == ord('\r')
+                and k + 1 < len(nodes)
+                and self._data[self._chunks[nodes[k + 1]].start]
+                    == ord('\n')):
+                # The '\r\n' group is split between two pages.
+                skip = 1
+            tail = len(data[end:].translate(None, _CONTINUATION_BYTES))
+            blocks.append((length + page_length - tail + skip, count))
+            length = tail
+        blocks.append((length, 1))
+        return blocks
@@ -1,7 +1,18 @@
 from abc import ABC, abstractmethod
-import logging
 from pprint import pformat
 import copy
+import weakref
+
+from .textBuffer import AbstractTextBuffer, Rope
+from .lineIndex import LineIndex
+from .history import Batch, Insertion, Deletion, FormatChange, Journal
+from . import tracing
+from . import metrics
+from .metrics import timed
+from .commandLog import recorded
+from . import versions
+from .versions import VersionedArray, VersionedIndex, VersionedList
+from .weightedTree import WeightedTree, NIL
 
 
 """
@@ -42,13 +53,26 @@ The Free Type Project library.
 
 """
 
+def _line_index(s):
+    """
+    *s* is a *LineIndex* (for instance *TextEditor.lines*), a str
+    or a text buffer. In the two last cases, an index is built.
+    """
+    if isinstance(s, LineIndex):
+        return s
+    return LineIndex(s)
+
+
+
 class TextEditor:
 
 
     def __init__(self,
                  TextFormatter,
                  tag_list = None,
-                 text = None):
+                 text = None,
+                 TextBuffer = Rope,
+                 TagList = None):
 
         # Mutable values of default parameters are evaluated only once.
         tag_list = None if tag_list is None else tag_list
@@ -57,18 +81,92 @@ class TextEditor:
         self._incremental_format = TextFormatter.DEFAULT_FORMAT
         self.cursor_pos = -1
         self.tag_id = None
-        self.text = text
-        self.tags = Tags(tag_list)
+        # *TextBuffer* is any subclass of *AbstractTextBuffer*. *text*
+        # can also be a text buffer (SEE textBuffer.MappedBuffer).
+        if isinstance(text, AbstractTextBuffer):
+            self.text = text
+        else:
+            self.text = TextBuffer(text)
+        # Line index kept up to date by the edition functions.
+        self.lines = LineIndex(self.text)
+        # *TagList* is any subclass of *AbstractTagList*.
+        TagList = TreeTags if TagList is None else TagList
+        self.tags = TagList(tag_list)
 
         self.Formatter = TextFormatter
+        # Interned formats are compared by identity
+        # (SEE textFormatter.InternedFormatter).
+        self._interned = getattr(TextFormatter, 'INTERNED', False)
+        if self._interned:
+            self._current_format = self._intern(self._current_format)
+            self._incremental_format = self._intern(self._incremental_format)
+            for tag_id in self.tags.ids():
+                self.tags.set_format(tag_id,
+                                     self._intern(self.tags[tag_id][1]))
+        # Undo/redo journal. It can be set to None.
+        self.journal = Journal()
+        # Command log (SEE commandLog). It can be set to None.
+        self.recorder = None
+        # The living snapshots reading versions of the structures of
+        # the editor (SEE snapshot). None if there are no versions.
+        self._snapshots = None
+        # Additional cursors (SEE set_cursors): sorted [pos, format]
+        # lists. They are moved by every modification.
+        self._cursors = []
+        # The range modified since the last call to *compile_changes*
+        # (SEE _mark_dirty). Nothing has been rendered yet.
+        self._dirty = (0, len(self.text), len(self.text))
 
         
-        logging.getLogger('text_editor').debug(
-            '*************\n'
-            'NEW INSTANCE\n'
-            '*************\n'
-        )
-
+        # Tracing is disabled by default (SEE tracing.Tracer).
+        self.tracer = tracing.tracer
+        if self.tracer.enabled:
+            self.tracer.record('text_editor', 'new instance')
+        # Counters and latencies, disabled by default
+        # (SEE metrics.Metrics).
+        self.metrics = metrics.metrics
+
+
+
+    @classmethod
+    def from_runs(cls,
+                  TextFormatter,
+                  text,
+                  runs,
+                  TextBuffer = Rope,
+                  TagList = None):
+        """
+        Bulk construction from a text and its (length, format) runs
+        in O(n). Unlike *tag_list*, the runs aren't deep-copied: the
+        formats are shared. Adjacent runs with equal formats are
+        merged and empty runs are ignored. The run lengths have to
+        add up to the text length.
+        """
+        tags = []
+        total = 0
+        compare = TextFormatter.compare
+        interned = getattr(TextFormatter, 'INTERNED', False)
+        for length, format in runs:
+            if length < 0:
+                raise ValueError('Negative run length.')
+            total += length
+            if length == 0:
+                continue
+            if interned:
+                format = TextFormatter.intern(format)
+            if tags and compare(tags[-1][1], format):
+                tags[-1][0] += length
+            else:
+                tags.append([length, format])
+        if total != len(text):
+            raise ValueError('The run lengths don\'t add up to the '
+                             'text length.')
+        editor = cls(TextFormatter,
+                     text = text,
+                     TextBuffer = TextBuffer,
+                     TagList = TagList)
+        editor.tags = type(editor.tags).adopt(tags)
+        return editor
 
 
     @property
@@ -80,15 +178,16 @@ class TextEditor:
 
 
     @current_format.setter
+    @recorded('current_format')
     def current_format(self, value):
         new_format = self.Formatter.merge(self.current_format,
                                           value)
+        if self.metrics.enabled:
+            self.metrics.count('formatter.merge')
+        if self.tracer.enabled:
+            self.tracer.record('text_editor', 'current_format',
+                               data = (self._current_format, new_format))
         self._current_format = new_format
-        #
-        logging.getLogger('text_editor').debug(
-            'new format\n'
-            f'old format\n{str(self._current_format)}\n'
-            f'new format\n{str(new_format)}')
 
         
 
@@ -101,14 +200,16 @@ class TextEditor:
 
 
     @incremental_format.setter
+    @recorded('incremental_format')
     def incremental_format(self, value):
-        self._incremental_format = value
-        #
-        logging.getLogger('text_editor').debug(
-            'new incremental format\n'
-            f'{value}')
+        self._incremental_format = self._intern(value)
+        if self.tracer.enabled:
+            self.tracer.record('text_editor', 'incremental_format',
+                               data = value)
 
 
+    @timed('text_editor.edit')
+    @recorded('edit')
     def edit(self, s):
         """
         A new tag is created for any new inserted string.
@@ -121,19 +222,26 @@ class TextEditor:
         >>> t = t[:len(t)] + 'd' + t[len(t):]
         >>> t[pos]
         'd'
+
+        An *Insertion* delta is returned (None if *s* is empty).
         """
+        if not s:
+            return None
+        self._detach()
         #
         new_tag = [len(s), self.current_format]
+        delta = Insertion(max(self.cursor_pos, 0),
+                          s,
+                          [[len(s), self.current_format]])
         #
         # Three cases.
         # 1) The text was empty. The editor structure needs to be
         # initialized.
-        if self.text == '':
+        if len(self.text) == 0:
             assert self.cursor_pos == -1
             assert self.tag_id == None
-            self.text = (self.text[:0] +
-                         s +
-                         self.text[0:])
+            self.text.insert(0, s)
+            self.lines.insert(self.text, 0, len(s))
             # len(s) + 1 for moving the cursor AFTER the last
             # inserted character (virtual char.).
             self.cursor_pos += len(s) + 1
@@ -141,54 +249,65 @@ class TextEditor:
                                            None)
         else:
             self._cut_tag(self.cursor_pos)
+            # 2) Insertion at the beginning. No precursors.
+            precursor_id = None
+            # 3) Insertion at the middle or at the end. The precursor
+            # is the tag ending at the cursor (the current tag may
+            # start at the cursor after *change_position*).
+            if self.cursor_pos > 0:
+                precursor_id, _, _ = self._get_pos_tag(self.cursor_pos - 1)
             # Even if self.cursor_pos == len(self.text) (virtual char.).
-            self.text = (self.text[:self.cursor_pos] +
-                         s +
-                         self.text[self.cursor_pos:])
+            self.text.insert(self.cursor_pos, s)
+            self.lines.insert(self.text, self.cursor_pos, len(s))
             self.cursor_pos += len(s)
-            # 2) Insertion at the beginning.
-            if self.cursor_pos == len(s):
-                self.tag_id = self.tags.create(new_tag,
-                                               None)
-            # 3) Insertion at the middle or at the end.
-            else:
-                self.tag_id = self.tags.create(new_tag,
-                                               self.tag_id)
+            self.tag_id = self.tags.create(new_tag,
+                                           precursor_id)
         
         self._merge_tag_on_both_sides(self.tag_id)
+        self._mark_dirty(delta.pos, delta.pos + len(s), len(s))
+        self._record(delta)
 
-        logging.getLogger('text_editor').debug(
-            f'edit\n'
-            f'new string {s}'
-            f'{str(self)}')
+        if self.tracer.enabled:
+            self.tracer.record('text_editor', 'edit',
+                               (self.cursor_pos,), (self.tag_id,), s)
+        return delta
 
 
+    @timed('text_editor.delete')
+    @recorded('delete')
     def delete(self):
         """
         The *curent_format* is still the same after multiple *delete()*
         calls in a row.
         If the cursor points at the beginning of a tag. This tag
         remains the same.
+        A *Deletion* delta is returned (None if nothing is deleted).
         """
+        self._detach()
+        delta = None
         if self.cursor_pos >= 1:
+            delta = Deletion(self.cursor_pos - 1,
+                             self.text[self.cursor_pos - 1],
+                             self._runs(self.cursor_pos - 1,
+                                        self.cursor_pos))
             # Obvious condition.
-            self.text = (self.text[:(self.cursor_pos - 1)] +
-                         self.text[self.cursor_pos:])
+            self.text.delete(self.cursor_pos - 1, self.cursor_pos)
+            self.lines.delete(self.text, self.cursor_pos - 1, self.cursor_pos)
             # tag_id MAY be different from self.tag_id (current tag).
             tag_id, tag, _ = self._get_pos_tag(self.cursor_pos - 1)
-            tag[0] -= 1
+            length = tag[0] - 1
+            self.tags.set_length(tag_id, length)
             self.cursor_pos -= 1
-            if tag[0] == 0:
+            if length == 0:
                 # An empty tag has appeared.
                 prev_tag_id =  self.tags.previous(tag_id)
                 self.tags.delete(tag_id)
                 if not prev_tag_id == tag_id:
                     # There is a tag before the deleted tag.
                     if self.tag_id == tag_id:
-                        assert self.cursor_pos == len(self.text)
                         self.tag_id = prev_tag_id
                     self._merge_tag(prev_tag_id)
-                elif self.text == '':
+                elif len(self.text) == 0:
                     assert self.tags.counter == 0
                     # This setting of *cursor_pos* is necessary because
                     # of the ending virtual character.
@@ -199,13 +318,18 @@ class TextEditor:
                     # there is a tag after it. The successor tag
                     # contains the cursor.
                     pass
-                    
+                self._compact_tags()
+            self._mark_dirty(delta.pos, delta.pos, -1)
+            self._record(delta)
             
-        logging.getLogger('text_editor').debug(
-            f'delete\n'
-            f'{str(self)}')
+        if self.tracer.enabled:
+            self.tracer.record('text_editor', 'delete',
+                               (self.cursor_pos,), (self.tag_id,))
+        return delta
 
 
+    @timed('text_editor.change_position')
+    @recorded('change_position')
     def change_position(self, pos):
         """
         When the cursor is moved without changing the text
@@ -213,23 +337,28 @@ class TextEditor:
         has to reflect the format pointed by the cursor.
         The text ending position (len(self.text)) is special
         because the cursor points at a virtual character in this case.
+        The format of the tag is taken as it is (not merged).
         """
         self._check_pos(pos)
-        self.cursor_pos = pos
         if pos == len(self.text):
             if len(self.text) > 0:
+                self.cursor_pos = pos
                 self.tag_id, tag, _ = self._get_pos_tag(pos - 1)
-                self.current_format = tag[1]
+                self._current_format = tag[1]
+            # An empty text keeps its cursor position (-1).
         else:
+            self.cursor_pos = pos
             self.tag_id, tag, _ = self._get_pos_tag(pos)
-            self.current_format = tag[1]
+            self._current_format = tag[1]
 
-        logging.getLogger('text_editor').debug(
-            f'change_position {pos}\n'
-            f'{str(self)}')
+        if self.tracer.enabled:
+            self.tracer.record('text_editor', 'change_position',
+                               (pos,), (self.tag_id,))
 
     
 
+    @timed('text_editor.delete_selection')
+    @recorded('delete_selection')
     def delete_selection(self, i, j):
         """
         To delete a substring from the position i (included)
@@ -241,13 +370,28 @@ class TextEditor:
         ''
         >>> t[:1]+t[2:]
         'ac'
+
+        A *Deletion* delta is returned.
         """
+        self._detach()
         self._check_range(i, j)
+        delta = Deletion(i, self.text[i:j], self._runs(i, j))
+        self._delete_range(i, j)
+        self._record(delta)
+            
+        if self.tracer.enabled:
+            self.tracer.record('text_editor', 'delete_selection',
+                               (i, j), (self.tag_id,))
+        return delta
+
+
+    def _delete_range(self, i, j):
+        self._mark_dirty(i, i, i - j)
         self._scan_and_process_tags(i, j, 
                                     self._delete_tag)
-        self.text = (self.text[:i] +
-                     self.text[j:])
-        if self.text == '':
+        self.text.delete(i, j)
+        self.lines.delete(self.text, i, j)
+        if len(self.text) == 0:
             self.cursor_pos = -1
             self.tag_id = None
         else:
@@ -257,49 +401,581 @@ class TextEditor:
             tag_id = self.tags.previous(self.tag_id)
             # Even if tag_id == self.tag_id.
             self._merge_tag_on_both_sides(self.tag_id)
-            
-        logging.getLogger('text_editor').debug(
-            f'delete_selection {i}, {j}\n'
-            f'{str(self)}')
+        self._compact_tags()
 
 
+    @timed('text_editor.change_selection_format')
+    @recorded('change_selection_format')
     def change_selection_format(self, i, j):
         """
         To change the format of a substring (selection).
         From i (included) to j (excluded).
+        A *FormatChange* delta is returned.
         """
+        self._detach()
         self._check_range(i, j)
+        old_runs = self._runs(i, j)
         self._scan_and_process_tags(i, j,
                                     self._update_tag_format,
                                     self._merge_tag_on_both_sides)
         self.change_position(i)
+        self._compact_tags()
+        self._mark_dirty(i, j, 0)
+        delta = FormatChange(i, old_runs, self._runs(i, j))
+        self._record(delta)
 
-        logging.getLogger('text_editor').debug(
-            f'change_selection_format {i}, {j}\n'
-            f'{str(self)}')
+        if self.tracer.enabled:
+            self.tracer.record('text_editor', 'change_selection_format',
+                               (i, j), (self.tag_id,),
+                               self.incremental_format)
+        return delta
 
-        
-    def compile(self, display_cursor = False):
-        """ '\u2588' stands for the insertion cursor. """
-        repr = []
-        i = 0
-        for tag in self.tags.all:
-            if display_cursor and i <= self.cursor_pos < i + tag[0]:
-                repr.append(
-                    (self.text[i:self.cursor_pos] +
-                     '\u2588' +
-                     self.text[self.cursor_pos:(i+tag[0])], tag[1]))
+
+    @timed('text_editor.apply_batch')
+    @recorded('apply_batch')
+    def apply_batch(self, operations):
+        """
+        To apply many modifications at once. *operations* is a list
+        of tuples:
+            ('edit', pos, s) or ('edit', pos, s, format)
+            ('delete_selection', i, j)
+            ('change_selection_format', i, j, incremental_format)
+        All the positions refer to the text before the batch and the
+        modified ranges must not overlap (several insertions at the
+        same position keep their order). The tags are only merged
+        once, around the modified ranges, and the cursor is moved
+        once. A *Batch* delta is returned (None if the batch is
+        empty). Its deltas are in the order of the text.
+        """
+        self._detach()
+        changes = []
+        for k, operation in enumerate(operations):
+            name = operation[0]
+            if name == 'edit':
+                self._check_pos(operation[1])
+                if not operation[2]:
+                    continue
+                i = j = operation[1]
+            elif name in ('delete_selection', 'change_selection_format'):
+                i, j = operation[1], operation[2]
+                self._check_range(i, j)
+            else:
+                raise ValueError(f'Unknown operation {name!r}.')
+            changes.append((i, j, k, operation))
+        if not changes:
+            return None
+        changes.sort()
+        for previous, change in zip(changes, changes[1:]):
+            if change[0] < previous[1]:
+                raise ValueError('Overlapping operations.')
+
+        # The deltas are computed on the text before the batch.
+        # Their positions take the previous deltas into account.
+        deltas = []
+        shift = 0
+        for i, j, _, operation in changes:
+            name = operation[0]
+            if name == 'edit':
+                s = operation[2]
+                format = (self._intern(operation[3]) if len(operation) > 3
+                          else self.current_format)
+                deltas.append(Insertion(i + shift, s, [[len(s), format]]))
+                shift += len(s)
+            elif name == 'delete_selection':
+                deltas.append(Deletion(i + shift,
+                                       self.text[i:j],
+                                       self._runs(i, j)))
+                shift -= j - i
+            else:
+                new_runs = []
+                runs = self._runs(i, j)
+                for run in runs:
+                    format = self.Formatter.merge(run[1], operation[3])
+                    if (new_runs and
+                        self.Formatter.compare(new_runs[-1][1], format)):
+                        new_runs[-1][0] += run[0]
+                    else:
+                        new_runs.append([run[0], format])
+                if self.metrics.enabled:
+                    self.metrics.count('formatter.merge', len(runs))
+                    self.metrics.count('formatter.compare',
+                                       max(len(runs) - 1, 0))
+                deltas.append(FormatChange(i + shift,
+                                           self._runs(i, j),
+                                           new_runs))
+
+        # The modifications are applied from the end of the text so
+        # that the positions of the next ones remain valid.
+        for (i, j, _, operation), delta in zip(reversed(changes),
+                                               reversed(deltas)):
+            if isinstance(delta, Insertion):
+                if len(self.text) > 0:
+                    self._cut_tag(i)
+                self._create_tags(i, delta.runs)
+                self.text.insert(i, delta.text)
+                self.lines.insert(self.text, i, len(delta.text))
             else:
-                repr.append(
-                    (self.text[i:(i+tag[0])], tag[1]))
-            i += tag[0]
-        if display_cursor and self.cursor_pos == len(self.text):
-            if not repr == []:
-                token = repr.pop(-1)
-                repr.append((token[0]+'\u2588', token[1]))
+                self._scan_and_process_tags(i, j, self._delete_tag)
+                if isinstance(delta, Deletion):
+                    self.text.delete(i, j)
+                    self.lines.delete(self.text, i, j)
+                else:
+                    self._create_tags(i, delta.new_runs)
+
+        # Single normalisation pass.
+        end = 0
+        for delta in deltas:
+            if isinstance(delta, Insertion):
+                end = delta.pos + len(delta.text)
+            elif isinstance(delta, Deletion):
+                end = delta.pos
+            else:
+                end = delta.pos + sum(run[0] for run in delta.new_runs)
+            self._merge_tags_between(delta.pos, end)
+        batch = Batch(tuple(deltas))
+        if len(self.text) == 0:
+            self.cursor_pos = -1
+            self.tag_id = None
+        else:
+            self.change_position(batch.cursor_pos)
+        self._compact_tags()
+        self._mark_dirty(deltas[0].pos, end, shift)
+        self._record(batch)
+
+        if self.tracer.enabled:
+            self.tracer.record('text_editor', 'apply_batch',
+                               (deltas[0].pos, end), (self.tag_id,),
+                               len(deltas))
+        return batch
+
+
+    def snapshot(self):
+        """
+        A read-only view of the document (SEE snapshot.Snapshot)
+        created in O(1). The snapshot reads versions of the text, the
+        line index and the tags (SEE versions): the editor still
+        modifies them in place and saves the old values of what it
+        modifies while the snapshot exists.
+        """
+        from .snapshot import Snapshot
+        snapshot = Snapshot(self)
+        if self._snapshots is None:
+            self._snapshots = weakref.WeakSet()
+        self._snapshots.add(snapshot)
+        return snapshot
+
+
+    def _detach(self):
+        """
+        To be called before any modification. The versions are
+        released when there are no snapshots left.
+        """
+        if self._snapshots is not None and not self._snapshots:
+            self.text.release()
+            self.lines.release()
+            self.tags.release()
+            self._snapshots = None
+
+
+    @property
+    def cursors(self):
+        """ The positions of the additional cursors. """
+        return [cursor[0] for cursor in self._cursors]
+
+
+    def set_cursors(self, positions):
+        """
+        Multi-cursor editing. Each cursor has its own current format:
+        the format at its position (SEE change_position). The main
+        cursor (*cursor_pos*) isn't one of them: the edits at the
+        cursors only shift it like the text around it, and its
+        current format becomes the format at its new position.
+        """
+        positions = sorted(set(positions))
+        for pos in positions:
+            self._check_pos(pos)
+        self._cursors = [[pos, self._format_at(pos)] for pos in positions]
+
+
+    def add_cursor(self, pos):
+        self.set_cursors(self.cursors + [pos])
+
+
+    def clear_cursors(self):
+        self._cursors = []
+
+
+    def _format_at(self, pos):
+        if len(self.text) == 0:
+            return self.current_format
+        _, tag, _ = self._get_pos_tag(min(pos, len(self.text) - 1))
+        return tag[1]
+
+
+    def edit_at_cursors(self, s):
+        """
+        *s* is inserted at every cursor with the format of the cursor
+        in a single batch (SEE apply_batch). The cursors are moved
+        after the inserted strings.
+        """
+        return self._apply_at_cursors([('edit', pos, s, format)
+                                       for pos, format in self._cursors])
+
+
+    def delete_at_cursors(self, width = 1):
+        """
+        The *width* characters before every cursor are deleted
+        (backspace key). Overlapping ranges are deleted once.
+        """
+        ranges = []
+        for pos, _ in self._cursors:
+            i = max(0, pos - width)
+            if i == pos:
+                continue
+            if ranges and i <= ranges[-1][1]:
+                ranges[-1][1] = pos
+            else:
+                ranges.append([i, pos])
+        return self._apply_at_cursors([('delete_selection', i, j)
+                                       for i, j in ranges])
+
+
+    def change_format_at_cursors(self, width):
+        """
+        *incremental_format* is applied to the *width* characters
+        after every cursor (column selection).
+        """
+        n = len(self.text)
+        ranges = []
+        for pos, _ in self._cursors:
+            j = min(n, pos + width)
+            if pos == j:
+                continue
+            if ranges and pos <= ranges[-1][1]:
+                ranges[-1][1] = j
+            else:
+                ranges.append([pos, j])
+        return self._apply_at_cursors([('change_selection_format', i, j,
+                                        self.incremental_format)
+                                       for i, j in ranges])
+
+
+    def _apply_at_cursors(self, operations):
+        """ *apply_batch* keeping the main cursor where it was. """
+        pos = max(self.cursor_pos, 0)
+        batch = self.apply_batch(operations)
+        if batch is not None and len(self.text) > 0:
+            self.change_position(self._shifted(pos, batch))
+        return batch
+
+
+    def _move_cursors(self, delta):
+        """
+        The additional cursors follow the modification *delta*.
+        A cursor at an insertion position moves after the inserted
+        text and the cursors inside a deleted range are merged.
+        """
+        if not self._cursors or isinstance(delta, FormatChange):
+            return
+        cursors = []
+        for cursor in self._cursors:
+            pos = self._shifted(cursor[0], delta)
+            if cursors and cursors[-1][0] == pos:
+                continue
+            cursors.append([pos, cursor[1]])
+        self._cursors = cursors
+
+
+    @staticmethod
+    def _shifted(pos, delta):
+        """ The position *pos* after the modification *delta*. """
+        if isinstance(delta, FormatChange):
+            return pos
+        if isinstance(delta, Batch):
+            for sub_delta in delta.deltas:
+                pos = TextEditor._shifted(pos, sub_delta)
+            return pos
+        length = len(delta.text)
+        if isinstance(delta, Insertion):
+            if pos >= delta.pos:
+                pos += length
+        elif pos >= delta.pos + length:
+            pos -= length
+        elif pos > delta.pos:
+            pos = delta.pos
+        return pos
+
+
+    def find_format(self, key):
+        """
+        The (start, end) ranges of the text whose tags are indexed
+        under *key*: a format or *property_key(name, value)*. It costs
+        O(k log n) with *IndexedTags* and O(number of tags) otherwise.
+        """
+        ranges = getattr(self.tags, 'ranges', None)
+        if ranges is not None:
+            return ranges(key)
+        result = []
+        pos = 0
+        for tag in self.tags.all:
+            if key in IndexedTags.index_keys(tag[1]):
+                if result and result[-1][1] == pos:
+                    result[-1] = (result[-1][0], pos + tag[0])
+                else:
+                    result.append((pos, pos + tag[0]))
+            pos += tag[0]
+        return result
+
+
+    def find_property(self, name, value):
+        return self.find_format(property_key(name, value))
+
+
+    def _merge_tags_between(self, i, j):
+        """
+        The equal tags overlapping the positions from i - 1 to j
+        (included) are merged.
+        """
+        if len(self.text) == 0:
+            return
+        tag_id, tag, start = self._get_pos_tag(max(i - 1, 0))
+        while tag_id is not None and start < j:
+            while self._merge_tag(tag_id):
+                pass
+            start += self.tags[tag_id][0]
+            tag_id = self.tags.next(tag_id)
+
+
+    @timed('text_editor.undo')
+    @recorded('undo')
+    def undo(self):
+        """
+        The last modification is cancelled. The applied delta is
+        returned (None if there is nothing to undo).
+        """
+        self._detach()
+        if self.journal is None:
+            return None
+        delta = self.journal.undo()
+        if delta is not None:
+            self._apply(delta)
+            self._move_cursors(delta)
+        return delta
+
+
+    @timed('text_editor.redo')
+    @recorded('redo')
+    def redo(self):
+        self._detach()
+        if self.journal is None:
+            return None
+        delta = self.journal.redo()
+        if delta is not None:
+            self._apply(delta)
+            self._move_cursors(delta)
+        return delta
+
+
+    def _record(self, delta):
+        self._move_cursors(delta)
+        if self.journal is not None:
+            self.journal.record(delta)
+
+
+    def _apply(self, delta):
+        """
+        To apply a delta without recording it. The cost only depends
+        on the size of the delta (and log n).
+        """
+        if isinstance(delta, Batch):
+            for sub_delta in delta.deltas:
+                self._apply(sub_delta)
+            return
+        if isinstance(delta, Insertion):
+            if len(self.text) > 0:
+                self._cut_tag(delta.pos)
+            self._insert_tags(delta.pos, delta.runs)
+            self.text.insert(delta.pos, delta.text)
+            self.lines.insert(self.text, delta.pos, len(delta.text))
+            self._mark_dirty(delta.pos, delta.cursor_pos, len(delta.text))
+        elif isinstance(delta, Deletion):
+            self._delete_range(delta.pos,
+                               delta.pos + len(delta.text))
+        else:
+            length = sum(run[0] for run in delta.new_runs)
+            self._scan_and_process_tags(delta.pos,
+                                        delta.pos + length,
+                                        self._delete_tag)
+            self._insert_tags(delta.pos, delta.new_runs)
+            self._mark_dirty(delta.pos, delta.pos + length, 0)
+        if len(self.text) == 0:
+            self.cursor_pos = -1
+            self.tag_id = None
+        else:
+            self.change_position(delta.cursor_pos)
+        self._compact_tags()
+
+
+    def _runs(self, i, j):
+        """
+        The [length, format] runs covering the text from i (included)
+        to j (excluded). The runs are new lists.
+        """
+        runs = []
+        if i >= j:
+            return runs
+        tag_id, tag, start = self._get_pos_tag(i)
+        pos = i
+        while pos < j:
+            end = min(start + tag[0], j)
+            runs.append([end - pos, tag[1]])
+            pos = end
+            start += tag[0]
+            tag_id = self.tags.next(tag_id)
+            if tag_id is None:
+                break
+            tag = self.tags[tag_id]
+        return runs
+
+
+    def _create_tags(self, pos, runs):
+        """
+        New tags are created from *runs* at the position *pos*
+        without merging them. A tag has to start at *pos*
+        (SEE _cut_tag). The ids of the new tags are returned.
+        """
+        predecessor = None
+        if pos > 0:
+            predecessor, _, _ = self._get_pos_tag(pos - 1)
+        ids = []
+        for run in runs:
+            predecessor = self.tags.create([run[0], run[1]],
+                                           predecessor)
+            ids.append(predecessor)
+        return ids
+
+
+    def _insert_tags(self, pos, runs):
+        """
+        Same as *_create_tags* but the new tags are merged with their
+        neighbours if possible.
+        """
+        ids = self._create_tags(pos, runs)
+        if ids:
+            self._merge_tag(ids[-1])
+            previous = self.tags.previous(ids[0])
+            if previous != ids[0]:
+                self._merge_tag(previous)
+
+        
+    def _mark_dirty(self, start, end, change):
+        """
+        The text from *start* to *end* replaces *end - start - change*
+        characters of the previous text. The dirty range is the union
+        of all the modified ranges since the last rendering. Its third
+        item is the total change of the text length.
+        """
+        if self._dirty is None:
+            self._dirty = (start, end, change)
+            return
+        a, b, shift = self._dirty
+        # From the coordinates before the modification to the
+        # coordinates after it.
+        if b > start:
+            b = end if b < end - change else b + change
+        self._dirty = (min(a, start),
+                       max(b, end),
+                       shift + change)
+
+
+    @timed('text_editor.compile_changes')
+    def compile_changes(self):
+        """
+        Incremental version of *compile* for GUIs. It returns
+        *(start, old_end, runs)* or None if nothing has changed since
+        the last call. The runs of the last rendering from *start* to
+        *old_end* have to be replaced by *runs*, a list of
+        *(pos, substring, format)* items covering the text from
+        *start* to their end. *start* and *old_end* are always run
+        boundaries of the previous rendering. The first call renders
+        the whole text (*old_end* is 0).
+        """
+        if self._dirty is None:
+            return None
+        a, b, shift = self._dirty
+        self._dirty = None
+        n = len(self.text)
+        start = end = 0
+        if n > 0:
+            # The neighbouring runs may have been merged or cut.
+            if a > 0:
+                _, _, start = self._get_pos_tag(min(a, n) - 1)
+            end = n
+            if b < n:
+                _, tag, tag_start = self._get_pos_tag(b)
+                end = tag_start + tag[0]
+        runs = []
+        pos = start
+        if start < end:
+            tag_id, tag, _ = self._get_pos_tag(start)
+            while pos < end:
+                runs.append((pos, self.text[pos:(pos + tag[0])], tag[1]))
+                pos += tag[0]
+                tag_id = self.tags.next(tag_id)
+                tag = None if tag_id is None else self.tags[tag_id]
+        return (start, end - shift, runs)
+
+        
+    def iter_runs(self, i = 0, j = None, display_cursor = False):
+        """
+        To get the *(substring, format)* runs of the window [i, j)
+        lazily (viewport rendering). The runs at the edges of the
+        window are clipped. The first run is found in O(log n).
+        SEE compile.
+        """
+        n = len(self.text)
+        j = n if j is None else j
+        self._check_pos(i)
+        self._check_pos(j)
+        if i > j:
+            raise ValueError('Range error.')
+        cursor = self.cursor_pos if display_cursor else -1
+        last = None
+        if i < j:
+            tag_id, tag, pos = self._get_pos_tag(i)
+            while pos < j:
+                a = max(pos, i)
+                b = min(pos + tag[0], j)
+                if a <= cursor < b:
+                    run = (self.text[a:cursor] +
+                           '\u2588' +
+                           self.text[cursor:b], tag[1])
+                else:
+                    run = (self.text[a:b], tag[1])
+                if last is not None:
+                    yield last
+                last = run
+                pos += tag[0]
+                tag_id = self.tags.next(tag_id)
+                if tag_id is None:
+                    break
+                tag = self.tags[tag_id]
+        if cursor == n and j == n:
+            if last is not None:
+                last = (last[0] + '\u2588', last[1])
             else:
-                repr.append(('\u2588', self.current_format))
-        return repr
+                last = ('\u2588', self.current_format)
+        if last is not None:
+            yield last
+
+
+    @timed('text_editor.compile')
+    def compile(self, display_cursor = False, i = 0, j = None):
+        """
+        '\u2588' stands for the insertion cursor.
+        [i, j) is the rendered window (the whole text by default).
+        """
+        return list(self.iter_runs(i, j, display_cursor))
 
     
     @staticmethod
@@ -310,22 +986,16 @@ class TextEditor:
         """
         i is alowed to be len(s) (the 'x' additional character).
         Line ending groups are always included for obvious reasons.
+        *s* can be *TextEditor.lines* (O(log n)).
         """
-        if not -1 <= i <= len(s):
+        lines = _line_index(s)
+        if not -1 <= i <= lines.total:
             raise IndexError()
         if i == -1:
             return (line_base, column_base)
-        s = s + 'x'
-        lines = s.splitlines(keepends = True)
-        line_nb = 0
-        counter = 0
-        next_value = len(lines[line_nb])
-        while next_value <= i:
-            line_nb += 1
-            counter = next_value
-            next_value += len(lines[line_nb])
+        line_nb, column = lines.locate(i)
         return (line_nb + line_base,
-                i - counter + column_base)
+                column + column_base)
 
 
     @staticmethod 
@@ -349,18 +1019,19 @@ class TextEditor:
         *splitlines* doesn't return a final empty line when
         the last group is a line ending group. This is the other
         reason why 'x' is inserted.
+
+        *s* can be *TextEditor.lines* (O(log n) plus the number of
+        crossed lines).
         """
-        s = s + 'x'
-        lines = s.splitlines(keepends = keepends)
-        # To remove 'x'.
-        last_line = lines.pop()
-        lines.append(last_line[:len(last_line)-1])
+        lines = _line_index(s)
+        def length(line_nb):
+            return lines.line_length(line_nb, keepends)
         # A line can be empty.
         line_nb -= line_base
         column -= column_base
         if strict:
             if (not 0 <= line_nb <= len(lines) - 1 or
-                not 0 <= column <= len(lines[line_nb])):
+                not 0 <= column <= length(line_nb)):
                 #
                 raise IndexError()
         else:
@@ -370,26 +1041,23 @@ class TextEditor:
                 line_nb = 0
 
             if line_is_important:
-                column = min(len(lines[line_nb]),
+                column = min(length(line_nb),
                              max(0, column))
             else:
                 if column < 0:
                     while column < 0 and line_nb > 0:
                         line_nb -= 1
-                        column = len(lines[line_nb]) + 1 + column
+                        column = length(line_nb) + 1 + column
                     if column < 0:
                         column = 0
-                while column > len(lines[line_nb]):
+                while column > length(line_nb):
                     if line_nb < len(lines) - 1:
-                        column -= len(lines[line_nb]) + 1
+                        column -= length(line_nb) + 1
                         line_nb += 1
                     elif line_nb == len(lines) - 1:
-                        column = len(lines[line_nb])
+                        column = length(line_nb)
 
-        if not keepends:
-            lines = s.splitlines(keepends = True)
-            
-        i = sum([len(lines[i]) for i in range(line_nb)]) + column
+        i = lines.line_start(line_nb) + column
         return i
     
  
@@ -409,13 +1077,10 @@ class TextEditor:
         # Selecting tags between i and j.
         selected_tags = self._select_tags(i, j)
         deleted_tags = set()
-        #
-        logging.getLogger('text_editor').debug(
-            f'scan_and_process_tags {i}, {j}\n'
-            f'selected_tags {selected_tags}\n'
-            f'functions to apply\n'
-            f'{[f.__name__ for f in functions]}\n'
-            f'{str(self)}')
+        if self.tracer.enabled:
+            self.tracer.record('text_editor', 'scan_and_process_tags',
+                               (i, j), tuple(selected_tags),
+                               tuple(f.__name__ for f in functions))
 
 
         for tag_id in selected_tags:
@@ -423,11 +1088,10 @@ class TextEditor:
             for func in functions:
                 if not tag_id in deleted_tags:
                     func(tag_id, deleted_tags)
-                    #
-                    logging.getLogger('text_editor').debug(
-                        f'{func.__name__} {tag_id}\n'
-                        f'deleted tags {deleted_tags}\n'
-                        f'{str(self)}')
+                    if self.tracer.enabled:
+                        self.tracer.record('text_editor', func.__name__,
+                                           tag_ids = (tag_id,),
+                                           data = tuple(deleted_tags))
 
 
     def _get_pos_tag(self, pos):
@@ -440,17 +1104,7 @@ class TextEditor:
         character associated with the wanted tag.
         This function interprets tags.
         """
-        tag_id = self.tags.root
-        tag = self.tags[tag_id]
-        counter = -1
-        while counter + tag[0] < pos:
-            counter += tag[0]
-            tag_id = self.tags.next(tag_id)
-            tag = self.tags[tag_id]
-        
-        return (tag_id,
-                tag,
-                counter + 1)
+        return self.tags.find(pos)
 
                
 
@@ -468,7 +1122,7 @@ class TextEditor:
             if not start_pos == i:
                 old_length = tag[0]
                 new_length = i - start_pos
-                tag[0] = new_length
+                self.tags.set_length(tag_id, new_length)
                 self.tags.create([old_length - new_length, tag[1]],
                                  tag_id)
                 return True
@@ -509,7 +1163,9 @@ class TextEditor:
             tag = self.tags[tag_id]
             new_format = self.Formatter.merge(tag[1],
                                               self.incremental_format)
-            tag[1] = new_format
+            self.tags.set_format(tag_id, new_format)
+            if self.metrics.enabled:
+                self.metrics.count('formatter.merge')
 
 
 
@@ -519,12 +1175,13 @@ class TextEditor:
         mergers = [False, False]
         prev_tag_id = self.tags.previous(tag_id)
         next_tag_id  = self.tags.next(tag_id)
-        if next_tag_id is not None:
-            # 0n the right.
-            if self._merge_tag(tag_id):
-                mergers[1] = True
-                if deleted_tags is not None:
-                    deleted_tags.add(next_tag_id)
+        # 0n the right. Several tags can be merged in a row when
+        # the format of a selection has been changed.
+        while next_tag_id is not None and self._merge_tag(tag_id):
+            mergers[1] = True
+            if deleted_tags is not None:
+                deleted_tags.add(next_tag_id)
+            next_tag_id = self.tags.next(tag_id)
 
         if prev_tag_id is not None:
             # On the left.
@@ -546,9 +1203,12 @@ class TextEditor:
         
         if right_tag_id is not None:
             right_tag = self.tags[right_tag_id]
+            if self.metrics.enabled:
+                self.metrics.count('formatter.compare')
             if self.Formatter.compare(left_tag[1], right_tag[1]):
                 #
-                left_tag[0] += right_tag[0]
+                self.tags.set_length(left_tag_id,
+                                     left_tag[0] + right_tag[0])
                 self.tags.delete(right_tag_id)
                 if self.tag_id == right_tag_id:
                     self.tag_id = left_tag_id
@@ -559,8 +1219,24 @@ class TextEditor:
     def _delete_tag(self, tag_id, deleted_tags):
         deleted_tags.add(tag_id)
         self.tags.delete(tag_id)
+
+
+    def _compact_tags(self):
+        """
+        The tag list may be compacted after many deletions. The ids
+        change. Therefore, it is only done at the end of an operation.
+        """
+        mapping = self.tags.compact()
+        if mapping is not None and self.tag_id is not None:
+            self.tag_id = mapping[self.tag_id]
     
     
+    def _intern(self, format):
+        if self._interned:
+            return self.Formatter.intern(format)
+        return format
+
+
     def _check_pos(self, pos):
        if not 0 <= pos <= len(self.text):
             raise IndexError('Wrong position.') 
@@ -616,6 +1292,57 @@ class AbstractTagList:
         pass
 
 
+    @abstractmethod
+    def find(self, pos):
+        """
+        To get the id of the tag containing the position *pos*, the tag
+        and the position of its first character.
+        """
+        pass
+
+
+    @abstractmethod
+    def set_length(self, i, length):
+        pass
+
+
+    @abstractmethod
+    def set_format(self, i, format):
+        pass
+
+
+    def copy(self):
+        """
+        An independent deep copy: the formats are copied too, so
+        interned formats lose their identity (the subclasses of Tags
+        provide *version* instead).
+        """
+        return copy.deepcopy(self)
+
+
+    def version(self):
+        """
+        A read-only tag list whose content is the current one,
+        whatever the later modifications (SEE TextEditor.snapshot).
+        By default, a copy.
+        """
+        return self.copy()
+
+
+    def release(self):
+        """ The versions may become invalid (SEE versions.release). """
+        pass
+
+
+    @classmethod
+    def adopt(cls, tags):
+        """
+        To build a tag list from the [length, format] lists of *tags*.
+        The lists are used as they are (no copies) if possible.
+        """
+        return cls(tags)
+
+
 
     
 class Tags(AbstractTagList):
@@ -626,38 +1353,76 @@ class Tags(AbstractTagList):
         The structure is based on three dynamic arrays.
         The root is the only tag such as its precursor is itself.
         The None value is reserved. The new tag's value can't be None.
+        The links are stored in typed arrays where NIL stands for
+        a missing tag. The free slots of *_tags* are chained
+        through *_succ* (free list) and *_next_id* is the head of
+        this list (or *_length* if it is empty).
+        The [length, format] records are never modified in place
+        (*set_length* and *set_format* replace them). Therefore, the
+        copies and the versions (SEE versions) share them.
         """
+        # Tracing is disabled by default (SEE tracing.Tracer).
+        self.tracer = tracing.tracer
+        self.metrics = metrics.metrics
         self._reset(a_list)
 
 
     def _reset(self, a_list = None):
-        if a_list is not None:
-            self._tags = copy.deepcopy(a_list)
-            self._length = len(self._tags)
-            self.counter = self._length
-            self._succ = list(range(1, self.counter)) + [None]
-            self._prec = [None] + list(range(0, self.counter - 1))
-            self._next_id = self.counter
+        self._build([] if a_list is None else copy.deepcopy(a_list))
+
+
+    @classmethod
+    def adopt(cls, tags):
+        """
+        The new tag list takes ownership of the [length, format]
+        lists of *tags*.
+        """
+        tag_list = cls()
+        tag_list._build(tags)
+        return tag_list
+
+
+    def _build(self, tags):
+        """ The tags are linked in the order of the list *tags*. """
+        # The initialization is delicate.
+        self._tags = VersionedList(tags)
+        self._length = len(self._tags)
+        self.counter = self._length
+        self._succ = VersionedArray('l', range(1, self.counter))
+        self._prec = VersionedArray('l', range(-1, self.counter - 1))
+        self._next_id = self.counter
+        if self.counter > 0:
+            self._succ.append(NIL)
+            # Root property.
+            self._prec[0] = 0
             self.root = 0
         else:
-            # The initialization is delicate.
-            self._tags = []
-            self._length = 0
-            self.counter = 0
-            self._succ = []
-            self._prec = []
-            self._next_id = 0
             self.root = None
 
 
     def __getitem__(self, arg):
         return self._tags.__getitem__(arg)
+
+
+    def version(self):
+        tags = copy.copy(self)
+        tags._tags = versions.version(self._tags)
+        tags._succ = versions.version(self._succ)
+        tags._prec = versions.version(self._prec)
+        return tags
+
+
+    def release(self):
+        versions.release(self._tags)
+        versions.release(self._succ)
+        versions.release(self._prec)
             
     
     def create(self, new_tag, precursor_id):
         """
         The id of the new item is returned. This function depends from
         *_insert_tag*.
+        A free slot is reused in O(1) if there is one.
         """
         assert new_tag is not None
         new_id = self._next_id
@@ -665,39 +1430,42 @@ class Tags(AbstractTagList):
             # The underlying arrays are too small and need to be resized.
             assert self.counter == self._length
             self._tags.append(new_tag)
-            self._succ.append(None)
-            self._prec.append(None)
-            # Insertion.
-            self._insert_tag(new_id,
-                             precursor_id)
+            self._succ.append(NIL)
+            self._prec.append(NIL)
             self._length += 1
             self._next_id = self._length
         else:
-            # There is room for the new item.
+            # There is room for the new item. The head of the free
+            # list is popped.
+            next_free = self._succ[new_id]
+            self._next_id = self._length if next_free == NIL else next_free
             self._tags[new_id] = new_tag
-            # Insertion.
-            self._insert_tag(new_id,
-                             precursor_id)
-            self._next_id = self._find_available_place()
+        # Insertion.
+        self._insert_tag(new_id,
+                         precursor_id)
         self.counter += 1
-        # Reduction of the underlying arrays
-        # if they are too large.
-        if self.counter < self._length / 100:
-            self._reset(self.all)
-        #
-        logging.getLogger('tags').debug(
-            'create\n'
-            f'new_tag {new_tag}\n'
-            f'precursor {precursor_id}\n'
-            f'{str(self)}')
+        if self.tracer.enabled:
+            self.tracer.record('tags', 'create',
+                               tag_ids = (new_id, precursor_id),
+                               data = copy.copy(new_tag))
         return new_id
 
 
-    def _find_available_place(self):
-        for i, tag in enumerate(self._tags):
-                if tag is None:
-                    return i
-        return self._length
+    def compact(self):
+        """
+        Reduction of the underlying arrays if they are too large.
+        The tag ids change. The mapping from the old ids to the new
+        ones is returned (None if nothing is done). Therefore, the
+        owner of the tag list has to call this function when it can
+        update the ids it keeps.
+        """
+        if not self.counter < self._length / 100:
+            return None
+        if self.metrics.enabled:
+            self.metrics.count('tags.compact')
+        ids = self.ids()
+        self._build([self._tags[i] for i in ids])
+        return {old_id: new_id for new_id, old_id in enumerate(ids)}
 
     
     def _insert_tag(self, new_tag_id, precursor_id):
@@ -710,7 +1478,7 @@ class Tags(AbstractTagList):
             # 1) Insertion at the beginning. New root (no precursors).
             if self.root is None:
                 assert self.counter == 0
-                self._succ[new_tag_id] = None
+                self._succ[new_tag_id] = NIL
             else:
                 self._succ[new_tag_id] = self.root
                 self._prec[self.root] = new_tag_id
@@ -724,90 +1492,295 @@ class Tags(AbstractTagList):
             self._prec[new_tag_id] = precursor_id
             self._succ[precursor_id] = new_tag_id
             #
-            if successor_id is not None:
+            if successor_id != NIL:
                 self._prec[successor_id] = new_tag_id
                 self._succ[new_tag_id] = successor_id
             else:
                 # Insertion at the end.
-                self._succ[new_tag_id] = None
+                self._succ[new_tag_id] = NIL
       
             
     def delete(self, tag_id):
         """
-        There is no need to set self._succ[tag_id]
-        and self._prec[tag_id] to None.
+        self._succ[tag_id] becomes the link of the free list.
+        There is no need to reset self._prec[tag_id].
         """
         successor_id = self._succ[tag_id]
         precursor_id = self._prec[tag_id]
         self._tags[tag_id] = None
-        # A new place is available.
-        self._next_id = tag_id
         # Two cases.
         # 1) Deletion of the root.
         if tag_id == precursor_id:
-            if successor_id is not None:
+            if successor_id != NIL:
                 self.root = successor_id
                 self._prec[successor_id] =  successor_id
                 self.counter -= 1
             else:
                 # The root was the only tag left.
                 assert self.counter == 1
-                # *_reset* sets self.counter appropriately.
+                # *_reset* sets self.counter appropriately
+                # and empties the free list.
                 self._reset()
         # 2) Deletion of a normal item. All tags have a distinct precursor
         # except the root.
         else:
-            assert precursor_id is not None
-            if successor_id is not None:
+            assert precursor_id != NIL
+            if successor_id != NIL:
                 # Deletion in the middle.
                 self._succ[precursor_id] = successor_id
                 self._prec[successor_id] = precursor_id
                 
             else:
                 # Deletion at the end.
-                self._succ[precursor_id] = None
+                self._succ[precursor_id] = NIL
             self.counter -= 1
-        logging.getLogger('tags').debug(
-            f'delete {tag_id}\n'
-            f'{str(self)}')
+        if self.counter > 0:
+            # A new place is available at the head of the free list.
+            self._succ[tag_id] = (NIL if self._next_id == self._length
+                                  else self._next_id)
+            self._next_id = tag_id
+        if self.tracer.enabled:
+            self.tracer.record('tags', 'delete',
+                               tag_ids = (tag_id,))
         
 
 
     def next(self, tag_id):
         i = self._succ[tag_id]
-        return i
+        return None if i == NIL else i
 
 
     def previous(self, tag_id):
         i = self._prec[tag_id]
-        return i
-        
-        
- 
-    @property
-    def all(self):
-        tags = []
+        return None if i == NIL else i
+
+
+    def find(self, pos):
+        """
+        The tags are walked from the root. It costs O(number of tags).
+        """
+        tag_id = self.root
+        tag = self._tags[tag_id]
+        counter = -1
+        walked = 1
+        while counter + tag[0] < pos:
+            counter += tag[0]
+            tag_id = self._succ[tag_id]
+            tag = self._tags[tag_id]
+            walked += 1
+        if self.metrics.enabled:
+            self.metrics.count('tags.find')
+            self.metrics.count('tags.find.walked', walked)
+        return (tag_id,
+                tag,
+                counter + 1)
+
+
+    def set_length(self, tag_id, length):
+        self._tags[tag_id] = [length, self._tags[tag_id][1]]
+
+
+    def set_format(self, tag_id, format):
+        self._tags[tag_id] = [self._tags[tag_id][0], format]
+
+
+    def ids(self):
+        """ The tag ids in the order of the list. """
+        ids = []
         if self.root is not None:
             i = self.root
-            tags.append(self._tags[i])
+            ids.append(i)
             # Against a possible infinite loop
             k = 0
-            while self._succ[i] is not None and k < self._length:
+            while self._succ[i] != NIL and k < self._length:
                 i = self._succ[i]
-                tags.append(self._tags[i])
+                ids.append(i)
                 k += 1
-            if k > self._length:
+            if k >= self._length:
                 raise Exception('Broken successor list (infinite loop).')
-        return tags
+        return ids
+        
+ 
+    @property
+    def all(self):
+        return [self._tags[i] for i in self.ids()]
 
     
     def __repr__(self):
         hashed_tags = [id(t) for t in self._tags]
         return (f'tags\n{hashed_tags}\n'
-                f'succ\n{self._succ}\n'
-                f'prec\n{self._prec}\n'
+                f'succ\n{self._succ.tolist()}\n'
+                f'prec\n{self._prec.tolist()}\n'
                 f'root {self.root}\n'
                 f'counter {self.counter}\n'
                 f'_next_id {self._next_id}\n'
                 f'_length {self._length}')
-        
+
+
+
+
+class TreeTags(Tags):
+    """
+    The tags are [length, format] lists. Their ids are also the nodes
+    of a *WeightedTree* whose weights are the tag lengths. Positional
+    lookups (*find*) and length updates cost O(log n). The double linked
+    list of *Tags* is kept for O(1) *next* and *previous* calls.
+    The lengths have to be changed with *set_length*.
+    """
+
+
+    def version(self):
+        tags = super().version()
+        tags._tree = self._tree.version()
+        return tags
+
+
+    def release(self):
+        super().release()
+        self._tree.release()
+
+
+    def _build(self, tags):
+        super()._build(tags)
+        self._tree = WeightedTree()
+        self._tree.build(list(range(self.counter)),
+                         [tag[0] for tag in self._tags])
+
+
+    def _insert_tag(self, new_tag_id, precursor_id):
+        super()._insert_tag(new_tag_id, precursor_id)
+        self._tree.insert(new_tag_id,
+                          self._tags[new_tag_id][0],
+                          precursor_id)
+
+
+    def delete(self, tag_id):
+        self._tree.remove(tag_id)
+        super().delete(tag_id)
+
+
+    def find(self, pos):
+        tag_id, start = self._tree.find(pos)
+        if self.metrics.enabled:
+            # The search walks the path from the root to the tag.
+            self.metrics.count('tags.find')
+            self.metrics.count('tags.find.walked',
+                               self._tree.depth(tag_id) + 1)
+        return (tag_id,
+                self._tags[tag_id],
+                start)
+
+
+    def set_length(self, tag_id, length):
+        super().set_length(tag_id, length)
+        self._tree.set_weight(tag_id, length)
+
+
+
+# SEE IndexedTags.index_keys.
+_PROPERTY = object()
+
+
+def property_key(name, value):
+    """ The index key of the tags whose format has a property. """
+    return (_PROPERTY, name, value)
+
+
+
+class IndexedTags(TreeTags):
+    """
+    *TreeTags* with an inverted index from formats to tag ids. The
+    index is kept up to date by *create*, *delete* and *set_format*
+    (the formats mustn't be modified in place). The ranges of the
+    text carrying a format are found in O(k log n) for k tags.
+    """
+
+
+    @staticmethod
+    def index_keys(format):
+        """
+        A tag is indexed under its format (if it is hashable) and
+        under *property_key(name, value)* for each property of a
+        format which has *items()* (dicts, *Format*) whose value is
+        hashable.
+        """
+        keys = []
+        try:
+            hash(format)
+            keys.append(format)
+        except TypeError:
+            pass
+        items = getattr(format, 'items', None)
+        if items is not None:
+            for name, value in items():
+                key = property_key(name, value)
+                try:
+                    hash(key)
+                except TypeError:
+                    continue
+                keys.append(key)
+        return keys
+
+
+    def _build(self, tags):
+        super()._build(tags)
+        self._index = VersionedIndex()
+        for tag_id, tag in enumerate(self._tags):
+            self._index_tag(tag_id, tag[1])
+
+
+    def version(self):
+        tags = super().version()
+        tags._index = versions.version(self._index)
+        return tags
+
+
+    def release(self):
+        super().release()
+        versions.release(self._index)
+
+
+    def _index_tag(self, tag_id, format):
+        for key in self.index_keys(format):
+            self._index.add(key, tag_id)
+
+
+    def _unindex_tag(self, tag_id, format):
+        for key in self.index_keys(format):
+            self._index.discard(key, tag_id)
+
+
+    def _insert_tag(self, new_tag_id, precursor_id):
+        super()._insert_tag(new_tag_id, precursor_id)
+        self._index_tag(new_tag_id, self._tags[new_tag_id][1])
+
+
+    def delete(self, tag_id):
+        self._unindex_tag(tag_id, self._tags[tag_id][1])
+        super().delete(tag_id)
+
+
+    def set_format(self, tag_id, format):
+        self._unindex_tag(tag_id, self._tags[tag_id][1])
+        super().set_format(tag_id, format)
+        self._index_tag(tag_id, format)
+
+
+    def ids_with(self, key):
+        return set(self._index.get(key, ()))
+
+
+    def ranges(self, key):
+        """
+        The sorted (start, end) ranges covered by the tags indexed
+        under *key*. Adjacent ranges are joined.
+        """
+        spans = sorted((self._tree.offset(tag_id), self._tags[tag_id][0])
+                       for tag_id in self._index.get(key, ()))
+        ranges = []
+        for start, length in spans:
+            if ranges and ranges[-1][1] == start:
+                ranges[-1][1] = start + length
+            else:
+                ranges.append([start, start + length])
+        return [tuple(span) for span in ranges]
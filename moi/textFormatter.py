@@ -1,10 +1,19 @@
+from collections import OrderedDict
+import json
+
+
 class TextFormatter:
     """
     The tokenize and keyword libraries.
+
+    A formatter can opt in to format interning (SEE InternedFormatter)
+    by setting INTERNED to True and providing *intern(format)*. The
+    editor then interns every format it receives.
     """
 
 
     DEFAULT_FORMAT = None
+    INTERNED = False
 
     def __init__(self):
         pass
@@ -22,3 +31,230 @@ class TextFormatter:
     @staticmethod 
     def compare(format_one, format_two):
         pass
+
+
+
+_MISSING = object()
+
+
+class FormatRegistry:
+    """
+    Hash-consing of formats: equal formats are replaced by a single
+    canonical object identified by a small integer. The formats have
+    to be hashable.
+    The results of *merge* are kept in a bounded LRU cache keyed by
+    the ids of the merged formats.
+    """
+
+
+    def __init__(self, merge, cache_size = 1024):
+        """ *merge(old, new)* is the structural merge function. """
+        self._merge = merge
+        self.cache_size = cache_size
+        self._formats = []
+        # Format -> id and canonical object identity -> id.
+        self._ids = {}
+        self._object_ids = {}
+        self._cache = OrderedDict()
+
+
+    def __len__(self):
+        return len(self._formats)
+
+
+    def intern(self, format):
+        """ The canonical object equal to *format*. """
+        return self._formats[self.id(format)]
+
+
+    def id(self, format):
+        format_id = self._object_ids.get(id(format))
+        if format_id is not None:
+            return format_id
+        format_id = self._ids.get(format)
+        if format_id is None:
+            format_id = len(self._formats)
+            self._formats.append(format)
+            self._ids[format] = format_id
+            # The canonical objects are kept alive by *_formats* so
+            # their identities can't be reused.
+            self._object_ids[id(format)] = format_id
+        return format_id
+
+
+    def format(self, format_id):
+        return self._formats[format_id]
+
+
+    def merge(self, old_format, new_format):
+        key = (self.id(old_format), self.id(new_format))
+        result = self._cache.get(key, _MISSING)
+        if result is not _MISSING:
+            self._cache.move_to_end(key)
+            return result
+        result = self.intern(self._merge(self._formats[key[0]],
+                                         self._formats[key[1]]))
+        self._cache[key] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last = False)
+        return result
+
+
+    def clear_cache(self):
+        self._cache.clear()
+
+
+    @staticmethod
+    def compare(format_one, format_two):
+        """ Interned formats are equal if they are the same object. """
+        return format_one is format_two
+
+
+
+class InternedFormatter(TextFormatter):
+    """
+    Base class of the formatters whose formats are interned. Each
+    subclass gets its own *registry*. Subclasses implement the
+    structural merge in *merge_formats*. *merge* is memoized and
+    *compare* is an identity check.
+    """
+
+
+    INTERNED = True
+    CACHE_SIZE = 1024
+
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.registry = FormatRegistry(cls.merge_formats, cls.CACHE_SIZE)
+        cls.DEFAULT_FORMAT = cls.registry.intern(cls.DEFAULT_FORMAT)
+
+
+    @staticmethod
+    def merge_formats(old_format, new_format):
+        return new_format
+
+
+    @classmethod
+    def intern(cls, format):
+        return cls.registry.intern(format)
+
+
+    @classmethod
+    def merge(cls, old_format, new_format):
+        return cls.registry.merge(old_format, new_format)
+
+
+    @staticmethod
+    def compare(format_one, format_two):
+        return format_one is format_two
+
+
+
+class Format:
+    """
+    Immutable and hashable set of format properties (name -> value).
+    The hash is computed once. A None value unsets a property when
+    the format is applied to another one (SEE updated).
+    >>> Format(bold = True) == Format({'bold': True})
+    True
+    """
+    __slots__ = ('_items', '_hash')
+
+
+    def __init__(self, properties = None, **kwargs):
+        properties = dict(() if properties is None else properties,
+                          **kwargs)
+        self._items = tuple(sorted(properties.items()))
+        self._hash = hash(self._items)
+
+
+    def __hash__(self):
+        return self._hash
+
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, Format):
+            return NotImplemented
+        return self._hash == other._hash and self._items == other._items
+
+
+    def __getitem__(self, name):
+        for key, value in self._items:
+            if key == name:
+                return value
+        raise KeyError(name)
+
+
+    def get(self, name, default = None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+
+    def __contains__(self, name):
+        return any(key == name for key, _ in self._items)
+
+
+    def __iter__(self):
+        return (name for name, _ in self._items)
+
+
+    def __len__(self):
+        return len(self._items)
+
+
+    def items(self):
+        return self._items
+
+
+    def updated(self, other):
+        """
+        A new format with the properties of *other* (None removes a
+        property). The properties which *other* doesn't set are
+        unchanged.
+        """
+        properties = dict(self._items)
+        properties.update(other.items())
+        return Format({name: value
+                       for name, value in properties.items()
+                       if value is not None})
+
+
+    def __repr__(self):
+        return 'Format({})'.format(
+            ', '.join(f'{name} = {value!r}' for name, value in self._items))
+
+
+
+class PropertyFormatter(InternedFormatter):
+    """
+    Formats are *Format* objects. *merge* applies the properties set
+    by the new format to the old one and only them: a link inside a
+    selection whose format is changed remains a link unless the new
+    format sets *link* (None removes it). The formats are interned:
+    *compare* costs O(1) and *merge* is memoized.
+    """
+
+
+    DEFAULT_FORMAT = Format()
+
+
+    @staticmethod
+    def merge_formats(old_format, new_format):
+        return old_format.updated(new_format)
+
+
+    @staticmethod
+    def encode_format(format):
+        """ SEE binaryFormat. The property values have to be JSON values. """
+        return json.dumps(format.items(),
+                          separators = (',', ':')).encode('utf-8')
+
+
+    @classmethod
+    def decode_format(cls, data):
+        return cls.intern(Format(json.loads(str(data, 'utf-8'))))
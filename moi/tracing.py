@@ -0,0 +1,99 @@
+from collections import deque, namedtuple
+import logging
+import time
+
+
+"""
+Structured tracing of the editor internals.
+
+The tracing is disabled by default. The call sites check
+*tracer.enabled* before building anything, so a disabled tracer
+costs an attribute lookup. An enabled tracer stores typed events
+in a bounded ring buffer (the oldest events are dropped).
+Events are rendered to text only on demand (*render*, *dump*).
+"""
+
+Event = namedtuple('Event',
+                   ['time', 'source', 'operation',
+                    'positions', 'tag_ids', 'data'])
+
+
+class Tracer:
+
+
+    def __init__(self, capacity = 4096):
+        self.enabled = False
+        self._events = deque(maxlen = capacity)
+
+
+    @property
+    def capacity(self):
+        return self._events.maxlen
+
+
+    @property
+    def events(self):
+        return list(self._events)
+
+
+    def enable(self):
+        self.enabled = True
+
+
+    def disable(self):
+        self.enabled = False
+
+
+    def clear(self):
+        self._events.clear()
+
+
+    def record(self,
+               source,
+               operation,
+               positions = (),
+               tag_ids = (),
+               data = None):
+        """
+        The caller is responsible for checking *enabled* first.
+        *data* has to be a value which won't be mutated later.
+        """
+        self._events.append(Event(time.perf_counter(),
+                                  source,
+                                  operation,
+                                  positions,
+                                  tag_ids,
+                                  data))
+
+
+    @staticmethod
+    def render_event(event):
+        text = f'{event.time:.6f} {event.source} {event.operation}'
+        if event.positions:
+            text += f' positions {event.positions}'
+        if event.tag_ids:
+            text += f' tag_ids {event.tag_ids}'
+        if event.data is not None:
+            text += f' {event.data!r}'
+        return text
+
+
+    def render(self):
+        return '\n'.join(self.render_event(event)
+                         for event in self._events)
+
+
+    def dump(self, logger = 'text_editor', clear = True):
+        """ To send the recorded events to a logger. """
+        logging.getLogger(logger).debug(self.render())
+        if clear:
+            self.clear()
+
+
+    def __repr__(self):
+        return (f'Tracer(enabled {self.enabled}, '
+                f'{len(self._events)}/{self.capacity} events)')
+
+
+# The tracer shared by default by all editors and tag lists.
+tracer = Tracer()
@@ -0,0 +1,216 @@
+from array import array
+
+
+"""
+Partially persistent containers (SEE TextEditor.snapshot).
+
+*version(container)* returns a read-only view of the current content
+of a *VersionedArray*, a *VersionedList* or a *VersionedIndex* in
+O(1). The container is still modified in place: while views exist,
+the first modification of an item after the creation of a version
+saves the old value of the item in this version (fat nodes). A view
+reads the live item and then the values saved by its version and
+the following ones: the first saved value is the one of the view.
+Therefore, a modification costs O(1) more and the memory used is
+proportional to the number of modified items. The views can be read
+by other threads while the container is being modified (the value is
+always saved before the item is modified).
+
+The plain containers are subclasses of *array*, *list* and *dict*
+whose reads and writes cost the same. Their class is switched to a
+logging subclass while they have versions (SEE release).
+"""
+
+class _Version:
+
+
+    __slots__ = ('old', 'length', 'newer')
+
+
+    def __init__(self, length):
+        # Item -> value before the first modification.
+        self.old = {}
+        self.length = length
+        self.newer = None
+
+
+
+class VersionedArray(array):
+    """ An *array* which can be versioned. """
+
+    _version = None
+
+
+    def __deepcopy__(self, memo):
+        return VersionedArray(self.typecode, self)
+
+
+
+class _LoggedArray(VersionedArray):
+
+
+    def __setitem__(self, i, value):
+        version = self._version
+        if i < 0:
+            i += len(self)
+        if i < version.length and i not in version.old:
+            version.old[i] = array.__getitem__(self, i)
+        array.__setitem__(self, i, value)
+
+
+
+class VersionedList(list):
+    """ A *list* which can be versioned. """
+
+    _version = None
+
+
+
+class _LoggedList(VersionedList):
+
+
+    def __setitem__(self, i, value):
+        version = self._version
+        if i < 0:
+            i += len(self)
+        if i < version.length and i not in version.old:
+            version.old[i] = list.__getitem__(self, i)
+        list.__setitem__(self, i, value)
+
+
+
+class VersionedIndex(dict):
+    """
+    A mapping from keys to sets of items modified by *add* and
+    *discard* only. The keys whose set is empty are removed.
+    """
+
+    _version = None
+
+
+    def add(self, key, item):
+        items = self.get(key)
+        if items is None:
+            items = self[key] = set()
+        if self._version is not None:
+            self._save(key, item, items)
+        items.add(item)
+
+
+    def discard(self, key, item):
+        items = self[key]
+        if self._version is not None:
+            self._save(key, item, items)
+        items.discard(item)
+        if not items:
+            del self[key]
+
+
+    def _save(self, key, item, items):
+        old = self._version.old.setdefault(key, {})
+        if item not in old:
+            old[item] = item in items
+
+
+
+class ArrayView:
+    """ The read-only view of a version of an array or a list. """
+
+
+    def __init__(self, base, version):
+        self._base = base
+        self._version = version
+
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._version.length
+        # The live item has to be read before the saved values.
+        value = self._base[i]
+        version = self._version
+        while version is not None:
+            old = version.old
+            if i in old:
+                return old[i]
+            version = version.newer
+        return value
+
+
+    def __len__(self):
+        return self._version.length
+
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+    def tolist(self):
+        return list(self)
+
+
+
+class IndexView:
+    """ The read-only view of a version of a *VersionedIndex*. """
+
+
+    def __init__(self, base, version):
+        self._base = base
+        self._version = version
+
+
+    def get(self, key, default = None):
+        items = set(self._base.get(key, ()))
+        decided = set()
+        version = self._version
+        while version is not None:
+            # A copy: the dict may be modified by another thread.
+            old = dict(version.old.get(key, {}))
+            for item, member in old.items():
+                if item not in decided:
+                    decided.add(item)
+                    if member:
+                        items.add(item)
+                    else:
+                        items.discard(item)
+            version = version.newer
+        return items if items else default
+
+
+
+_LOGGED = {VersionedArray: _LoggedArray, VersionedList: _LoggedList}
+_VIEWS = {VersionedArray: ArrayView, VersionedList: ArrayView,
+          VersionedIndex: IndexView}
+
+
+def version(container):
+    """ A read-only view of the current content of *container*. """
+    plain = _plain_class(container)
+    newest = container._version
+    if (newest is not None and not newest.old
+        and newest.length == len(container)):
+        # Nothing has changed since the last version.
+        return _VIEWS[plain](container, newest)
+    new = _Version(len(container))
+    if newest is not None:
+        newest.newer = new
+    container._version = new
+    if plain in _LOGGED:
+        container.__class__ = _LOGGED[plain]
+    return _VIEWS[plain](container, new)
+
+
+def release(container):
+    """
+    The modifications aren't saved any more. The existing views
+    become invalid.
+    """
+    if container._version is not None:
+        container.__class__ = _plain_class(container)
+        container._version = None
+
+
+def _plain_class(container):
+    for plain in _VIEWS:
+        if isinstance(container, plain):
+            return plain
+    raise TypeError(f'{type(container).__name__} is not versioned.')
@@ -0,0 +1,418 @@
+from array import array
+import random
+
+from . import versions
+from .versions import VersionedArray
+
+
+"""
+A balanced binary tree (treap) over externally allocated node ids.
+The in-order traversal of the tree gives the order of a sequence.
+Each node has a weight (a length) and a number of units (1 by
+default) and the tree maintains the sums of the weights and of the
+units of every subtree. Therefore, positional lookups (which node
+contains the position *pos* ?) and order statistics (which node
+contains the k-th unit ?) cost O(log n). A node of several units
+stands for a group of elements which is not split yet (SEE
+lineIndex).
+
+Node ids are small integers chosen by the caller (usually slot
+indices of a container). The tree only stores links, priorities
+and aggregates. Parent links allow operations starting from a node
+(offset, rank, removal) without searching for it.
+
+The links and the aggregates are stored in typed arrays. NIL stands
+for a missing node. They are versioned: *version* returns a read-only
+tree in O(1) (SEE versions).
+"""
+
+NIL = -1
+
+
+class WeightedTree:
+
+
+    _ARRAYS = ('_left', '_right', '_parent', '_priority', '_weight',
+               '_units', '_sum', '_count')
+
+
+    def __init__(self):
+        self._root = NIL
+        self._left = VersionedArray('l')
+        self._right = VersionedArray('l')
+        self._parent = VersionedArray('l')
+        self._priority = VersionedArray('d')
+        self._weight = VersionedArray('q')
+        self._units = VersionedArray('q')
+        self._sum = VersionedArray('q')
+        self._count = VersionedArray('q')
+
+
+    @property
+    def root(self):
+        return None if self._root == NIL else self._root
+
+
+    @property
+    def total(self):
+        """ The sum of all the weights. """
+        return 0 if self._root == NIL else self._sum[self._root]
+
+
+    def __len__(self):
+        """ The total number of units. """
+        return 0 if self._root == NIL else self._count[self._root]
+
+
+    def weight(self, node):
+        return self._weight[node]
+
+
+    def units(self, node):
+        return self._units[node]
+
+
+    def version(self):
+        """
+        A read-only tree whose content is the current one, whatever
+        the later modifications (SEE versions).
+        """
+        tree = WeightedTree.__new__(WeightedTree)
+        tree._root = self._root
+        for name in self._ARRAYS:
+            setattr(tree, name, versions.version(getattr(self, name)))
+        return tree
+
+
+    def release(self):
+        """ The versions become invalid (SEE versions.release). """
+        for name in self._ARRAYS:
+            versions.release(getattr(self, name))
+
+
+    def _ensure(self, node):
+        """ The underlying arrays are resized if necessary. """
+        missing = node + 1 - len(self._weight)
+        if missing > 0:
+            for links in (self._left, self._right, self._parent):
+                links.extend(array('l', [NIL]) * missing)
+            self._priority.extend(array('d', [0.0]) * missing)
+            for values in (self._weight, self._units, self._sum,
+                           self._count):
+                values.extend(array('q', [0]) * missing)
+
+
+    def _pull(self, node):
+        """ To recompute the aggregates of a node from its children. """
+        left = self._left[node]
+        right = self._right[node]
+        total = self._weight[node]
+        count = self._units[node]
+        if left != NIL:
+            total += self._sum[left]
+            count += self._count[left]
+        if right != NIL:
+            total += self._sum[right]
+            count += self._count[right]
+        self._sum[node] = total
+        self._count[node] = count
+
+
+    def _rotate_up(self, node):
+        """
+        *node* takes the place of its parent which becomes one of
+        its children. The in-order sequence is unchanged.
+        """
+        parent = self._parent[node]
+        grand_parent = self._parent[parent]
+        if self._left[parent] == node:
+            middle = self._right[node]
+            self._left[parent] = middle
+            self._right[node] = parent
+        else:
+            middle = self._left[node]
+            self._right[parent] = middle
+            self._left[node] = parent
+        if middle != NIL:
+            self._parent[middle] = parent
+        self._parent[parent] = node
+        self._parent[node] = grand_parent
+        if grand_parent == NIL:
+            self._root = node
+        elif self._left[grand_parent] == parent:
+            self._left[grand_parent] = node
+        else:
+            self._right[grand_parent] = node
+        self._pull(parent)
+        self._pull(node)
+
+
+    def _add_upward(self, node, weight, count):
+        # The unchanged aggregates aren't written (SEE version).
+        if weight and count:
+            while node != NIL:
+                self._sum[node] += weight
+                self._count[node] += count
+                node = self._parent[node]
+        elif weight:
+            while node != NIL:
+                self._sum[node] += weight
+                node = self._parent[node]
+        elif count:
+            while node != NIL:
+                self._count[node] += count
+                node = self._parent[node]
+
+
+    def insert(self, node, weight, predecessor = None, units = 1):
+        """
+        *node* is inserted just after *predecessor* in the sequence.
+        If *predecessor* is None, *node* becomes the first node.
+        """
+        self._ensure(node)
+        self._left[node] = NIL
+        self._right[node] = NIL
+        self._priority[node] = random.random()
+        self._weight[node] = weight
+        self._units[node] = units
+        self._sum[node] = weight
+        self._count[node] = units
+        if self._root == NIL:
+            self._parent[node] = NIL
+            self._root = node
+            return
+        # Finding an empty child slot at the right place.
+        if predecessor is None:
+            parent = self._leftmost(self._root)
+            self._left[parent] = node
+        elif self._right[predecessor] == NIL:
+            parent = predecessor
+            self._right[parent] = node
+        else:
+            parent = self._leftmost(self._right[predecessor])
+            self._left[parent] = node
+        self._parent[node] = parent
+        self._add_upward(parent, weight, units)
+        # Restoring the heap property.
+        while (self._parent[node] != NIL and
+               self._priority[node] > self._priority[self._parent[node]]):
+            self._rotate_up(node)
+
+
+    def remove(self, node):
+        # The node is rotated down until it has at most one child.
+        while (self._left[node] != NIL and
+               self._right[node] != NIL):
+            left = self._left[node]
+            right = self._right[node]
+            if self._priority[left] > self._priority[right]:
+                self._rotate_up(left)
+            else:
+                self._rotate_up(right)
+        child = self._left[node]
+        if child == NIL:
+            child = self._right[node]
+        parent = self._parent[node]
+        if child != NIL:
+            self._parent[child] = parent
+        if parent == NIL:
+            self._root = child
+        else:
+            if self._left[parent] == node:
+                self._left[parent] = child
+            else:
+                self._right[parent] = child
+            self._add_upward(parent, -self._weight[node],
+                             -self._units[node])
+        self._left[node] = NIL
+        self._right[node] = NIL
+        self._parent[node] = NIL
+
+
+    def set_weight(self, node, weight):
+        difference = weight - self._weight[node]
+        if difference:
+            self._weight[node] = weight
+            self._add_upward(node, difference, 0)
+
+
+    def set_units(self, node, units):
+        difference = units - self._units[node]
+        if difference:
+            self._units[node] = units
+            self._add_upward(node, 0, difference)
+
+
+    def find(self, pos):
+        """
+        To get the node containing the position *pos* and the position
+        of its first unit.
+        When *pos* is greater than or equal to the total weight,
+        the last node is returned.
+        """
+        node = self._root
+        if node == NIL:
+            return (None, 0)
+        start = 0
+        while True:
+            left = self._left[node]
+            if left != NIL:
+                if pos < start + self._sum[left]:
+                    node = left
+                    continue
+                start += self._sum[left]
+            right = self._right[node]
+            if pos < start + self._weight[node] or right == NIL:
+                return (node, start)
+            start += self._weight[node]
+            node = right
+
+
+    def select(self, k):
+        """
+        To get the node containing the k-th unit (zero-based) and its
+        position.
+        """
+        if not 0 <= k < len(self):
+            raise IndexError('Wrong rank.')
+        node = self._root
+        start = 0
+        while True:
+            left = self._left[node]
+            left_count = 0 if left == NIL else self._count[left]
+            if k < left_count:
+                node = left
+                continue
+            if left != NIL:
+                start += self._sum[left]
+            if k < left_count + self._units[node]:
+                return (node, start)
+            k -= left_count + self._units[node]
+            start += self._weight[node]
+            node = self._right[node]
+
+
+    def offset(self, node):
+        """ The position of the first unit of *node*. """
+        left = self._left[node]
+        start = 0 if left == NIL else self._sum[left]
+        parent = self._parent[node]
+        while parent != NIL:
+            if self._right[parent] == node:
+                left = self._left[parent]
+                start += self._weight[parent]
+                if left != NIL:
+                    start += self._sum[left]
+            node = parent
+            parent = self._parent[node]
+        return start
+
+
+    def rank(self, node):
+        """ The number of units before *node*. """
+        left = self._left[node]
+        k = 0 if left == NIL else self._count[left]
+        parent = self._parent[node]
+        while parent != NIL:
+            if self._right[parent] == node:
+                left = self._left[parent]
+                k += self._units[parent]
+                if left != NIL:
+                    k += self._count[left]
+            node = parent
+            parent = self._parent[node]
+        return k
+
+
+    def depth(self, node):
+        """ The number of ancestors of *node*. """
+        depth = 0
+        node = self._parent[node]
+        while node != NIL:
+            depth += 1
+            node = self._parent[node]
+        return depth
+
+
+    def _leftmost(self, node):
+        while self._left[node] != NIL:
+            node = self._left[node]
+        return node
+
+
+    def _rightmost(self, node):
+        while self._right[node] != NIL:
+            node = self._right[node]
+        return node
+
+
+    def first(self):
+        return None if self._root == NIL else self._leftmost(self._root)
+
+
+    def last(self):
+        return None if self._root == NIL else self._rightmost(self._root)
+
+
+    def next(self, node):
+        if self._right[node] != NIL:
+            return self._leftmost(self._right[node])
+        parent = self._parent[node]
+        while parent != NIL and self._right[parent] == node:
+            node = parent
+            parent = self._parent[node]
+        return None if parent == NIL else parent
+
+
+    def previous(self, node):
+        if self._left[node] != NIL:
+            return self._rightmost(self._left[node])
+        parent = self._parent[node]
+        while parent != NIL and self._left[parent] == node:
+            node = parent
+            parent = self._parent[node]
+        return None if parent == NIL else parent
+
+
+    def build(self, nodes, weights, units = None):
+        """
+        The tree is rebuilt from scratch in O(n). *nodes* gives the
+        order of the sequence, *weights* the weight of each node and
+        *units* (by default 1) its number of units.
+        The construction of the Cartesian tree uses a stack which
+        holds the right spine of the tree built so far.
+        """
+        self._root = NIL
+        if not nodes:
+            return
+        self._ensure(max(nodes))
+        if units is None:
+            units = [1] * len(nodes)
+        stack = []
+        for node, weight, node_units in zip(nodes, weights, units):
+            priority = random.random()
+            self._priority[node] = priority
+            self._weight[node] = weight
+            self._units[node] = node_units
+            self._right[node] = NIL
+            last = NIL
+            while stack and self._priority[stack[-1]] < priority:
+                last = stack.pop()
+            self._left[node] = last
+            if last != NIL:
+                self._parent[last] = node
+            if stack:
+                self._right[stack[-1]] = node
+                self._parent[node] = stack[-1]
+            else:
+                self._parent[node] = NIL
+            stack.append(node)
+        self._root = stack[0]
+        # The aggregates are computed from the leaves to the root.
+        order = [self._root]
+        for node in order:
+            for child in (self._left[node], self._right[node]):
+                if child != NIL:
+                    order.append(child)
+        for node in reversed(order):
+            self._pull(node)
@@ -0,0 +1,75 @@
+import unittest
+import mmap
+import tempfile
+from moi.binaryFormat import *
+from moi.textEditor import TextEditor, Tags
+from moi.textBuffer import MappedBuffer
+from moi.textFormatter import Format, PropertyFormatter
+
+
+class Formatter:
+    DEFAULT_FORMAT = 'default'
+
+    @staticmethod
+    def merge(old, new):
+        return new
+
+    @staticmethod
+    def compare(format_one, format_two):
+        return format_one == format_two
+
+
+
+class TestBinaryFormat(unittest.TestCase):
+
+
+    def test_round_trip(self):
+        text = 'héllo wörld \U0001f600\n' * 100
+        runs = [[k % 7 + 1, ['a', 'b', {'c': 1}][k % 3]]
+                for k in range(len(text) // 4)]
+        runs.append([len(text) - sum(run[0] for run in runs), 'a'])
+        editor = TextEditor.from_runs(Formatter, text, runs)
+        data = dumps(editor)
+        self.assertEqual(data[:4], MAGIC)
+        loaded = loads(Formatter, data, TagList = Tags)
+        self.assertEqual(loaded.text, text)
+        self.assertEqual(loaded.tags.all, editor.tags.all)
+        self.assertEqual(loaded.lines.locate(30), editor.lines.locate(30))
+        # The text of a mapped buffer is decoded lazily.
+        mapped = loads(Formatter, data, TextBuffer = MappedBuffer)
+        self.assertEqual(mapped.text.loaded, 0)
+        self.assertEqual(mapped.compile(), editor.compile())
+        # Empty document.
+        empty = loads(Formatter, dumps(TextEditor(Formatter)))
+        self.assertEqual(empty.compile(), [])
+
+
+    def test_mmap(self):
+        editor = TextEditor.from_runs(PropertyFormatter, 'abcdef',
+                                      [(2, Format()),
+                                       (4, Format(link = 'x', size = 3))])
+        with tempfile.TemporaryFile() as stream:
+            dump(editor, stream)
+            stream.flush()
+            with mmap.mmap(stream.fileno(), 0,
+                           access = mmap.ACCESS_READ) as mapping:
+                loaded = loads(PropertyFormatter, mapping)
+        self.assertEqual(loaded.compile(), editor.compile())
+        self.assertIs(loaded.tags.all[1][1], editor.tags.all[1][1])
+
+
+    def test_errors(self):
+        data = dumps(TextEditor.from_runs(Formatter, 'abc', [(3, 'a')]))
+        with self.assertRaises(ValueError):
+            loads(Formatter, b'XXXX' + data[4:])
+        with self.assertRaises(ValueError):
+            loads(Formatter, data[:-1])
+        self.assertEqual(data, MAGIC + b'\x01\x03"a"\x01\x03\x00\x03abc')
+        # The run refers to the format 5 of a table of one format.
+        with self.assertRaises(ValueError):
+            loads(Formatter, MAGIC + b'\x01\x03"a"\x01\x03\x05\x03abc')
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import os
+import re
+import tempfile
+
+from moi.binaryFormat import dumps, loads
+from moi.bulkTransform import transform_documents
+from moi.textEditor import TextEditor
+from moi.textFormatter import Format, PropertyFormatter
+
+
+def make_links(editor):
+    """ The URLs become links. The number of links is returned. """
+    matches = list(re.finditer(r'https?://\S+', str(editor.text)))
+    for match in matches:
+        editor.incremental_format = Format(link = match.group())
+        editor.change_selection_format(match.start(), match.end())
+    return len(matches)
+
+
+def strip_colour(editor):
+    editor.incremental_format = Format(colour = None)
+    editor.change_selection_format(0, len(editor.text))
+    editor.change_position(0)
+    editor.edit('> ')
+
+
+
+class TestBulkTransform(unittest.TestCase):
+
+
+    def document(self, k):
+        editor = TextEditor(PropertyFormatter)
+        editor.current_format = Format(colour = 'red')
+        editor.edit(f'Document {k}: see https://example.com/{k} ')
+        editor.current_format = Format(bold = True)
+        editor.edit('or http://moi.org.' * (k % 3))
+        return dumps(editor)
+
+
+    def test_transform(self):
+        documents = [(k, self.document(k)) for k in range(20)]
+        for ordered in (True, False):
+            results = list(transform_documents(iter(documents), make_links,
+                                               PropertyFormatter,
+                                               processes = 2,
+                                               chunk_size = 3,
+                                               max_pending = 2,
+                                               ordered = ordered))
+            if ordered:
+                self.assertEqual([key for key, _, _ in results],
+                                 list(range(20)))
+            self.assertEqual(sorted(key for key, _, _ in results),
+                             list(range(20)))
+            for key, data, result in results:
+                editor = loads(PropertyFormatter, dict(documents)[key])
+                self.assertEqual(result, make_links(editor))
+                self.assertEqual(loads(PropertyFormatter, data).compile(),
+                                 editor.compile())
+
+
+    def test_paths(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = []
+            for k in range(4):
+                paths.append(os.path.join(directory, f'{k}.moi'))
+                with open(paths[-1], 'wb') as stream:
+                    stream.write(self.document(k))
+            results = list(transform_documents(((path, path)
+                                                for path in paths),
+                                               strip_colour,
+                                               PropertyFormatter,
+                                               processes = 2))
+        self.assertEqual([key for key, _, _ in results], paths)
+        for _, data, result in results:
+            self.assertIsNone(result)
+            runs = loads(PropertyFormatter, data).compile()
+            self.assertTrue(runs[0][0].startswith('> Document'))
+            self.assertTrue(all('colour' not in format
+                                for _, format in runs))
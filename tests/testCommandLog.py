@@ -0,0 +1,148 @@
+import unittest
+import io
+import json
+import random
+
+from moi.textEditor import TextEditor, TreeTags
+from moi.textFormatter import Format, PropertyFormatter
+from moi.commandLog import CommandRecorder, replay
+
+
+class Formatter:
+    DEFAULT_FORMAT = 'default'
+
+    @staticmethod
+    def merge(old, new):
+        return new
+
+    @staticmethod
+    def compare(format_one, format_two):
+        return format_one == format_two
+
+
+
+class DictFormatter:
+    DEFAULT_FORMAT = {}
+
+    @staticmethod
+    def merge(old, new):
+        result = dict(old)
+        result.update(new)
+        return {name: value for name, value in result.items()
+                if value is not None}
+
+    @staticmethod
+    def compare(format_one, format_two):
+        return format_one == format_two
+
+
+
+class TestCommandLog(unittest.TestCase):
+
+
+    def session(self, editor, formats, rng):
+        for k in range(300):
+            n = len(editor.text)
+            action = rng.random()
+            if n < 5 or action < 0.4:
+                if n:
+                    editor.change_position(rng.randint(0, n))
+                editor.current_format = rng.choice(formats)
+                editor.edit(rng.choice(['a', 'bc', 'é\n']))
+            elif action < 0.5:
+                editor.change_position(rng.randint(1, n))
+                editor.delete()
+            elif action < 0.6:
+                i = rng.randint(0, n - 2)
+                editor.delete_selection(i, i + 2)
+            elif action < 0.8:
+                i = rng.randint(0, n - 1)
+                editor.incremental_format = rng.choice(formats)
+                editor.change_selection_format(i, rng.randint(i + 1, n))
+            elif action < 0.9:
+                editor.set_cursors([0, n // 2])
+                editor.edit_at_cursors('xy')
+                editor.clear_cursors()
+            else:
+                editor.undo()
+                if action < 0.95:
+                    editor.redo()
+
+
+    def test_replay(self):
+        rng = random.Random(5)
+        for Formatter_, formats in [
+                (Formatter, ['a', 'b', 'c']),
+                (PropertyFormatter, [Format(bold = True), Format(size = 2),
+                                     Format(bold = None)]),
+                # Equal dicts share their id whatever their key order.
+                (DictFormatter, [{'bold': True, 'size': 1},
+                                 {'bold': False, 'size': 2},
+                                 {'size': 2, 'bold': False}])]:
+            editor = TextEditor(Formatter_, TagList = TreeTags)
+            stream = io.StringIO()
+            editor.recorder = CommandRecorder(stream, Formatter_)
+            self.session(editor, formats, rng)
+            lines = stream.getvalue().splitlines()
+            # Formats (including the default one) are written once.
+            self.assertLessEqual(sum(json.loads(line)[0] == 'format'
+                                     for line in lines), len(formats) + 1)
+            stream.seek(0)
+            copy = TextEditor(Formatter_, TagList = TreeTags)
+            self.assertEqual(replay(copy, stream, chunk_size = 7),
+                             len(lines))
+            self.assertEqual(str(copy.text), str(editor.text))
+            self.assertEqual(copy.compile(), editor.compile())
+            self.assertEqual(copy.cursor_pos, editor.cursor_pos)
+
+
+    def test_nested_commands(self):
+        editor = TextEditor(Formatter)
+        stream = io.StringIO()
+        editor.recorder = CommandRecorder(stream, Formatter)
+        editor.edit('abcdef')
+        editor.delete_selection(1, 3)
+        with self.assertRaises(ValueError):
+            editor.delete_selection(3, 2)
+        self.assertEqual([json.loads(line) for line
+                          in stream.getvalue().splitlines()],
+                         [['edit', 'abcdef'], ['delete_selection', 1, 3]])
+
+
+    def test_keyword_arguments_and_flush(self):
+
+        class Stream(io.StringIO):
+            flushes = 0
+
+            def flush(self):
+                self.flushes += 1
+
+        editor = TextEditor(Formatter)
+        stream = Stream()
+        editor.recorder = CommandRecorder(stream, Formatter, flush_every = 2)
+        editor.edit(s = 'abcdef')
+        editor.delete_selection(1, j = 3)
+        editor.change_position(pos = 2)
+        self.assertEqual([json.loads(line) for line
+                          in stream.getvalue().splitlines()],
+                         [['edit', 'abcdef'], ['delete_selection', 1, 3],
+                          ['change_position', 2]])
+        self.assertEqual(stream.flushes, 1)
+
+
+    def test_unrecordable_format(self):
+        editor = TextEditor(Formatter)
+        stream = io.StringIO()
+        editor.recorder = CommandRecorder(stream, Formatter)
+        editor.edit('ab')
+        # A tuple would be replayed as a list: the command fails
+        # before it is executed.
+        with self.assertRaises(ValueError):
+            editor.current_format = ('bold',)
+        self.assertEqual(editor.current_format, 'default')
+        editor.current_format = ['bold']
+        editor.edit('c')
+        self.assertEqual([json.loads(line) for line
+                          in stream.getvalue().splitlines()],
+                         [['edit', 'ab'], ['format', 0, ['bold']],
+                          ['current_format', 0], ['edit', 'c']])
@@ -1,6 +1,13 @@
 import unittest
 import logging
+import random
 from moi.textEditor import *
+from moi.tracing import Tracer
+from moi.metrics import Metrics, Histogram
+from moi.history import Journal, Insertion, Deletion
+from moi.sharedDocument import SharedDocument
+from moi.versions import VersionedArray
+import threading
 from pprint import pformat
 
 
@@ -83,6 +90,29 @@ class TestEditor(unittest.TestCase):
         self.assertEqual(tags[an_id], 999 - 500)
         
     
+    def test_free_list_and_compaction(self):
+        tags = Tags([[1, 'a'], [2, 'b'], [3, 'c'], [4, 'd']])
+        tags.delete(1)
+        tags.delete(3)
+        # The last freed slot is reused first.
+        self.assertEqual(tags.create([5, 'e'], tags.root), 3)
+        self.assertEqual(tags.create([6, 'f'], tags.root), 1)
+        self.assertEqual(tags.create([7, 'g'], tags.root), 4)
+        self.assertEqual(tags.all,
+                         [[1, 'a'], [7, 'g'], [6, 'f'], [5, 'e'], [3, 'c']])
+        # The editor compacts its tag list after a large deletion.
+        editor = TextEditor(Formatter)
+        for k in range(1000):
+            editor.current_format = str(k % 2)
+            editor.edit('x')
+        editor.delete_selection(3, 998)
+        self.assertEqual(editor.tags._length, 4)
+        self.assertEqual(editor.tags[editor.tag_id], [2, '0'])
+        editor.edit('y')
+        self.assertEqual(editor.compile(),
+                         [('x', '0'), ('x', '1'), ('xyx', '0'), ('x', '1')])
+
+
     def test_get_pos_tag(self):
         editor = TextEditor(Formatter,
                             tag_list = [[2,'1'],[4, '2'], [8, '3']])
@@ -97,6 +127,32 @@ class TestEditor(unittest.TestCase):
                          (2, [8, '3'], 6))
     
 
+    def test_tree_tags(self):
+        """
+        *TreeTags* and *Tags* have to give the same results.
+        """
+        editors = [TextEditor(Formatter, TagList = Tags),
+                   TextEditor(Formatter, TagList = TreeTags)]
+        for k in range(300):
+            for editor in editors:
+                editor.current_format = str(k % 7)
+                editor.edit('ab' * (k % 3 + 1))
+                if k % 5 == 0:
+                    editor.change_position((7 * k) % len(editor.text))
+                n = len(editor.text)
+                if k % 11 == 0 and n > 4:
+                    editor.delete_selection(k % n, min(n, k % n + 4))
+                n = len(editor.text)
+                if k % 13 == 0 and n > 0:
+                    editor.incremental_format = 'X'
+                    editor.change_selection_format(k // 3 % n,
+                                                   min(n, k // 3 % n + 9))
+        self.assertEqual(editors[0].tags.all, editors[1].tags.all)
+        for pos in range(0, len(editors[0].text), 17):
+            self.assertEqual(editors[0]._get_pos_tag(pos)[1:],
+                             editors[1]._get_pos_tag(pos)[1:])
+
+
     def test_merge_tags_True(self):
         editor = TextEditor(Formatter,
                             tag_list = [[2,'1'], [4, '2'], [8, '2']])
@@ -228,6 +284,403 @@ class TestEditor(unittest.TestCase):
                           [6, 'I']])
 
 
+    def test_undo_redo(self):
+        rng = random.Random(2)
+        editor = TextEditor(Formatter)
+        states = [editor.compile()]
+        for k in range(300):
+            n = len(editor.text)
+            action = rng.random()
+            if action < 0.5 or n < 2:
+                editor.current_format = rng.choice('abc')
+                delta = editor.edit(rng.choice(['x', 'y', 'zz']))
+                self.assertEqual(delta.pos, editor.cursor_pos - len(delta.text))
+            elif action < 0.7:
+                editor.change_position(rng.randint(0, n))
+                editor.delete()
+            elif action < 0.85:
+                i = rng.randint(0, n - 1)
+                editor.delete_selection(i, rng.randint(i + 1, n))
+            else:
+                i = rng.randint(0, n - 1)
+                editor.incremental_format = rng.choice('abc')
+                editor.change_selection_format(i, rng.randint(i + 1, n))
+            states.append(editor.compile())
+        # Typing sequences are merged in the journal.
+        undone = 0
+        while editor.undo() is not None:
+            undone += 1
+            self.assertIn(editor.compile(), states)
+        self.assertLess(undone, 300)
+        self.assertEqual(editor.compile(), states[0])
+        while editor.redo() is not None:
+            pass
+        self.assertEqual(editor.compile(), states[-1])
+        self.assertEqual(editor.text, ''.join(s for s, _ in states[-1]))
+
+
+    def test_compile_window(self):
+        editor = TextEditor(Formatter,
+                            tag_list = [[2,'1'], [4, '2'], [8, '3']],
+                            text = 'aabbbbcccccccc')
+        editor.change_position(4)
+        self.assertEqual(editor.compile(False, 3, 7),
+                         [('bbb', '2'), ('c', '3')])
+        self.assertEqual(editor.compile(True, 3, 7),
+                         [('b█bb', '2'), ('c', '3')])
+        self.assertEqual(editor.compile(True, 5, 5), [])
+        editor.change_position(14)
+        self.assertEqual(editor.compile(True, 10, 14),
+                         [('cccc█', '3')])
+        self.assertEqual(editor.compile(True, 14, 14),
+                         [('█', '3')])
+        self.assertEqual(editor.compile(True, 0, 2), [('aa', '1')])
+        # Any window gives a slice of the full rendering.
+        full = editor.compile()
+        for i in range(15):
+            for j in range(i, 15):
+                runs = editor.compile(False, i, j)
+                self.assertEqual(''.join(s for s, _ in runs),
+                                 editor.text[i:j])
+                self.assertLessEqual(len(runs), len(full))
+        with self.assertRaises(ValueError):
+            editor.compile(False, 5, 4)
+
+
+    def test_apply_batch(self):
+        """
+        A batch gives the same result as the equivalent sequence of
+        edition calls.
+        """
+        rng = random.Random(4)
+        editor = TextEditor(Formatter)
+        reference = TextEditor(Formatter)
+        for k in range(60):
+            n = len(editor.text)
+            operations = []
+            pos = 0
+            while pos <= n and len(operations) < 8:
+                i = rng.randint(pos, min(n, pos + 20))
+                action = rng.random()
+                if action < 0.5 or i == n:
+                    operations.append(('edit', i, rng.choice(['x', 'yy']),
+                                       rng.choice('abc')))
+                    pos = i
+                else:
+                    j = rng.randint(i + 1, min(n, i + 10))
+                    if action < 0.75:
+                        operations.append(('delete_selection', i, j))
+                    else:
+                        operations.append(('change_selection_format',
+                                           i, j, rng.choice('abc')))
+                    pos = j
+                if rng.random() < 0.3:
+                    break
+            rng.shuffle(operations)
+            before = editor.compile()
+            batch = editor.apply_batch(operations)
+            for delta in batch.deltas:
+                if isinstance(delta, Insertion):
+                    if len(reference.text) > 0:
+                        reference.change_position(delta.pos)
+                    reference.current_format = delta.runs[0][1]
+                    reference.edit(delta.text)
+                elif isinstance(delta, Deletion):
+                    reference.delete_selection(delta.pos,
+                                               delta.pos + len(delta.text))
+                else:
+                    reference.incremental_format = delta.new_runs[0][1]
+                    reference.change_selection_format(
+                        delta.pos,
+                        delta.pos + sum(run[0] for run in delta.new_runs))
+            self.assertEqual(editor.compile(), reference.compile())
+            self.assertEqual(editor.lines.total, len(editor.text))
+            if k % 10 == 0:
+                editor.undo()
+                self.assertEqual(editor.compile(), before)
+                editor.redo()
+                self.assertEqual(editor.compile(), reference.compile())
+        with self.assertRaises(ValueError):
+            editor.apply_batch([('delete_selection', 0, 2),
+                                ('edit', 1, 'x')])
+        self.assertIsNone(editor.apply_batch([]))
+
+
+    def test_from_runs(self):
+        bold = {'bold': True}
+        runs = [(2, 'a'), (3, bold), (0, 'b'), (1, bold), (4, 'c')]
+        for TagList in (Tags, TreeTags):
+            editor = TextEditor.from_runs(Formatter, 'abcdefghij', runs,
+                                          TagList = TagList)
+            self.assertIsInstance(editor.tags, TagList)
+            self.assertEqual(editor.tags.all,
+                             [[2, 'a'], [4, bold], [4, 'c']])
+            # The formats are shared.
+            self.assertIs(editor.tags.all[1][1], bold)
+            self.assertEqual(editor._get_pos_tag(7), (2, [4, 'c'], 6))
+            editor.change_position(10)
+            editor.edit('k')
+            self.assertEqual(editor.compile()[-1], ('ghijk', 'c'))
+        with self.assertRaises(ValueError):
+            TextEditor.from_runs(Formatter, 'abc', [(2, 'a')])
+        editor = TextEditor.from_runs(Formatter, '', [])
+        self.assertEqual(editor.compile(), [])
+
+
+    def test_multi_cursor(self):
+        text = ''.join(f'line {k}\n' for k in range(500))
+        starts = [k for k in range(len(text) + 1)
+                  if k == 0 or text[k - 1] == '\n']
+        editor = TextEditor.from_runs(Formatter, text,
+                                      [(7, 'a'), (len(text) - 7, 'b')])
+        editor.change_position(3)
+        editor.set_cursors(starts)
+        self.assertEqual(len(editor.cursors), 501)
+        editor.edit_at_cursors('> ')
+        # The main cursor is only shifted.
+        self.assertEqual(editor.cursor_pos, 5)
+        expected = ''.join(f'> line {k}\n' for k in range(500)) + '> '
+        self.assertEqual(editor.text, expected)
+        self.assertEqual(editor.cursors[:3], [2, 11, 20])
+        # Each cursor inserts with its own format.
+        self.assertEqual(editor.compile(),
+                         [('> line 0\n', 'a'), (expected[9:], 'b')])
+        editor.incremental_format = 'c'
+        editor.change_format_at_cursors(4)
+        self.assertEqual(editor.compile()[:5],
+                         [('> ', 'a'), ('line', 'c'), (' 0\n', 'a'),
+                          ('> ', 'b'), ('line', 'c')])
+        editor.delete_at_cursors(2)
+        self.assertEqual(editor.text, text)
+        self.assertEqual(editor.cursors, starts)
+        self.assertEqual(editor.cursor_pos, 3)
+        # The cursors follow the other modifications.
+        editor.change_position(0)
+        editor.edit('xyz')
+        self.assertEqual(editor.cursors[:2], [3, 10])
+        editor.delete_selection(0, 12)
+        # The first two cursors are merged.
+        self.assertEqual(editor.cursors[:2], [0, 5])
+        editor.undo()
+        self.assertEqual(editor.cursors[:2], [12, 17])
+        editor.clear_cursors()
+        self.assertIsNone(editor.edit_at_cursors('x'))
+
+
+    def test_format_index(self):
+        """
+        The inverted index of *IndexedTags* gives the same ranges as
+        a walk over all the tags.
+        """
+        rng = random.Random(6)
+        editors = [TextEditor(Formatter, TagList = IndexedTags),
+                   TextEditor(Formatter, TagList = Tags)]
+        for k in range(300):
+            n = len(editors[0].text)
+            action = rng.random()
+            i = rng.randint(0, max(n - 1, 0))
+            j = rng.randint(i + 1, n) if n > 0 else 0
+            pos = rng.randint(0, n)
+            format = rng.choice('abc')
+            for editor in editors:
+                if action < 0.5 or n < 2:
+                    if n > 0:
+                        editor.change_position(pos)
+                    editor.current_format = format
+                    editor.edit('xy')
+                elif action < 0.7:
+                    editor.delete_selection(i, j)
+                elif action < 0.9:
+                    editor.incremental_format = format
+                    editor.change_selection_format(i, j)
+                else:
+                    editor.undo()
+            for format in 'abc':
+                self.assertEqual(editors[0].find_format(format),
+                                 editors[1].find_format(format))
+        editor = TextEditor(Formatter,
+                            tag_list = [[2, {'link': 'x'}], [3, {}],
+                                        [1, {'link': 'x', 'bold': True}]],
+                            text = 'abcdef',
+                            TagList = IndexedTags)
+        self.assertEqual(editor.find_property('link', 'x'), [(0, 2), (5, 6)])
+        editor.incremental_format = {'link': 'x'}
+        editor.change_selection_format(2, 5)
+        self.assertEqual(editor.find_property('link', 'x'), [(0, 6)])
+        self.assertEqual(editor.find_property('bold', True), [(5, 6)])
+        # The properties whose value isn't hashable aren't indexed.
+        editor.change_position(6)
+        editor.current_format = {'fonts': ['serif', 'sans'], 'bold': True}
+        editor.edit('g')
+        editor.edit('h')
+        self.assertEqual(editor.text, 'abcdefgh')
+        self.assertEqual(editor.find_property('bold', True), [(5, 8)])
+
+
+    def test_snapshot(self):
+        rng = random.Random(7)
+        for TagList in (Tags, TreeTags, IndexedTags):
+            editor = TextEditor(Formatter, TagList = TagList)
+            editor.edit('first line\nsecond line')
+            snapshots = []
+            for k in range(100):
+                if rng.random() < 0.2:
+                    snapshot = editor.snapshot()
+                    snapshots.append((snapshot, str(editor.text),
+                                      editor.compile()))
+                n = len(editor.text)
+                editor.change_position(rng.randint(0, n))
+                editor.current_format = rng.choice('abc')
+                editor.edit(rng.choice(['x', 'y\n']))
+                if rng.random() < 0.3:
+                    i = rng.randint(0, n - 1)
+                    editor.incremental_format = rng.choice('abc')
+                    editor.change_selection_format(i, rng.randint(i + 1, n))
+                if rng.random() < 0.2:
+                    editor.undo()
+            for snapshot, text, runs in snapshots:
+                self.assertEqual(str(snapshot), text)
+                self.assertEqual(snapshot.compile(), runs)
+                self.assertEqual(snapshot[3:9], text[3:9])
+                self.assertEqual(snapshot.pos_to_line_column(len(text)),
+                                 TextEditor.pos_to_line_column(text,
+                                                               len(text)))
+                self.assertEqual(''.join(s for s, _ in
+                                         snapshot.compile(False, 2, 5)),
+                                 text[2:5])
+        # The structures are modified in place and their versions are
+        # released once there are no snapshots left.
+        editor = TextEditor(Formatter)
+        editor.edit('abc')
+        text = editor.text
+        snapshot = editor.snapshot()
+        editor.edit('d')
+        self.assertIs(editor.text, text)
+        self.assertEqual(str(snapshot), 'abc')
+        self.assertIsNot(type(editor.tags._succ), VersionedArray)
+        del snapshot
+        editor.edit('e')
+        self.assertIs(type(editor.tags._succ), VersionedArray)
+
+
+    def test_shared_document(self):
+        document = SharedDocument(TextEditor(Formatter, TagList = TreeTags))
+        document.write('edit', 'ab\n')
+        done = threading.Event()
+        errors = []
+
+        def writer():
+            rng = random.Random(3)
+            for k in range(300):
+                # Each write keeps as many 'a' as 'b'.
+                with document.writing() as editor:
+                    n = len(editor.text)
+                    editor.change_position(rng.randint(0, n))
+                    editor.current_format = rng.choice('xyz')
+                    editor.edit('a')
+                    editor.edit(rng.choice(['b', 'b\n']))
+                    i = rng.randint(0, n)
+                    editor.incremental_format = rng.choice('xyz')
+                    editor.change_selection_format(i, rng.randint(i + 1, n + 2))
+            done.set()
+
+        def reader():
+            try:
+                while not done.is_set():
+                    snapshot = document.snapshot()
+                    text = str(snapshot)
+                    self.assertEqual(text.count('a'), text.count('b'))
+                    runs = snapshot.compile()
+                    self.assertEqual(''.join(s for s, _ in runs), text)
+                    self.assertEqual(snapshot.pos_to_line_column(len(text)),
+                                     TextEditor.pos_to_line_column(text,
+                                                                   len(text)))
+                    self.assertEqual(snapshot[1:5], text[1:5])
+            except Exception as error:
+                errors.append(error)
+                done.set()
+
+        threads = [threading.Thread(target = reader) for k in range(4)]
+        threads.append(threading.Thread(target = writer))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(document.version, 301)
+        self.assertEqual(str(document.snapshot()), str(document.editor.text))
+        # The snapshot is published once per version.
+        self.assertIs(document.snapshot(), document.snapshot())
+        # A reader which doesn't keep its snapshot doesn't wait for a
+        # write in progress.
+        texts = []
+        before = str(document.editor.text)
+        with document.writing() as editor:
+            editor.edit('c')
+            thread = threading.Thread(
+                target = lambda: texts.append(str(document.snapshot())))
+            thread.start()
+            thread.join(5)
+        self.assertEqual(texts, [before])
+        self.assertEqual(str(document.snapshot()), str(editor.text))
+
+
+    def test_journal_cap(self):
+        editor = TextEditor(Formatter)
+        editor.journal = Journal(max_size = 100)
+        editor.edit('abc')
+        for k in range(50):
+            editor.change_position(len(editor.text) // 2)
+            editor.edit('abc')
+        self.assertLessEqual(editor.journal.size, 100)
+
+
+    def test_compile_changes(self):
+        rng = random.Random(3)
+        editor = TextEditor(Formatter, [[3, 'a'], [3, 'b']], 'abcdef')
+        rendered = []
+        def patch():
+            change = editor.compile_changes()
+            if change is None:
+                return
+            start, old_end, runs = change
+            starts = [0]
+            for s, _ in rendered:
+                starts.append(starts[-1] + len(s))
+            # The patched range is made of whole runs.
+            self.assertIn(start, starts)
+            self.assertIn(old_end, starts)
+            i = starts.index(start)
+            rendered[i:starts.index(old_end, i)] = [(s, f) for _, s, f in runs]
+            self.assertEqual(rendered, editor.compile())
+        patch()
+        self.assertIsNone(editor.compile_changes())
+        editor.change_position(6)
+        for k in range(500):
+            n = len(editor.text)
+            action = rng.random()
+            if action < 0.4 or n < 2:
+                editor.current_format = rng.choice('abc')
+                editor.edit(rng.choice(['x', 'y', 'zz']))
+            elif action < 0.55:
+                editor.change_position(rng.randint(0, n))
+                editor.delete()
+            elif action < 0.7:
+                i = rng.randint(0, n - 1)
+                editor.delete_selection(i, rng.randint(i + 1, n))
+            elif action < 0.85:
+                i = rng.randint(0, n - 1)
+                editor.incremental_format = rng.choice('abc')
+                editor.change_selection_format(i, rng.randint(i + 1, n))
+            elif action < 0.95:
+                editor.undo()
+            else:
+                editor.redo()
+            if rng.random() < 0.3:
+                patch()
+        patch()
+
+
     def test_repr(self):
         """
         SEE __repr__.
@@ -257,6 +710,23 @@ class TestEditor(unittest.TestCase):
                          [6, '2'])
 
 
+    def test_edit_at_tag_boundary(self):
+        editor = TextEditor(Formatter)
+        editor.current_format = 'A'
+        editor.edit('a')
+        editor.current_format = 'B'
+        editor.edit('b')
+        editor.change_position(1)
+        editor.current_format = 'X'
+        editor.edit('x')
+        self.assertEqual(editor.compile(),
+                         [('a', 'A'), ('x', 'X'), ('b', 'B')])
+        # Adjacent tags with the same format are merged.
+        editor.incremental_format = 'B'
+        editor.change_selection_format(0, 2)
+        self.assertEqual(editor.tags.all, [[3, 'B']])
+
+
     def test_complex_interactions(self):
         editor = TextEditor(Formatter)
         complex_interact = [
@@ -277,6 +747,84 @@ class TestEditor(unittest.TestCase):
         editor.change_selection_format(10, 26)
 
         
+    def test_tracing(self):
+        editor = TextEditor(Formatter)
+        editor.edit('abc')
+        tracer = Tracer(capacity = 4)
+        editor.tracer = editor.tags.tracer = tracer
+        editor.edit('d')
+        self.assertEqual(tracer.events, [])
+        tracer.enable()
+        editor.edit('e')
+        editor.change_position(1)
+        editor.delete()
+        self.assertEqual([e.operation for e in tracer.events],
+                         ['delete', 'edit', 'change_position', 'delete'])
+        self.assertEqual(tracer.events[-1].positions, (0,))
+        editor.delete_selection(0, 2)
+        # The ring buffer is bounded.
+        self.assertEqual(len(tracer.events), 4)
+        self.assertIn('delete_selection positions (0, 2)',
+                      tracer.render())
+
+        
+    def test_metrics(self):
+        editor = TextEditor(Formatter, TagList = Tags)
+        metrics = Metrics()
+        editor.metrics = editor.tags.metrics = metrics
+        editor.edit('abc')
+        self.assertEqual(metrics.snapshot(),
+                         {'counters': {}, 'operations': {},
+                          'histograms': {}})
+        metrics.enable()
+        for k in range(10):
+            editor.current_format = str(k % 2)
+            editor.edit('x')
+        editor.change_position(2)
+        editor.incremental_format = 'y'
+        editor.change_selection_format(0, 5)
+        snapshot = metrics.snapshot()
+        counters = snapshot['counters']
+        histograms = snapshot['histograms']
+        self.assertEqual(histograms['text_editor.edit']['count'], 10)
+        self.assertEqual(histograms['text_editor.change_selection_format']
+                         ['count'], 1)
+        self.assertGreaterEqual(counters['formatter.merge'], 10)
+        self.assertGreater(counters['formatter.compare'], 10)
+        self.assertGreaterEqual(counters['tags.find.walked'],
+                                counters['tags.find'])
+        self.assertEqual(sum(histograms['text_editor.edit']['buckets']), 10)
+        # The counters are attributed to the top-level operations.
+        operations = snapshot['operations']
+        self.assertEqual(counters['formatter.compare'],
+                         sum(counters.get('formatter.compare', 0)
+                             for counters in operations.values()))
+        self.assertGreater(operations['text_editor.change_selection_format']
+                           ['formatter.merge'], 0)
+        # The nested operations aren't timed.
+        metrics.reset()
+        editor.change_selection_format(0, 2)
+        editor.delete_selection(0, 1)
+        editor.undo()
+        self.assertEqual(sorted(metrics.snapshot()['histograms']),
+                         ['text_editor.change_selection_format',
+                          'text_editor.delete_selection',
+                          'text_editor.undo'])
+        editor.apply_batch([('change_selection_format', 0, 8, 'z')])
+        self.assertGreater(metrics.snapshot()['operations']
+                           ['text_editor.apply_batch']['formatter.compare'],
+                           0)
+        metrics.reset()
+        self.assertEqual(metrics.snapshot()['counters'], {})
+        metrics.disable()
+        histogram = Histogram()
+        for seconds in [1e-6, 3e-6, 3e-6, 1e-3]:
+            histogram.observe(seconds)
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.quantile(0.5), 4e-6)
+        self.assertEqual(histogram.quantile(1.0), 1e-3)
+
+
     def test_line_column_to_pos(self):
         """
         This\r\n
@@ -333,6 +881,38 @@ class TestEditor(unittest.TestCase):
         self.assertEqual(s[f(6,-100)], 'T')
 
         
+    def test_line_index(self):
+        """
+        *editor.lines* is updated incrementally.
+        """
+        rng = random.Random(1)
+        editor = TextEditor(Formatter)
+        for _ in range(400):
+            n = len(editor.text)
+            action = rng.random()
+            if action < 0.5 or n < 2:
+                if n > 0:
+                    editor.change_position(rng.randint(0, n))
+                editor.edit(rng.choice(['a', '\r', '\n', '\r\n', 'b\nc']))
+            elif action < 0.8:
+                editor.change_position(rng.randint(1, n))
+                editor.delete()
+            else:
+                i = rng.randint(0, n - 1)
+                editor.delete_selection(i, rng.randint(i + 1, n))
+            s = str(editor.text)
+            for pos in range(len(s) + 1):
+                self.assertEqual(
+                    editor.pos_to_line_column(editor.lines, pos),
+                    editor.pos_to_line_column(s, pos))
+            line_nb, _ = editor.pos_to_line_column(s, len(s))
+            for line in range(1, line_nb + 1):
+                for column in (0, 1, 3):
+                    self.assertEqual(
+                        editor.line_column_to_pos(editor.lines, line, column),
+                        editor.line_column_to_pos(s, line, column))
+
+
     def test_pos_to_line_column(self):
         """
         g is the inverse function of f if the conversion is *strict*.
@@ -0,0 +1,162 @@
+import unittest
+import io
+import json
+import random
+
+from moi.export import (JSONLinesRenderer, HTMLRenderer, ANSIRenderer,
+                        MarkdownRenderer, export, export_parallel,
+                        iter_chunks)
+from moi.textEditor import TextEditor
+from moi.textFormatter import Format, PropertyFormatter
+
+
+class TestExport(unittest.TestCase):
+
+
+    def setUp(self):
+        rng = random.Random(2)
+        text = ''.join(rng.choice('abc \n') for k in range(5000))
+        runs = []
+        n = 0
+        while n < len(text):
+            length = min(rng.randint(1, 40), len(text) - n)
+            runs.append((length, Format(size = rng.randint(1, 3))))
+            n += length
+        self.editor = TextEditor.from_runs(PropertyFormatter, text, runs)
+
+
+    def test_chunks(self):
+        chunks = list(iter_chunks(self.editor, 100))
+        self.assertEqual(''.join(text for text, _ in chunks),
+                         str(self.editor.text))
+        for text, runs in chunks[:-1]:
+            self.assertEqual(sum(length for length, _ in runs), len(text))
+            self.assertGreaterEqual(len(text), 100)
+            self.assertLess(len(text) - runs[-1][0], 100)
+        self.assertEqual(list(iter_chunks(TextEditor(PropertyFormatter))), [])
+
+
+    def test_export(self):
+        expected = ''.join(
+            json.dumps([s, dict(format.items())]) + '\n'
+            for s, format in self.editor.compile())
+        for chunk_size in (1, 100, 10 ** 6):
+            stream = io.StringIO()
+            export(self.editor, JSONLinesRenderer(), stream, chunk_size)
+            self.assertEqual(stream.getvalue(), expected)
+        stream = io.StringIO()
+        export_parallel(self.editor.snapshot(), JSONLinesRenderer(), stream,
+                        processes = 2, chunk_size = 300, max_pending = 3)
+        self.assertEqual(stream.getvalue(), expected)
+
+
+    def test_markup(self):
+        editor = TextEditor(PropertyFormatter)
+        editor.edit('Plain <1> ')
+        editor.current_format = Format(bold = True, colour = 'red')
+        editor.edit('bold*\n')
+        editor.current_format = Format(bold = None, colour = None,
+                                       link = 'http://moi.org')
+        editor.edit('link')
+        stream = io.StringIO()
+        export(editor, HTMLRenderer(), stream)
+        self.assertEqual(stream.getvalue(),
+                         '<div style="white-space: pre-wrap">Plain &lt;1&gt; '
+                         '<span style="color: red"><b>bold*\n</b></span>'
+                         '<a href="http://moi.org">link</a></div>')
+        stream = io.StringIO()
+        export(editor, ANSIRenderer(), stream)
+        self.assertEqual(stream.getvalue(),
+                         'Plain <1> \x1b[1;31mbold*\n\x1b[0m'
+                         '\x1b]8;;http://moi.org\x1b\\link\x1b]8;;\x1b\\')
+        stream = io.StringIO()
+        export(editor, MarkdownRenderer(), stream)
+        self.assertEqual(stream.getvalue(),
+                         'Plain \\<1\\> <b>bold\\*</b>\n'
+                         '[link](<http://moi.org>)')
+
+
+    def test_markup_safety(self):
+        editor = TextEditor(PropertyFormatter)
+        editor.current_format = Format(bold = True)
+        editor.edit('Hello.')
+        editor.current_format = Format(bold = True, italic = True)
+        editor.edit('World')
+        editor.current_format = Format(bold = None, italic = None,
+                                       link = 'javascript:alert(1)')
+        editor.edit('a')
+        editor.current_format = Format(link = ' JavaScript:x')
+        editor.edit('b')
+        editor.current_format = Format(link = 'x>)<y\x1b\x07')
+        editor.edit('c')
+        stream = io.StringIO()
+        export(editor, MarkdownRenderer(), stream)
+        self.assertEqual(stream.getvalue(),
+                         '<b>Hello.</b><b><i>World</i></b>ab'
+                         '[c](<x\\>)\\<y>)')
+        stream = io.StringIO()
+        export(editor, HTMLRenderer(), stream)
+        self.assertNotIn('script', stream.getvalue().lower())
+        self.assertIn('<a href="x&gt;)&lt;y">c</a>', stream.getvalue())
+        stream = io.StringIO()
+        export(editor, ANSIRenderer(), stream)
+        self.assertIn('\x1b]8;;x>)<y\x1b\\c', stream.getvalue())
+        self.assertNotIn('\x07', stream.getvalue())
+        # The colours are names or '#rrggbb'.
+        editor = TextEditor(PropertyFormatter)
+        editor.current_format = Format(colour = 'red; position: fixed',
+                                       background = '#00ff00')
+        editor.edit('a')
+        stream = io.StringIO()
+        export(editor, HTMLRenderer(), stream)
+        self.assertIn('<span style="background-color: #00ff00">a</span>',
+                      stream.getvalue())
+        self.assertNotIn('position', stream.getvalue())
+
+
+    def test_text_safety(self):
+        editor = TextEditor(PropertyFormatter)
+        editor.edit('\x1b[2J\x07\t\x1b]8;;http://a\x1b\\b\r\n\x9bc')
+        stream = io.StringIO()
+        export(editor, ANSIRenderer(), stream)
+        self.assertEqual(stream.getvalue(),
+                         '\\x1b[2J\\x07\t\\x1b]8;;http://a\\x1b\\b'
+                         '\\x0d\n\\x9bc')
+        # The block markers at line starts are escaped.
+        editor = TextEditor(PropertyFormatter)
+        editor.edit('- item\n1. two\n---\n    code\n  \nx-y')
+        editor.current_format = Format(bold = True)
+        editor.edit('\n+ a\n')
+        editor.current_format = Format(bold = None)
+        editor.edit('=\t2) b')
+        expected = ('\\- item\n1\\. two\n\\---\n&#32;   code\n  \nx-y'
+                    '\n<b>+ a</b>\n\\=\t2) b')
+        stream = io.StringIO()
+        export(editor, MarkdownRenderer(), stream)
+        self.assertEqual(stream.getvalue(), expected)
+        for chunk_size in (1, 3):
+            stream = io.StringIO()
+            export(editor, MarkdownRenderer(), stream, chunk_size)
+            self.assertEqual(stream.getvalue(), expected)
+
+
+    def test_markup_cache(self):
+        class Renderer(HTMLRenderer):
+            calls = 0
+            def markup(self, format):
+                Renderer.calls += 1
+                return super().markup(format)
+        stream = io.StringIO()
+        export(self.editor, Renderer(), stream, chunk_size = 50)
+        self.assertEqual(Renderer.calls, 3)
+        # Chunks don't change the output.
+        whole = io.StringIO()
+        export(self.editor, HTMLRenderer(), whole, chunk_size = 10 ** 6)
+        self.assertEqual(stream.getvalue(), whole.getvalue())
+        for renderer in (ANSIRenderer(), MarkdownRenderer()):
+            stream = io.StringIO()
+            export_parallel(self.editor, renderer, stream, processes = 2,
+                            chunk_size = 500)
+            whole = io.StringIO()
+            export(self.editor, renderer, whole)
+            self.assertEqual(stream.getvalue(), whole.getvalue())
@@ -0,0 +1,194 @@
+import unittest
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from moi.server import CommandServer
+
+
+class TestServer(unittest.TestCase):
+
+
+    def exchange(self, requests, sessions = 1, Server = CommandServer):
+        """ The messages received by each session. """
+        async def session(path, requests):
+            reader, writer = await asyncio.open_unix_connection(path)
+            for request in requests:
+                writer.write(json.dumps(request).encode('utf-8') + b'\n')
+            await writer.drain()
+            messages = []
+            answered = 0
+            while answered < len(requests):
+                message = json.loads(await reader.readline())
+                messages.append(message)
+                answered += 'delta' not in message
+            writer.close()
+            return messages
+
+        async def main(path):
+            server = Server()
+            unix_server = await asyncio.start_unix_server(server.handle,
+                                                          path)
+            async with unix_server:
+                return await asyncio.gather(*(session(path, requests)
+                                              for k in range(sessions)))
+
+        with tempfile.TemporaryDirectory() as directory:
+            return asyncio.run(main(os.path.join(directory, 'moi.sock')))
+
+
+    def test_commands(self):
+        messages, = self.exchange([
+            {'id': 1, 'document': 'a', 'command': 'open', 'args': ['Bla']},
+            {'id': 2, 'document': 'a', 'command': 'edit', 'args': [' bla'],
+             'format': {'bold': True}},
+            {'id': 3, 'document': 'a', 'command': 'change_selection_format',
+             'args': [0, 2], 'format': {'italic': True}},
+            {'id': 4, 'document': 'a', 'command': 'change_position',
+             'args': [100]},
+            {'id': 5, 'document': 'b', 'command': 'edit', 'args': ['x']},
+            {'id': 6, 'document': 'a', 'command': 'undo'},
+            {'id': 7, 'document': 'a', 'command': 'compile'}])
+        answers = {message['id']: message for message in messages
+                   if 'id' in message}
+        self.assertEqual(answers[1]['result'], 3)
+        self.assertEqual(answers[2]['result'], 7)
+        self.assertIn('IndexError', answers[4]['error'])
+        self.assertIn('Unknown document', answers[5]['error'])
+        self.assertEqual(answers[7]['result'],
+                         [['Bla', {}], [' bla', {'bold': True}]])
+        # The deltas rebuild the rendering.
+        rendering = []
+        for message in messages:
+            if 'delta' in message:
+                delta = message['delta']
+                k = 0
+                while k < len(rendering) and rendering[k][0] < delta['start']:
+                    k += 1
+                l = k
+                while l < len(rendering) and rendering[l][0] < delta['end']:
+                    l += 1
+                rendering[k:l] = delta['runs']
+                pos = 0
+                for run in rendering:
+                    run[0] = pos
+                    pos += len(run[1])
+        self.assertEqual([run[1:] for run in rendering],
+                         answers[7]['result'])
+
+
+    def test_bad_requests(self):
+        messages, = self.exchange([
+            {'id': 1, 'document': ['a'], 'command': 'open'},
+            {'id': 2, 'document': 'a', 'command': 'open', 'args': [5]},
+            {'id': 3, 'document': 'a', 'command': 'open', 'args': 'abc'},
+            {'id': 4, 'document': 'a', 'command': 'open', 'args': ['abc']},
+            {'id': 5, 'document': 'a', 'command': 'edit', 'args': [5]}])
+        answers = {message['id']: message for message in messages
+                   if 'id' in message}
+        for request_id in (1, 2, 3):
+            self.assertIn('Bad request', answers[request_id]['error'])
+        # The connection is still served.
+        self.assertEqual(answers[4]['result'], 3)
+        self.assertIn('TypeError', answers[5]['error'])
+
+
+    def test_rejected_requests(self):
+        messages, = self.exchange([
+            {'id': 1, 'document': 'a', 'command': 'open', 'args': ['']},
+            {'id': 2, 'document': 'a', 'command': 'edit', 'args': [['a', 'b']]},
+            {'id': 3, 'document': 'a', 'command': 'change_position',
+             'args': [1.5]},
+            {'id': 4, 'document': 'a', 'command': 'change_position',
+             'args': [True]},
+            {'id': 5, 'document': 'a', 'command': 'edit', 'args': ['x'],
+             'format': ['bold']},
+            {'id': 6, 'document': 'a', 'command': 'compile', 'args': ['0']},
+            {'id': 7, 'document': 'a', 'command': 'edit', 'args': ['xy']},
+            {'id': 8, 'document': 'a', 'command': 'change_position',
+             'args': [1]},
+            {'id': 9, 'document': 'a', 'command': 'edit', 'args': ['z']},
+            {'id': 10, 'document': 'a', 'command': 'compile'}])
+        answers = {message['id']: message for message in messages
+                   if 'id' in message}
+        for request_id in range(2, 7):
+            self.assertIn('TypeError', answers[request_id]['error'])
+        # The document is still usable.
+        self.assertEqual(answers[7]['result'], 2)
+        self.assertEqual(answers[9]['result'], 2)
+        self.assertEqual(answers[10]['result'], [['xzy', {}]])
+
+
+    def test_failing_request(self):
+        class Server(CommandServer):
+            def execute(self, document, session, request):
+                if request['command'] == 'delete':
+                    raise RuntimeError('broken')
+                return super().execute(document, session, request)
+
+        messages, = self.exchange([
+            {'id': 1, 'document': 'a', 'command': 'open', 'args': ['ab']},
+            {'id': 2, 'document': 'a', 'command': 'delete'},
+            {'id': 3, 'document': 'a', 'command': 'edit', 'args': ['x']},
+            {'id': 4, 'document': 'a', 'command': 'open', 'args': ['c']},
+            {'id': 5, 'document': 'a', 'command': 'compile'}],
+            Server = Server)
+        answers = {message['id']: message for message in messages
+                   if 'id' in message}
+        # The editor may be half-modified: the document is closed and
+        # the requests queued after the failing one aren't executed.
+        self.assertIn('RuntimeError', answers[2]['error'])
+        for request_id in (3, 4, 5):
+            self.assertIn('closed', answers[request_id]['error'])
+
+
+    def test_editor_sequences(self):
+        messages, = self.exchange([
+            {'id': 1, 'document': 'a', 'command': 'open', 'args': ['']},
+            {'id': 2, 'document': 'a', 'command': 'change_position',
+             'args': [0]},
+            {'id': 3, 'document': 'a', 'command': 'edit', 'args': ['']},
+            {'id': 4, 'document': 'a', 'command': 'edit', 'args': ['hello']},
+            {'id': 5, 'document': 'a', 'command': 'change_position',
+             'args': [2]},
+            {'id': 6, 'document': 'a', 'command': 'edit', 'args': ['X'],
+             'format': {'bold': True}},
+            {'id': 7, 'document': 'a', 'command': 'delete'},
+            {'id': 8, 'document': 'a', 'command': 'compile'},
+            {'id': 9, 'document': 'a', 'command': 'undo'},
+            {'id': 10, 'document': 'a', 'command': 'compile'}])
+        answers = {message['id']: message for message in messages
+                   if 'id' in message}
+        for request_id in range(1, 11):
+            self.assertIn('result', answers[request_id])
+        self.assertEqual(answers[8]['result'], [['hello', {}]])
+        self.assertEqual(answers[10]['result'],
+                         [['he', {}], ['X', {'bold': True}], ['llo', {}]])
+
+
+    def test_sessions(self):
+        requests = [{'id': 0, 'document': 'shared', 'command': 'open'}]
+        requests += [{'id': k, 'document': 'shared', 'command': 'edit',
+                      'args': ['ab']} for k in range(1, 51)]
+        results = self.exchange(requests, sessions = 20)
+        lengths = [message['result'] for messages in results
+                   for message in messages if message.get('id') == 50]
+        self.assertEqual(len(lengths), 20)
+        self.assertEqual(max(lengths), 2000)
+
+
+    def test_stdio(self):
+        requests = [{'id': 1, 'document': 'a', 'command': 'open',
+                     'args': ['abc']},
+                    {'id': 2, 'document': 'a', 'command': 'compile'}]
+        output = subprocess.run(
+            [sys.executable, '-m', 'moi'],
+            input = ''.join(json.dumps(r) + '\n' for r in requests),
+            capture_output = True, text = True, timeout = 30,
+            cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            check = True).stdout
+        messages = [json.loads(line) for line in output.splitlines()]
+        self.assertIn({'id': 2, 'result': [['abc', {}]]}, messages)
@@ -0,0 +1,236 @@
+import unittest
+import os
+import random
+import tempfile
+from moi.textBuffer import *
+from moi.lineIndex import LineIndex
+from moi.weightedTree import WeightedTree
+from moi import versions
+from moi.textEditor import TextEditor
+
+
+class Formatter:
+    DEFAULT_FORMAT = 'default'
+
+    @staticmethod
+    def merge(old, new):
+        return new
+
+    @staticmethod
+    def compare(format_one, format_two):
+        return format_one == format_two
+
+
+
+class SmallRope(Rope):
+    # Tiny chunks to exercise chunk splitting and merging.
+    CHUNK_SIZE = 4
+
+
+
+class SmallMappedBuffer(MappedBuffer):
+    CHUNK_SIZE = 4
+    PAGE_SIZE = 7
+    CACHED_PAGES = 2
+
+
+
+class TestTextBuffer(unittest.TestCase):
+
+
+    def test_weighted_tree(self):
+        tree = WeightedTree()
+        # The sequence is 0, 1, ..., 99 and the weight of k is k % 3.
+        predecessor = None
+        for k in range(100):
+            tree.insert(k, k % 3, predecessor)
+            predecessor = k
+        self.assertEqual(len(tree), 100)
+        self.assertEqual(tree.total, sum(k % 3 for k in range(100)))
+        self.assertEqual(tree.select(42), (42, tree.offset(42)))
+        self.assertEqual(tree.rank(42), 42)
+        self.assertEqual(tree.find(4), (5, 4))
+        tree.remove(5)
+        self.assertEqual(tree.find(4), (7, 4))
+        tree.set_weight(7, 10)
+        self.assertEqual(tree.offset(8), 14)
+        self.assertEqual(tree.next(4), 6)
+        self.assertEqual(tree.previous(6), 4)
+        # Building in O(n).
+        tree.build(list(range(10)), [1] * 10)
+        self.assertEqual([tree.find(k)[0] for k in range(10)],
+                         list(range(10)))
+        # Nodes of several units.
+        tree.build(list(range(10)), [1] * 10, [3] * 10)
+        self.assertEqual(len(tree), 30)
+        self.assertEqual(tree.select(7), (2, 2))
+        self.assertEqual(tree.rank(2), 6)
+        tree.set_units(0, 1)
+        self.assertEqual(tree.select(7), (3, 3))
+        self.assertEqual(tree.select(0), (0, 0))
+        self.assertEqual(len(tree), 28)
+
+
+    def test_rope_random_edits(self):
+        rng = random.Random(0)
+        s = 'Bla bla\r\nblabla.'
+        rope = SmallRope(s)
+        for _ in range(2000):
+            i = rng.randint(0, len(s))
+            if rng.random() < 0.6:
+                new = rng.choice(['a', 'bc', '\n', '\r', 'longer string'])
+                rope.insert(i, new)
+                s = s[:i] + new + s[i:]
+            else:
+                j = rng.randint(i, min(len(s), i + 7))
+                rope.delete(i, j)
+                s = s[:i] + s[j:]
+            self.assertEqual(len(rope), len(s))
+        self.assertEqual(rope, s)
+        self.assertEqual(rope[3:20], s[3:20])
+        self.assertEqual(rope[-1], s[-1])
+        self.assertEqual(list(rope.lines(keepends = True)),
+                         list(StringBuffer(s).lines(keepends = True)))
+
+
+    def test_lines(self):
+        for s in ['', 'a', 'a\n', 'a\r\nb', '\r\n\r\n', 'x\ry\n\n']:
+            expected = (s + 'x').splitlines(keepends = True)
+            expected[-1] = expected[-1][:-1]
+            self.assertEqual(list(SmallRope(s).lines(keepends = True)),
+                             expected)
+
+
+    def test_editor_with_rope(self):
+        editor = TextEditor(Formatter, TextBuffer = SmallRope)
+        s = 'This\r\nis\n\nthe\nsource\ncode.'
+        for c in s:
+            editor.edit(c)
+        self.assertEqual(editor.text, s)
+        self.assertEqual(editor.compile(), [(s, 'default')])
+        self.assertEqual(TextEditor.pos_to_line_column(editor.text, 9),
+                         TextEditor.pos_to_line_column(s, 9))
+        self.assertEqual(TextEditor.line_column_to_pos(editor.text, 4, 2),
+                         TextEditor.line_column_to_pos(s, 4, 2))
+
+
+    def test_versions(self):
+        items = versions.VersionedList('abc')
+        index = versions.VersionedIndex()
+        index.add('x', 1)
+        first = versions.version(items)
+        first_index = versions.version(index)
+        items[0] = 'A'
+        items.append('d')
+        index.add('x', 2)
+        second = versions.version(items)
+        items[0] = 'B'
+        items[3] = 'D'
+        index.discard('x', 1)
+        self.assertEqual(list(first), ['a', 'b', 'c'])
+        self.assertEqual(list(second), ['A', 'b', 'c', 'd'])
+        self.assertEqual(items, ['B', 'b', 'c', 'D'])
+        self.assertEqual(first_index.get('x'), {1})
+        self.assertEqual(index['x'], {2})
+        versions.release(items)
+        self.assertIs(type(items), versions.VersionedList)
+
+
+    def test_mapped_buffer(self):
+        rng = random.Random(5)
+        s = ''.join(rng.choice('ab\né€\U0001f600') for _ in range(300))
+        buffer = SmallMappedBuffer(s.encode('utf-8'))
+        self.assertEqual(len(buffer), len(s))
+        self.assertEqual(buffer, s)
+        self.assertEqual(buffer.loaded, 0)
+        for _ in range(200):
+            if rng.random() < 0.5 or len(s) < 2:
+                pos = rng.randint(0, len(s))
+                piece = rng.choice(['x', 'é\n', 'yyyyyy'])
+                buffer.insert(pos, piece)
+                s = s[:pos] + piece + s[pos:]
+            else:
+                i = rng.randint(0, len(s) - 1)
+                j = rng.randint(i + 1, min(len(s), i + 12))
+                buffer.delete(i, j)
+                s = s[:i] + s[j:]
+            pos = rng.randint(0, len(s))
+            self.assertEqual(buffer[pos:(pos + 9)], s[pos:(pos + 9)])
+        self.assertEqual(buffer, s)
+        self.assertEqual(list(buffer.lines()), list(StringBuffer(s).lines()))
+        self.assertLessEqual(len(buffer._cache), 2)
+        # Pages smaller than a character hold one character.
+        class TinyMappedBuffer(MappedBuffer):
+            PAGE_SIZE = 1
+        s = 'a€\U0001f600b'
+        buffer = TinyMappedBuffer(s.encode('utf-8'))
+        self.assertEqual(len(buffer), len(s))
+        self.assertEqual(buffer, s)
+
+
+    def test_lazy_line_index(self):
+        rng = random.Random(7)
+        s = ''.join(rng.choice(['ab', 'é', '\n', '\r', '\r\n', '\x85',
+                                '\u2028', '\U0001f600'])
+                    for _ in range(400))
+        buffer = SmallMappedBuffer(s.encode('utf-8'))
+        editor = TextEditor.from_runs(Formatter, buffer,
+                                      [(len(s), 'default')])
+        lines = editor.lines
+        # Opening the document decodes no page and the index has a
+        # node per page at most.
+        self.assertEqual(len(buffer._cache), 0)
+        self.assertEqual(buffer.loaded, 0)
+        self.assertLessEqual(len(lines._ending), len(buffer._chunks) + 1)
+        expected = LineIndex(s)
+        self.assertEqual(len(lines), len(expected))
+        for pos in range(len(s) + 1):
+            self.assertEqual(lines.locate(pos), expected.locate(pos))
+        for line_nb in range(len(expected)):
+            self.assertEqual(lines.line_start(line_nb),
+                             expected.line_start(line_nb))
+            self.assertEqual(lines.line_length(line_nb),
+                             expected.line_length(line_nb))
+        for _ in range(50):
+            pos = rng.randint(1, len(s) - 1)
+            if rng.random() < 0.5:
+                editor.change_position(pos)
+                editor.edit('\n')
+                s = s[:pos] + '\n' + s[pos:]
+            else:
+                editor.delete_selection(pos, pos + 1)
+                s = s[:pos] + s[(pos + 1):]
+        expected = LineIndex(s)
+        self.assertEqual(len(lines), len(expected))
+        for pos in range(len(s) + 1):
+            self.assertEqual(lines.locate(pos), expected.locate(pos))
+
+
+    def test_editor_with_mapped_file(self):
+        s = 'line é\n' * 20000
+        with tempfile.NamedTemporaryFile(delete = False) as stream:
+            stream.write(s.encode('utf-8'))
+        try:
+            buffer = MappedBuffer.open(stream.name)
+            editor = TextEditor.from_runs(Formatter, buffer,
+                                          [(len(s), 'default')])
+            self.assertIs(editor.text, buffer)
+            editor.change_position(70000)
+            editor.current_format = 'bold'
+            editor.edit('ABC')
+            self.assertEqual(editor.compile(False, 69998, 70005),
+                             [('é\n', 'default'), ('ABC', 'bold'),
+                              ('li', 'default')])
+            self.assertEqual(
+                TextEditor.pos_to_line_column(editor.lines, 70002),
+                (10001, 2))
+            # Only the modified page is held in memory.
+            self.assertLess(buffer.loaded, MappedBuffer.PAGE_SIZE)
+            buffer.close()
+        finally:
+            os.remove(stream.name)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
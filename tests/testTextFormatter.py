@@ -0,0 +1,133 @@
+import unittest
+import random
+from moi.textFormatter import *
+from moi.textEditor import TextEditor
+
+
+class Formatter(InternedFormatter):
+    DEFAULT_FORMAT = frozenset()
+    calls = 0
+
+    @staticmethod
+    def merge_formats(old, new):
+        Formatter.calls += 1
+        return frozenset({**dict(old), **dict(new)}.items())
+
+
+
+class TestTextFormatter(unittest.TestCase):
+
+
+    def test_registry(self):
+        registry = FormatRegistry(lambda old, new: new, cache_size = 2)
+        a = registry.intern(('bold', True))
+        self.assertIs(registry.intern(('bold', True)), a)
+        self.assertEqual(registry.id(a), 0)
+        self.assertEqual(registry.id(('italic', True)), 1)
+        self.assertIs(registry.format(1), registry.intern(('italic', True)))
+        self.assertEqual(len(registry), 2)
+        self.assertIs(registry.merge(('italic', True), ('bold', True)), a)
+        registry.merge(a, a)
+        registry.merge(a, ('x',))
+        # The cache is bounded.
+        self.assertEqual(len(registry._cache), 2)
+        self.assertTrue(registry.compare(a, registry.intern(('bold', True))))
+
+
+    def test_interned_editor(self):
+        bold = frozenset({'bold': True}.items())
+        red = frozenset({'color': 'red'}.items())
+        editor = TextEditor(Formatter,
+                            tag_list = [[3, bold], [3, red]],
+                            text = 'abcdef')
+        editor.change_position(6)
+        editor.current_format = frozenset({'color': 'red'}.items())
+        editor.edit('g')
+        # The new tag is merged with an equal format built elsewhere.
+        self.assertEqual(editor.tags.all, [[3, bold], [4, red]])
+        Formatter.calls = 0
+        rng = random.Random(1)
+        for k in range(200):
+            i = rng.randint(0, 6)
+            editor.incremental_format = frozenset({'size': k % 3}.items())
+            editor.change_selection_format(i, i + 1)
+        # The merges are memoized.
+        self.assertLess(Formatter.calls, 40)
+        for tag in editor.tags.all:
+            self.assertIs(tag[1], Formatter.intern(tag[1]))
+
+
+    def test_format(self):
+        a = Format(bold = True, size = 12)
+        self.assertEqual(a, Format({'size': 12, 'bold': True}))
+        self.assertEqual(hash(a), hash(Format(size = 12, bold = True)))
+        self.assertNotEqual(a, Format(bold = True))
+        self.assertEqual(a['size'], 12)
+        self.assertIsNone(a.get('link'))
+        self.assertIn('bold', a)
+        self.assertEqual(sorted(a), ['bold', 'size'])
+        self.assertEqual(a.updated(Format(bold = None, italic = True)),
+                         Format(size = 12, italic = True))
+
+
+    def test_property_formatter(self):
+        link = Format(link = 'http://a', color = 'blue')
+        editor = TextEditor(PropertyFormatter,
+                            tag_list = [[2, Format()], [2, link],
+                                        [2, Format()]],
+                            text = 'abcdef')
+        editor.incremental_format = Format(bold = True)
+        editor.change_selection_format(0, 6)
+        # The link inside the selection is kept.
+        self.assertEqual(editor.tags.all,
+                         [[2, Format(bold = True)],
+                          [2, Format(link = 'http://a', color = 'blue',
+                                     bold = True)],
+                          [2, Format(bold = True)]])
+        editor.incremental_format = Format(bold = None)
+        editor.change_selection_format(0, 2)
+        editor.change_selection_format(4, 6)
+        self.assertEqual(editor.tags.all[0], [2, Format()])
+        self.assertIs(editor.tags.all[0][1], editor.tags.all[2][1])
+
+
+    def test_unlink(self):
+        link = Format(link = 'http://a', bold = True)
+        editor = TextEditor(PropertyFormatter,
+                            tag_list = [[2, Format()], [2, link],
+                                        [2, Format()]],
+                            text = 'abcdef')
+        editor.incremental_format = Format(link = 'http://b')
+        editor.change_selection_format(2, 3)
+        self.assertEqual(editor.find_property('link', 'http://b'), [(2, 3)])
+        editor.incremental_format = Format(link = None)
+        editor.change_selection_format(0, 6)
+        self.assertEqual([tag[1] for tag in editor.tags.all],
+                         [Format(), Format(bold = True), Format()])
+        # Typing after a link.
+        editor = TextEditor(PropertyFormatter,
+                            tag_list = [[2, link]], text = 'ab')
+        editor.change_position(2)
+        editor.current_format = Format(link = None)
+        editor.edit('c')
+        self.assertEqual(editor.tags.all,
+                         [[2, link], [1, Format(bold = True)]])
+
+
+    def test_change_position_format(self):
+        editor = TextEditor(PropertyFormatter)
+        editor.current_format = Format(bold = True)
+        editor.edit('BOLD')
+        editor.current_format = Format(bold = None)
+        editor.edit('plain')
+        # The format of the tag replaces the current format.
+        editor.change_position(7)
+        self.assertIs(editor.current_format, PropertyFormatter.DEFAULT_FORMAT)
+        editor.edit('X')
+        self.assertEqual(editor.compile(),
+                         [('BOLD', Format(bold = True)), ('plaXin', Format())])
+
+
+
+if __name__ == '__main__':
+    unittest.main()